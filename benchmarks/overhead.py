@@ -0,0 +1,187 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Benchmark the overhead and throughput of lift itself
+
+Run it from the root of the repository:
+
+    python -m benchmarks.overhead --dirs 10 --tests 20 --json results.json
+
+A synthetic suite of DIRS folders of TESTS no-op tests is generated, along
+with a test writing OUTPUT_MB of output. Results can be saved as JSON and
+compared with the ones of another version with --compare.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import lift
+from lift.runner import Runner, discover
+
+# Metrics, with their unit and whether a higher value is better
+METRICS = {
+    "discovery_time": ("s", False),
+    "test_overhead": ("ms", False),
+    "tests_per_second": ("tests/s", True),
+    "output_throughput": ("MB/s", True),
+    "xunit_write_time": ("s", False),
+    "peak_rss": ("MB", False),
+}
+
+
+def generate_suite(folder, dirs, tests, output_mb):
+    """Write a synthetic test suite in @folder
+
+    There are @dirs sub-folders of @tests no-op tests each, and an "output"
+    folder holding a single test writing @output_mb MB of 80 columns lines.
+    """
+    with open(os.path.join(folder, "lift.yaml"), "w") as f:
+        f.write("settings:\n    environment:\n        BENCHMARK: 'true'\n")
+
+    for i in range(dirs):
+        directory = os.path.join(folder, f"dir_{i}")
+        os.mkdir(directory)
+        with open(os.path.join(directory, "lift.yaml"), "w") as f:
+            for j in range(tests):
+                f.write(f"test noop_{j}:\n    command: 'true'\n")
+
+    directory = os.path.join(folder, "output")
+    os.mkdir(directory)
+    lines = int(output_mb * 1000 * 1000 / 80)
+    with open(os.path.join(directory, "lift.yaml"), "w") as f:
+        f.write(
+            f"test output:\n    command: sh -c 'yes {'x' * 79} | head -n {lines}'\n"
+        )
+
+
+def spawn_time(count=100):
+    """Return the time (seconds) taken to spawn and wait a no-op process"""
+    start = time.perf_counter()
+    for _ in range(count):
+        subprocess.run(["true"])
+    return (time.perf_counter() - start) / count
+
+
+def run_suite(folder, expressions):
+    """Run tests of a suite as the lift command does, output discarded
+
+    Returns the runner and the time taken (seconds).
+    """
+    runner = Runner(*discover(folder, upper_inheritance=False), expressions)
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        runner.run()
+    return runner, time.perf_counter() - start
+
+
+def benchmark(dirs, tests, output_mb):
+    """Run the benchmark, returns the metrics"""
+    metrics = {}
+    with tempfile.TemporaryDirectory() as folder:
+        folder = os.path.relpath(folder)  # As test strings usually are
+        generate_suite(folder, dirs, tests, output_mb)
+
+        start = time.perf_counter()
+        _, suites = discover(folder, upper_inheritance=False)
+        metrics["discovery_time"] = time.perf_counter() - start
+
+        noop_tests = [
+            f"{suite.directory}/{test.name}"
+            for suite in suites
+            for test in suite.tests
+            if test.name != "output"
+        ]
+        runner, elapsed = run_suite(folder, noop_tests)
+        metrics["tests_per_second"] = len(noop_tests) / elapsed
+        metrics["test_overhead"] = (elapsed / len(noop_tests) - spawn_time()) * 1000
+
+        start = time.perf_counter()
+        runner.write_xunit(os.path.join(folder, "lift.xml"))
+        metrics["xunit_write_time"] = time.perf_counter() - start
+
+        _, elapsed = run_suite(folder, [os.path.join(folder, "output", "output")])
+        metrics["output_throughput"] = output_mb / elapsed
+
+    # ru_maxrss is in kilobytes on Linux
+    metrics["peak_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return metrics
+
+
+def compare(metrics, reference):
+    """Print the metrics along with reference ones"""
+    print(f"{'':<20}{'reference':>14}{'current':>14}{'change':>10}")
+    for name, (unit, higher_is_better) in METRICS.items():
+        old, new = reference["metrics"].get(name), metrics[name]
+        if not old:
+            print(f"{name:<20}{'-':>14}{new:>14.3f}")
+            continue
+        change = (new - old) / old
+        worse = change < 0 if higher_is_better else change > 0
+        flag = " !" if worse and abs(change) > 0.1 else ""
+        print(f"{name:<20}{old:>14.3f}{new:>14.3f}{change:>+10.0%}{flag}")
+    print(f"\nReference: lift {reference['lift_version']}, {reference['parameters']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dirs", type=int, default=10, help="Number of folders")
+    parser.add_argument(
+        "--tests", type=int, default=20, help="Number of tests per folder"
+    )
+    parser.add_argument(
+        "--output-mb", type=float, default=50, help="Output volume of the output test"
+    )
+    parser.add_argument("--json", help="Save the results in this JSON file")
+    parser.add_argument("--compare", help="Compare with the results of this file")
+    args = parser.parse_args()
+
+    metrics = benchmark(args.dirs, args.tests, args.output_mb)
+    results = {
+        "lift_version": lift.version,
+        "python_version": platform.python_version(),
+        "parameters": {
+            "dirs": args.dirs,
+            "tests": args.tests,
+            "output_mb": args.output_mb,
+        },
+        "metrics": metrics,
+    }
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(metrics, json.load(f))
+    else:
+        for name, (unit, _) in METRICS.items():
+            print(f"{name:<20}{metrics[name]:>12.3f} {unit}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Benchmark resource uploads with several transfer settings
+
+Run it from the root of the repository:
+
+    python -m benchmarks.sftp_transfer --size 64 --latency 20
+
+Uploads go to a local SSH server stand-in, through a link with the given
+latency, so that the numbers reflect the protocol overhead rather than the
+bandwidth.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.sshd import start_server
+from lift.connection import ConnectionPool
+
+# Transfer settings to compare, added to the remote definition
+SETTINGS = (
+    ("default", {}),
+    ("16MiB window", {"window size": 16 * 1024 * 1024}),
+    ("4 channels", {"channels": 4}),
+    ("16MiB window, 4 channels", {"window size": 16 * 1024 * 1024, "channels": 4}),
+    ("compression", {"compress": True}),
+)
+
+
+def benchmark(port, settings, local_path, remote_path):
+    """Return the time (seconds) taken to upload a file with some settings"""
+    remote = {"host": "127.0.0.1", "port": port, "username": "lift", "password": "-"}
+    remote.update(settings)
+    pool = ConnectionPool()
+    with pool.open_sftp(remote) as sftp:
+        start = time.perf_counter()
+        pool.upload(remote, sftp, local_path, remote_path)
+        elapsed = time.perf_counter() - start
+        sftp.remove(remote_path)
+    pool.cleanup()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--size", type=int, default=64, help="Size of the uploaded file (MiB)"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=20, help="One-way latency (milliseconds)"
+    )
+    args = parser.parse_args()
+
+    server, port = start_server(args.latency / 1000)
+    with tempfile.TemporaryDirectory() as folder:
+        local_path = os.path.join(folder, "resource")
+        with open(local_path, "wb") as f:
+            # Half random, half compressible, as typical test resources
+            for _ in range(args.size):
+                f.write(os.urandom(512 * 1024) + bytes(512 * 1024))
+
+        print(f"Uploading {args.size}MiB with a {args.latency * 2:g}ms round-trip")
+        for name, settings in SETTINGS:
+            remote_path = os.path.join(folder, "uploaded")
+            elapsed = benchmark(port, settings, local_path, remote_path)
+            print(f"{name:<30}{elapsed:8.2f}s{args.size / elapsed:8.1f}MiB/s")
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
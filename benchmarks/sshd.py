@@ -0,0 +1,289 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Local SSH server stand-in, for benchmarks
+
+It accepts any password, serves SFTP on the local filesystem and runs exec
+requests through the local shell. An artificial latency can be added to
+emulate a distant remote.
+Never expose it: anybody able to connect can run any command.
+"""
+
+import argparse
+import heapq
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import paramiko
+from paramiko import (
+    AUTH_SUCCESSFUL,
+    OPEN_SUCCEEDED,
+    SFTP_OK,
+    SFTPAttributes,
+    SFTPHandle,
+    SFTPServer,
+    SFTPServerInterface,
+    ServerInterface,
+)
+
+
+def _sftp_errors(method):
+    """Convert OSError exceptions to SFTP error codes"""
+
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    return wrapper
+
+
+class _Handle(SFTPHandle):
+    @_sftp_errors
+    def stat(self):
+        return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+    @_sftp_errors
+    def chattr(self, attr):
+        SFTPServer.set_file_attr(self.filename, attr)
+        return SFTP_OK
+
+
+class _SFTPServer(SFTPServerInterface):
+    """SFTP on the local filesystem"""
+
+    @_sftp_errors
+    def list_folder(self, path):
+        folder = []
+        for name in os.listdir(path):
+            attributes = SFTPAttributes.from_stat(os.stat(os.path.join(path, name)))
+            attributes.filename = name
+            folder.append(attributes)
+        return folder
+
+    @_sftp_errors
+    def stat(self, path):
+        return SFTPAttributes.from_stat(os.stat(path))
+
+    lstat = stat
+
+    @_sftp_errors
+    def open(self, path, flags, attr):
+        fd = os.open(path, flags, 0o666)
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+        handle = _Handle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    @_sftp_errors
+    def remove(self, path):
+        os.remove(path)
+        return SFTP_OK
+
+    @_sftp_errors
+    def mkdir(self, path, attr):
+        os.mkdir(path)
+        return SFTP_OK
+
+    @_sftp_errors
+    def rmdir(self, path):
+        os.rmdir(path)
+        return SFTP_OK
+
+    @_sftp_errors
+    def chattr(self, path, attr):
+        SFTPServer.set_file_attr(path, attr)
+        return SFTP_OK
+
+
+class _Server(ServerInterface):
+    """Accept everybody, run commands through the local shell"""
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        return AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return OPEN_SUCCEEDED
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=_execute, args=(channel, command), daemon=True).start()
+        return True
+
+
+def _execute(channel, command):
+    """Run a command for an exec request"""
+    process = subprocess.Popen(
+        command.decode(),
+        shell=True,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+
+    def pump(source, send):
+        for chunk in iter(lambda: source.read1(65536), b""):
+            try:
+                send(chunk)
+            except (OSError, EOFError):
+                break
+
+    errors = threading.Thread(
+        target=pump, args=(process.stderr, channel.sendall_stderr)
+    )
+    errors.start()
+    pump(process.stdout, channel.sendall)
+    errors.join()
+    return_code = process.wait()
+    try:
+        channel.send_exit_status(return_code if return_code >= 0 else 128 - return_code)
+        channel.close()
+    except (OSError, EOFError):
+        pass
+
+
+def _delay(source, destination, latency):
+    """Forward data from a socket to another one, @latency seconds later"""
+    queue = []  # (due time, sequence, data)
+    condition = threading.Condition()
+    sequence = 0
+
+    def send():
+        while True:
+            with condition:
+                while not queue:
+                    condition.wait()
+                due, _, data = queue[0]
+            time.sleep(max(0, due - time.monotonic()))
+            with condition:
+                heapq.heappop(queue)
+            try:
+                if not data:
+                    destination.shutdown(socket.SHUT_WR)
+                    return
+                destination.sendall(data)
+            except OSError:
+                return  # The other end is gone
+
+    threading.Thread(target=send, daemon=True).start()
+    while True:
+        try:
+            data = source.recv(65536)
+        except OSError:
+            data = b""
+        with condition:
+            heapq.heappush(queue, (time.monotonic() + latency, sequence, data))
+            sequence += 1
+            condition.notify()
+        if not data:
+            return
+
+
+def _accept(server, handle):
+    while True:
+        connection, _ = server.accept()
+        threading.Thread(target=handle, args=(connection,), daemon=True).start()
+
+
+def _listen():
+    server = socket.socket()
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("127.0.0.1", 0))
+    server.listen(50)
+    return server
+
+
+def serve_forever(latency=0):
+    """Run a stand-in server in background threads
+
+    @latency is added to each way (seconds), the round-trip time is twice
+    this value.
+    Returns the local port the server listens on.
+    """
+    host_key = paramiko.RSAKey.generate(2048)
+
+    def serve(connection):
+        transport = paramiko.Transport(connection)
+        transport.add_server_key(host_key)
+        transport.set_subsystem_handler("sftp", SFTPServer, _SFTPServer)
+        transport.start_server(server=_Server())
+
+    server = _listen()
+    threading.Thread(target=_accept, args=(server, serve), daemon=True).start()
+    port = server.getsockname()[1]
+    if not latency:
+        return port
+
+    def proxy(connection):
+        upstream = socket.create_connection(("127.0.0.1", port))
+        for source, destination in ((connection, upstream), (upstream, connection)):
+            threading.Thread(
+                target=_delay, args=(source, destination, latency), daemon=True
+            ).start()
+
+    proxy_server = _listen()
+    threading.Thread(target=_accept, args=(proxy_server, proxy), daemon=True).start()
+    return proxy_server.getsockname()[1]
+
+
+def start_server(latency=0):
+    """Start a stand-in server in a child process
+
+    The server does not compete with the caller for the interpreter lock.
+    See serve_forever() for @latency.
+    Returns the server process and the local port it listens on.
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.sshd", "--latency", str(latency)],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    return process, int(process.stdout.readline())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--latency", type=float, default=0, help="One-way latency (seconds)"
+    )
+    args = parser.parse_args()
+
+    print(serve_forever(args.latency), flush=True)
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Artifacts of a run: the compressed outputs of tests, stored on disk
+
+Along with the files fetched from remotes by tests, see archive_path().
+"""
+
+import gzip
+import json
+import os
+import zlib
+
+# Default artifacts directory, in the working directory
+ARTIFACTS_DIR = "lift-artifacts"
+
+INDEX_NAME = "index.jsonl"
+
+# Size of the chunks in which logs are read
+LOG_CHUNK_SIZE = 64 * 1024
+
+# Extension of the archives of files fetched by tests
+ARCHIVE_EXTENSION = ".tar.gz"
+
+
+def _test_path(directory, test_string):
+    """Return the path of a test in an artifacts directory, without extension"""
+    # Test strings are relative to the working directory
+    parts = [
+        "__" if part == ".." else part
+        for part in os.path.normpath(test_string).split(os.sep)
+    ]
+    return os.path.join(directory, *parts)
+
+
+def archive_path(directory, test_string, attempt=1):
+    """Return the path of the archive of the files fetched by a run of a test
+
+    @directory is the artifacts directory, @attempt the number of the run.
+    """
+    path = _test_path(directory, test_string)
+    if attempt > 1:
+        path += f".attempt-{attempt}"
+    return path + ARCHIVE_EXTENSION
+
+
+class Artifacts:
+    """Directory storing the outputs of tests, compressed and indexed
+
+    Each run of a test (or fixture) is appended to the log file of the test,
+    "<directory>/<test string>.log.gz", as a distinct gzip member. Logs are
+    listed in an index, one JSON line per run, with the position of the run
+    in its file, so that one run can be read without the others.
+    Archives of the files fetched by the run are listed along with it.
+    """
+
+    def __init__(self, directory):
+        """Open the artifacts stored in @directory, if any"""
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self.logs = []
+        self._tests = {}  # Entries of the index, per normalized test string
+        try:
+            with open(self.index_path) as f:
+                for line in f:
+                    self._append(json.loads(line))
+        except OSError:
+            pass  # No artifacts yet
+        except ValueError:
+            pass  # A partial last line, the run was interrupted
+
+    def log_path(self, test_string):
+        """Return the path of the log file of a test"""
+        return _test_path(self.directory, test_string) + ".log.gz"
+
+    def clear(self):
+        """Remove the logs (and archives) of a previous run"""
+        paths = set()
+        for log in self.logs:
+            paths.add(log["file"])
+            paths.update(log.get("archives", ()))
+        for path in paths:
+            try:
+                os.unlink(os.path.join(self.directory, path))
+            except FileNotFoundError:
+                pass
+        try:
+            os.unlink(self.index_path)
+        except FileNotFoundError:
+            pass
+        self.logs = []
+        self._tests = {}
+
+    def _append(self, log):
+        self.logs.append(log)
+        self._tests.setdefault(os.path.normpath(log["test"]), []).append(log)
+
+    def add(self, test_string, run, result, status):
+        """Store the output of a finished run of a test
+
+        Args:
+            test_string (str): The "FOLDER/TEST_NAME" string of the test
+            run (str): The kind of run, such as "Testing" or "Attempt 2"
+            result (TestResult): The result of the run
+            status (bool): Whether the run was successful
+        """
+        path = self.log_path(test_string)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        output = result.raw_output
+        with open(path, "ab") as f:
+            offset = f.tell()
+            # Not gzip.compress(), which only accepts mtime from Python 3.8
+            with gzip.GzipFile(filename="", mode="wb", fileobj=f, mtime=0) as gz:
+                gz.write(output)
+            length = f.tell() - offset
+
+        lines = output.count(b"\n")
+        if output and not output.endswith(b"\n"):
+            lines += 1
+        log = {
+            "test": test_string,
+            "run": run,
+            "file": os.path.relpath(path, self.directory),
+            "offset": offset,
+            "length": length,
+            "size": len(output),
+            "lines": lines,
+            "result": "passed" if status else "failed",
+            "return_code": result.return_code,
+            "elapsed": round(result.elapsed, 3),
+            "archives": [
+                os.path.relpath(archive, self.directory) for archive in result.archives
+            ],
+        }
+        self._append(log)
+        # One line per run, so that the index stays usable if lift is killed
+        with open(self.index_path, "a") as f:
+            f.write(json.dumps(log) + "\n")
+
+    def logs_of(self, test_string):
+        """Return the index entries of the runs of a test, in order"""
+        return self._tests.get(os.path.normpath(test_string), [])
+
+    def read(self, log):
+        """Yield the decompressed output of a run, by chunks
+
+        @log is an entry of the index.
+        """
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)  # gzip
+        with open(os.path.join(self.directory, log["file"]), "rb") as f:
+            f.seek(log["offset"])
+            left = log["length"]
+            while left > 0:
+                chunk = f.read(min(LOG_CHUNK_SIZE, left))
+                if not chunk:
+                    break  # Truncated file
+                left -= len(chunk)
+                yield decompressor.decompress(chunk)
+        yield decompressor.flush()
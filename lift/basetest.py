@@ -19,14 +19,187 @@
 
 """Base test implementation"""
 
+import codecs
+import glob
 import os
-from io import StringIO
-from threading import Thread
+import shlex
+import time
+from io import BytesIO
+from threading import Condition, Thread
 
 from junit_xml import TestCase
 
+from lift.history import AUTO_TIMEOUT_CEILING
+from lift.matcher import OutputMatcher
 
-class BaseTest(TestCase):
+# Test outputs are kept as bytes, and only decoded when rendered, as
+# OUTPUT_ENCODING. Invalid bytes are handled according to OUTPUT_ERRORS.
+OUTPUT_ENCODING = "utf8"
+OUTPUT_ERRORS = "backslashreplace"
+
+# Size of the chunks in which test outputs are read
+OUTPUT_CHUNK_SIZE = 64 * 1024
+
+# Maximum size of the output waiting to be written to the console (bytes),
+# beyond it output is elided from the console
+CONSOLE_BUFFER_SIZE = 1024 * 1024
+
+
+def decode_output(data):
+    """Decode the raw output of a test"""
+    return data.decode(OUTPUT_ENCODING, OUTPUT_ERRORS)
+
+
+class TextOutput:
+    """Binary file-like object writing decoded data to a text stream"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        # Multi-bytes characters may be split between writes
+        self._decoder = codecs.getincrementaldecoder(OUTPUT_ENCODING)(OUTPUT_ERRORS)
+
+    def write(self, data):
+        self._stream.write(self._decoder.decode(data))
+        return len(data)
+
+    def flush(self):
+        self._stream.flush()
+
+
+def binary_output(stream):
+    """Return a binary file-like object writing to the @stream text file
+
+    It is the underlying binary buffer of @stream if it has one, so that test
+    outputs are not decoded. @stream is flushed, so that what was written to
+    it so far comes first.
+    """
+    stream.flush()
+    buffer = getattr(stream, "buffer", None)
+    if buffer is not None:
+        return buffer
+    return TextOutput(stream)
+
+
+class ConsoleWriter:
+    """Binary file-like object writing to another one from a dedicated thread
+
+    Writes never block: data is queued, then written in batches by the
+    thread, so that a slow console does not slow the test down. If data is
+    queued and @max_pending bytes would be exceeded, new data is dropped
+    instead, and replaced by a notice giving the number of elided lines.
+    close() waits for the queued data to be written.
+    """
+
+    def __init__(self, stream, max_pending=CONSOLE_BUFFER_SIZE):
+        self._stream = stream
+        self._max_pending = max_pending
+        self._pending = []
+        self._pending_size = 0
+        self._elided = 0  # Lines dropped since the last queued data
+        self._closed = False
+        self._condition = Condition()
+        self._thread = Thread(target=self._write_pending)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, data):
+        data = bytes(data)
+        with self._condition:
+            # Only drop data if some is waiting, so that big writes get through
+            if self._pending and self._pending_size + len(data) > self._max_pending:
+                self._elided += max(data.count(b"\n"), 1)
+                return len(data)
+            self._queue_notice()
+            self._pending.append(data)
+            self._pending_size += len(data)
+            self._condition.notify()
+        return len(data)
+
+    def flush(self):
+        """Do nothing, data is written as soon as possible anyway"""
+
+    def close(self):
+        """Write the queued data, then stop the thread"""
+        with self._condition:
+            self._queue_notice()
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _queue_notice(self):
+        """Queue the elided lines notice, if lines were dropped"""
+        if self._elided:
+            self._pending.append(f"\n[{self._elided} lines elided]\n".encode())
+            self._elided = 0
+
+    def _write_pending(self):
+        """Write the queued data until the writer is closed"""
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                data = b"".join(self._pending)
+                self._pending = []
+                self._pending_size = 0
+            try:
+                self._stream.write(data)
+                self._stream.flush()
+            except OSError:
+                pass  # The console is gone, the output is still captured
+
+
+class TestResult:
+    """Runtime state and outcome of a test
+
+    It is only created when a test is run (or skipped), so that test
+    definitions stay cheap to hold in memory, even for huge test suites.
+    """
+
+    __slots__ = (
+        "finished",
+        "return_code",
+        "raw_output",
+        "raw_errors",
+        "failure_message",
+        "skipped_message",
+        "elapsed",
+        "aborted",
+        "archives",
+        "_buffer",
+        "_errors",
+        "_iothreads",
+    )
+
+    def __init__(self):
+        self.finished = False
+        self.return_code = None
+        self.raw_output = b""  # Both stdout and stderr
+        self.raw_errors = b""  # Only stderr, if the test type can tell it apart
+        self.failure_message = None
+        self.skipped_message = None
+        self.elapsed = None
+        self.aborted = False
+        self.archives = []  # Paths of the archives of files fetched by the run
+
+        # Internal variables
+        self._buffer = BytesIO()
+        self._errors = BytesIO()
+        self._iothreads = []
+
+    @property
+    def output(self):
+        """The output of the test, decoded"""
+        return decode_output(self.raw_output)
+
+    @property
+    def errors(self):
+        """The error output of the test, decoded"""
+        return decode_output(self.raw_errors)
+
+
+class BaseTest:
     """Base class for Lift tests
 
     Concrete tests types are supposed to inherit from this.
@@ -34,6 +207,10 @@ class BaseTest(TestCase):
     one just has to call the run() function on it and look for the finished,
     return_code and output attributes.
 
+    A test object is an immutable definition: attributes listed in _fields
+    can not be modified once set. Everything related to a run is stored in a
+    TestResult object, which is only created when needed.
+
     Subclasses shoud override the following functions:
 
     setup()
@@ -45,6 +222,39 @@ class BaseTest(TestCase):
     Please refer to their individual docstrings.
     """
 
+    __slots__ = (
+        "name",
+        "command",
+        "directory",
+        "expected_return_code",
+        "timeout",
+        "environment",
+        "output_matches",
+        "output_must_not_match",
+        "stop_when_output_matches",
+        "retries",
+        "inputs",
+        "tags",
+        "streaming_output",
+        "_result",
+    )
+
+    # Attributes defining the test, they are read-only and used for comparison
+    _fields = (
+        "name",
+        "command",
+        "directory",
+        "expected_return_code",
+        "timeout",
+        "environment",
+        "output_matches",
+        "output_must_not_match",
+        "stop_when_output_matches",
+        "retries",
+        "inputs",
+        "tags",
+    )
+
     def __init__(
         self,
         name,
@@ -54,6 +264,12 @@ class BaseTest(TestCase):
         timeout=0,
         environment={},
         streaming_output=None,
+        output_matches=(),
+        output_must_not_match=(),
+        stop_when_output_matches=(),
+        retries=None,
+        inputs=(),
+        tags=(),
     ):
         """Create a ready to run test object
 
@@ -63,43 +279,45 @@ class BaseTest(TestCase):
             directory (str): The directory in which the test will be executed
             expected_return_code (int): The expected return code of the test
             timeout (int): The time the test run must not exceed.
-                0 means infinite.
-            environment (dict): Environment that will be set for the test
-            streaming_output (file): File in which the command output will be
-                dynamically written. This is typically used to print on
-                sys.stdout or a file. None means 'nowhere'.
+                0 means infinite. "auto" means that it is computed from the
+                history of the test, see run().
+            environment (mapping): Environment that will be set for the test.
+                It is not copied, so it can be shared between tests.
+            streaming_output (file): Binary file in which the command output
+                will be dynamically written, as it is produced. This is
+                typically used to print on sys.stdout, see binary_output().
+                None means 'nowhere'.
+            output_matches (tuple): Compiled regex the output has to match
+            output_must_not_match (tuple): Compiled regex the output must not
+                match. A match ends the test right away, as a failure.
+            stop_when_output_matches (tuple): Compiled regex ending the test
+                right away when matched. The return code is then ignored.
+            retries (int): How many times the test may be run again if it
+                fails. None means the default of the runner.
+            inputs (tuple): Paths of the files the test depends on, relative
+                to its directory, on top of the implicit ones (see
+                input_files()). They may be directories or glob patterns.
+            tags (tuple): Names the test can be selected with, see lift.tags
         """
-        super().__init__(name, classname=f"{directory}/{name}")
-
         self.name = name
         self.command = command
         self.directory = directory
         self.expected_return_code = expected_return_code
         self.timeout = timeout
         self.environment = environment
+        self.output_matches = output_matches
+        self.output_must_not_match = output_must_not_match
+        self.stop_when_output_matches = stop_when_output_matches
+        self.retries = retries
+        self.inputs = inputs
+        self.tags = tags
         self.streaming_output = streaming_output
-        self.failure_message = None
-
-        # Test result
-        self.finished = False
-        self.return_code = None
-        self.output = ""
-
-        # Internal variables
-        self._iothread = None
-        self._output = StringIO()
-
-    def __getattribute__(self, name):
-        """Please junit_xml that wants an stdout attribute.
+        self._result = None
 
-        Our self.output combines both stdout and stderr, so it would be
-        confusing to rename it to just "stdout".
-        Just consider self.stdout an (hidden) alias of self.output.
-        """
-        if name == "stdout":
-            return self.output
-
-        return super().__getattribute__(name)
+    def __setattr__(self, name, value):
+        if name in self._fields and hasattr(self, name):
+            raise AttributeError(f"{self!r}: {name} is read-only")
+        super().__setattr__(name, value)
 
     def __repr__(self):
         return f"{self.__class__.__name__}<{self.name}>"
@@ -107,25 +325,130 @@ class BaseTest(TestCase):
     def __eq__(self, other):
         if not isinstance(other, self.__class__):
             return False
-        for item in self.__dict__:
-            # Do not compare private attributes
-            if item.startswith("_"):
-                continue
-            if self.__dict__[item] != other.__dict__[item]:
+        for item in self._fields:
+            if getattr(self, item) != getattr(other, item):
                 return False
         return True
 
+    @property
+    def result(self):
+        """The TestResult of this test, None if it was not run nor skipped"""
+        return self._result
+
+    @property
+    def finished(self):
+        return self._result is not None and self._result.finished
+
+    @property
+    def return_code(self):
+        return self._result.return_code if self._result is not None else None
+
+    @property
+    def output(self):
+        return self._result.output if self._result is not None else ""
+
+    @property
+    def failure_message(self):
+        return self._result.failure_message if self._result is not None else None
+
+    def reset(self):
+        """Forget the result of a previous run, so that the test can run again"""
+        self._result = None
+
+    def abort(self):
+        """Interrupt the test if it is running
+
+        This is meant to be called from another thread than the one running
+        the test. The test then fails with a dedicated message.
+        """
+        result = self._result
+        if result is None or result.finished or result.aborted:
+            return
+        result.aborted = True
+        self.interrupt_command()
+
+    def skip(self, message):
+        """Mark the test as skipped, for the given reason"""
+        if self._result is None:
+            self._result = TestResult()
+        self._result.skipped_message = message
+
+    def to_xunit(self, result=None):
+        """Build the junit_xml TestCase reporting this test
+
+        This is meant to be called when writing a report, so that such objects
+        never have to be kept around.
+        @result is the TestResult to report, by default the last one.
+        """
+        if result is None:
+            result = self._result
+        case = TestCase(self.name, classname=f"{self.directory}/{self.name}")
+        if result is None:
+            return case
+
+        case.elapsed_sec = result.elapsed
+        # The output holds stderr along with stdout, in the order they were
+        # written: stderr is not reported a second time on its own
+        case.stdout = result.output or None
+        if result.skipped_message is not None:
+            case.add_skipped_info(result.skipped_message)
+        elif result.failure_message is not None:
+            case.add_failure_info(result.failure_message)
+        return case
+
+    def xunit_cases(self):
+        """Return the junit_xml TestCase objects reporting this test
+
+        This implementation only returns the to_xunit() one.
+        """
+        return [self.to_xunit()]
+
+    def input_files(self):
+        """Return the paths of the local files the test depends on
+
+        These are its description file, the files found on its command line
+        (typically, the test executable) and its declared inputs. Directories
+        of declared inputs are listed along with their files, and inputs
+        matching no file are kept, as they may be created.
+        """
+        paths = [os.path.realpath(os.path.join(self.directory, "lift.yaml"))]
+        try:
+            args = shlex.split(self.command)
+        except ValueError:
+            args = []
+        for arg in args:
+            path = os.path.join(self.directory, arg)
+            if os.path.isfile(path):
+                paths.append(os.path.realpath(path))
+        for pattern in self.inputs:
+            pattern = os.path.join(self.directory, pattern)
+            for path in glob.glob(pattern, recursive=True) or [pattern]:
+                paths.append(os.path.realpath(path))
+                for root, _, files in os.walk(path):
+                    paths.extend(os.path.realpath(os.path.join(root, f)) for f in files)
+        return paths
+
     def _finalize_output(self):
-        """Store the output in the object public attribute
+        """Store the output in the result public attribute
 
         Also flush the streaming_output if it exists.
         """
-        self._output.seek(0)
-        self.output = self._output.read()
-        self._output.close()
+        result = self._result
+        result.raw_output = result._buffer.getvalue()
+        result._buffer.close()
+        result.raw_errors = result._errors.getvalue()
+        result._errors.close()
+
+        if self.streaming_output is not None:
+            self.streaming_output.flush()
 
+    def _write_message(self, msg):
+        """Add a message of lift to the output of the test"""
+        data = msg.encode(OUTPUT_ENCODING)
         if self.streaming_output is not None:
             self.streaming_output.flush()
+            self.streaming_output.write(data)
+        self._result._buffer.write(data)
 
     def setup(self):
         """Do whatever preparation before running the test.
@@ -150,69 +473,95 @@ class BaseTest(TestCase):
         """
         return
 
-    def run(self):
+    def run(self, timeout=None):
         """Launch and manage the test execution.
 
         This function block until the completion. It cannot raise.
 
-        If the test takes more than the 'timeout' attribute (seconds)
-        to be ran, it is aborted and return_code is set to 124.
+        If the test takes more than @timeout seconds (by default, its
+        'timeout' attribute) to be ran, it is aborted and return_code is set
+        to 124. If the timeout is "auto", AUTO_TIMEOUT_CEILING is used: it is
+        up to the caller to compute a better one from the history of the test.
 
         Returns:
             A boolean that state if the test was successful or not.
             The test is considered successful if the return_code and
             expected_return_code attributes are identical.
         """
+        if self.finished:
+            # Do not re-run the test
+            return self.return_code == self.expected_return_code
+
+        if timeout is None:
+            timeout = self.timeout
+        if timeout == "auto":
+            timeout = AUTO_TIMEOUT_CEILING
+
+        self._result = TestResult()
+        start = time.monotonic()
         try:
-            return self._run()
+            return self._run(timeout)
         except Exception as exc:
             msg = f"An exception was raised during the test execution:\n{exc}\n"
-            if self.streaming_output is not None:
-                print(self.streaming_output)
-                self.streaming_output.write(msg)
-            self._output.write(msg)
+            self._write_message(f"\n{msg}")
             self._finalize_output()
-            self.failure_message = msg
+            self._result.failure_message = msg
             return False
+        finally:
+            self._result.elapsed = time.monotonic() - start
 
-    def _run(self):
+    def _run(self, timeout):
         """Actual implementation of run()"""
-        if self.finished:
-            # Do not re-run the test
-            return self.return_code == self.expected_return_code
-        try:
-            orig_dir = os.getcwd()
-            os.chdir(self.directory)
-        except OSError as exc:
-            msg = f"\n\n{self.directory}: {exc}\n"
-            if self.streaming_output is not None:
-                self.streaming_output.write(msg)
-            self._output.write(msg)
+        result = self._result
+        # Tests may run concurrently: they do not change the working directory
+        if not os.path.isdir(self.directory):
+            msg = f"\n\n{self.directory}: No such directory\n"
+            self._write_message(msg)
             self._finalize_output()
-            self.failure_message = msg
+            result.failure_message = msg
             return False
 
         self.setup()
 
+        matcher = None
+        if (
+            self.output_matches
+            or self.output_must_not_match
+            or self.stop_when_output_matches
+        ):
+            matcher = OutputMatcher(
+                self.output_matches,
+                self.output_must_not_match,
+                self.stop_when_output_matches,
+                self.interrupt_command,
+                codecs.getincrementaldecoder(OUTPUT_ENCODING)(OUTPUT_ERRORS),
+            )
+
         def copy_output(infile, *outfiles):
             """Write the content of one file to others.
 
             This is implemented via a dedicated thread to avoid blocking.
+            Data is copied as bytes, as soon as it is available, through a
+            single buffer: it is neither split in lines nor decoded.
 
             Args:
-                infile: The input file. It should be opened and readable.
-                outfiles: One or multiple output files. They should be opened
-                    and writable.
+                infile: The binary input file. It should be opened and
+                    readable, and support readinto1() or a readinto() not
+                    waiting for the buffer to be filled (as raw files do).
+                outfiles: One or multiple binary output files. They should be
+                    opened and writable, and not keep the written buffers.
             """
 
             def actual_copy_output(infile, *outfiles):
-                for line in iter(infile.readline, b""):
-                    if isinstance(line, bytes):
-                        line = line.decode("utf8")
-                    elif line == "":  # ...and if we did not read bytes
-                        break  # another sentinel, as b'' != ''
+                readinto = getattr(infile, "readinto1", infile.readinto)
+                buffer = memoryview(bytearray(OUTPUT_CHUNK_SIZE))
+                while True:
+                    size = readinto(buffer)
+                    if not size:
+                        break
+                    data = buffer[:size]
                     for f in outfiles:
-                        f.write(line)
+                        f.write(data)
                 infile.close()
 
             t = Thread(target=actual_copy_output, args=(infile,) + outfiles)
@@ -225,52 +574,81 @@ class BaseTest(TestCase):
 
             This function is ran in a thread to implement the timeout setting.
             """
+            if result.aborted:
+                return
             out = self.command_launch()
             if isinstance(out, str):
                 # An error occurred
-                msg = f"\nAn error occurred: {out}"
-                if self.streaming_output is not None:
-                    self.streaming_output.write(msg)
-                    self.streaming_output.flush()
-                self._output.write(msg)
+                self._write_message(f"\nAn error occurred: {out}")
                 return
 
-            if self.streaming_output is not None:
-                self._iothread = copy_output(out, self.streaming_output, self._output)
+            if isinstance(out, tuple):
+                out, err = out
             else:
-                self._iothread = copy_output(out, self._output)
+                err = None
 
-            self.return_code = self.wait_command_completion()
+            outfiles = (result._buffer,)
+            if matcher is not None:
+                outfiles += (matcher,)
+            if self.streaming_output is not None:
+                outfiles = (self.streaming_output,) + outfiles
+            result._iothreads.append(copy_output(out, *outfiles))
+            if err is not None:
+                result._iothreads.append(copy_output(err, result._errors, *outfiles))
+
+            result.return_code = self.wait_command_completion()
 
         thread = Thread(target=run_command)
         thread.start()
 
-        timeout = self.timeout
         if timeout <= 0:
             timeout = None  # adapt to the thread API
-        thread.join(timeout)
-        if thread.is_alive():
+        try:
+            thread.join(timeout)
+        except KeyboardInterrupt:
+            self.interrupt_command()
+            raise
+        timed_out = thread.is_alive()
+        if timed_out:
             self.interrupt_command()
             thread.join()
-            self.return_code = 124  # same as the 'timeout' command
-            msg = "\n\nTest interrupted: timeout\n"
-            if self.streaming_output is not None:
-                self.streaming_output.flush()
-                self.streaming_output.write(msg)
-            self._output.write(msg)
-
-        self._iothread.join()
-        self._finalize_output()
+            result.return_code = 124  # same as the 'timeout' command
+
+        # The whole output has to be matched before telling why the test ended
+        for iothread in result._iothreads:
+            iothread.join()
+        if timed_out:
+            self._write_message("\n\nTest interrupted: timeout\n")
+        elif result.aborted:
+            self._write_message("\n\nTest interrupted: aborted\n")
+        elif (
+            matcher is not None
+            and matcher.stopped_by is not None
+            and not matcher.forbidden
+        ):
+            self._write_message(
+                f"\n\nTest stopped: output matched {matcher.stopped_by.pattern}\n"
+            )
 
+        # Before the output is finalized, so that cleanup() may add messages
         self.cleanup()
-        os.chdir(orig_dir)
-
-        self.finished = True
-        status = self.return_code == self.expected_return_code
+        self._finalize_output()
 
-        if not status:
-            self.failure_message = (
-                f"Returned {self.return_code} instead of {self.expected_return_code}"
+        result.finished = True
+        status = result.return_code == self.expected_return_code
+
+        if matcher is not None and matcher.stopped_by is not None:
+            # The command was interrupted, its return code does not matter
+            status = True
+        if result.aborted:
+            status = False
+            result.failure_message = "Aborted"
+        elif matcher is not None and matcher.failure() is not None:
+            status = False
+            result.failure_message = matcher.failure()
+        elif not status:
+            result.failure_message = (
+                f"Returned {result.return_code} instead of {self.expected_return_code}"
             )
         return status
 
@@ -280,7 +658,8 @@ class BaseTest(TestCase):
         This implementation does nothing.
 
         Returns:
-            The output stream of the command OR a string containing a message
+            The output stream of the command, OR a (stdout, stderr) tuple of
+            streams if they are not merged, OR a string containing a message
             if the command launch failed.
         """
         return "Not implemented"
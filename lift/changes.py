@@ -0,0 +1,93 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Selection of the tests affected by the changes of a git repository"""
+
+import os
+import subprocess
+
+from lift.exception import ChangeDetectionError
+from lift.matrix import iter_tests
+from lift.watch import index_inputs
+
+
+def git(folder, *args):
+    """Run a git command in @folder and return its output"""
+    try:
+        process = subprocess.run(
+            ["git", *args], cwd=folder, capture_output=True, text=True
+        )
+    except OSError as e:
+        raise ChangeDetectionError(f"Unable to run git: {e}") from e
+    if process.returncode != 0:
+        raise ChangeDetectionError(f"git {args[0]} failed: {process.stderr.strip()}")
+    return process.stdout
+
+
+def changed_files(folder, ref):
+    """Return the set of the real paths of the files changed since @ref
+
+    These are the files of the git repository of @folder that differ from the
+    @ref revision, whether changes are committed or not, plus the untracked
+    files that are not ignored. Both sides of renames are included.
+    """
+    top = git(folder, "rev-parse", "--show-toplevel").strip()
+    names = git(top, "diff", "--name-only", "--no-renames", "-z", ref, "--")
+    names += git(top, "ls-files", "--others", "--exclude-standard", "-z")
+    return {
+        os.path.realpath(os.path.join(top, name)) for name in names.split("\0") if name
+    }
+
+
+def affected_tests(upper_scopes, suites, changed):
+    """Return the test strings of the tests affected by changed files
+
+    A test is affected when one of its inputs (see BaseTest.input_files())
+    changed, or a file in one of its input directories. When a description
+    file or an input of a fixture changed, all tests of its directory tree are
+    affected, as they inherit from it.
+    @changed is a set of real paths, see changed_files().
+    """
+    inputs = index_inputs(upper_scopes, suites)
+    scope_inputs = {}  # Files affecting whole scopes
+    for scope in list(upper_scopes) + [suite.scope for suite in suites]:
+        paths = [os.path.realpath(os.path.join(scope.directory, "lift.yaml"))]
+        for fixture in scope.setups + scope.teardowns:
+            paths.extend(fixture.input_files())
+        for path in paths:
+            scope_inputs.setdefault(path, []).append(scope)
+
+    affected = set()
+    affected_scopes = set()
+    for path in changed:
+        affected_scopes.update(scope_inputs.get(path, []))
+        # The path itself, then the directories containing it
+        while True:
+            affected.update(inputs.get(path, ()))
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+
+    for suite in suites:
+        if any(scope.contains(suite.directory) for scope in affected_scopes):
+            affected.update(
+                f"{suite.directory}/{test.name}" for test in iter_tests(suite.tests)
+            )
+    return affected
@@ -0,0 +1,83 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Thin client of the lift daemon
+
+This module only depends on the standard library, so that a client starts in
+a few milliseconds.
+"""
+
+import json
+import os
+import socket
+import sys
+
+# Environment variable used to define the daemon socket of the client
+DAEMON_ENV = "LIFT_DAEMON"
+
+
+def daemon_socket(argv):
+    """Tell if the command line asks for the client mode
+
+    The client mode is requested with the "--connect SOCKET" option or the
+    LIFT_DAEMON environment variable.
+    Returns the daemon socket path (None if the client mode is not
+    requested) and the command line to forward to the daemon.
+    """
+    if "--daemon" in argv or any(arg.startswith("--daemon=") for arg in argv):
+        return None, argv
+
+    for index, arg in enumerate(argv):
+        if arg == "--connect" and index + 1 < len(argv):
+            return argv[index + 1], argv[:index] + argv[index + 2 :]
+        if arg.startswith("--connect="):
+            return arg.split("=", 1)[1], argv[:index] + argv[index + 1 :]
+
+    return os.environ.get(DAEMON_ENV) or None, argv
+
+
+def submit(socket_path, argv):
+    """Run a lift command line through the daemon listening on socket_path
+
+    The output of the run is streamed to stdout and stderr.
+    Returns the exit status, as expected by sys.exit().
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError as e:
+        return f"Could not connect to the lift daemon ({socket_path}): {e}"
+
+    with client, client.makefile("rwb") as stream:
+        request = {"argv": argv, "cwd": os.getcwd()}
+        stream.write(json.dumps(request).encode() + b"\n")
+        stream.flush()
+
+        for line in stream:
+            message = json.loads(line)
+            if "out" in message:
+                sys.stdout.write(message["out"])
+                sys.stdout.flush()
+            elif "err" in message:
+                sys.stderr.write(message["err"])
+                sys.stderr.flush()
+            elif "exit" in message:
+                return message["exit"]
+
+    return "The connection to the lift daemon was lost."
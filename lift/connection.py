@@ -0,0 +1,381 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""SSH connections to remotes, shared by tests"""
+
+import os
+import re
+import shlex
+import time
+import uuid
+from threading import Lock, Thread
+
+import paramiko
+
+from lift.exception import RemoteUnavailable
+
+# Remote work directories are created in WORKDIR_ROOT, in per-run folders
+# named after WORKDIR_PREFIX
+WORKDIR_ROOT = "/tmp"
+WORKDIR_PREFIX = "lift_test_"
+
+# Work directories left by crashed runs are removed after this delay (minutes)
+STALE_WORKDIR_AGE = 24 * 60
+
+# Files at least this large (bytes) are uploaded through several SFTP channels,
+# if the remote definition allows it
+PARALLEL_UPLOAD_MIN_SIZE = 8 * 1024 * 1024
+
+# Size of the SFTP write requests of parallel uploads (bytes)
+UPLOAD_CHUNK_SIZE = 32768
+
+# Seconds given to remotes to connect, authenticate and answer the health
+# check when warming up
+WARM_UP_TIMEOUT = 10
+
+# Remotes with less free space than this in WORKDIR_ROOT can not run tests
+MIN_FREE_SPACE = 64 * 1024 * 1024
+
+# Remotes whose clock is further away than this from the local one (seconds)
+# get a warning
+MAX_CLOCK_SKEW = 60
+
+# Prints the free space of WORKDIR_ROOT (POSIX df output, in KiB), then the
+# time of the remote
+HEALTH_COMMAND = f"df -Pk {WORKDIR_ROOT} && date +%s"
+
+
+def remote_name(remote):
+    """Return the name of a remote definition, USERNAME@HOST[:PORT]"""
+    name = f"{remote['username']}@{remote['host']}"
+    port = remote.get("port", 22)
+    return name if port == 22 else f"{name}:{port}"
+
+
+def parse_health(output):
+    """Return the free space (bytes) and the time from HEALTH_COMMAND output
+
+    Raises ValueError if the output is not as expected.
+    """
+    lines = output.splitlines()
+    try:
+        # Columns of the df line: filesystem, size, used, available, ...
+        return int(lines[-2].split()[3]) * 1024, int(lines[-1])
+    except (IndexError, ValueError):
+        raise ValueError(f"Unexpected output: {output!r}") from None
+
+
+class ConnectionPool:
+    """SSH connections to remotes, shared by the tests of a run
+
+    There is one connection per remote, opened on first use and kept until
+    cleanup().
+
+    The pool also provides tests with their remote work directories. They are
+    all created in a folder unique to the run, so that concurrent runs and
+    same-named tests never collide, and are removed at once by cleanup().
+
+    warm_up() connects to many remotes at once beforehand, and checks that
+    they can run tests. Remotes that can not are not connected to again, until
+    the next warm-up or cleanup: their tests fail right away.
+
+    Connections and transfers are tuned after these optional items of the
+    remote definitions: "port", "compress" (transport compression),
+    "window size" and "packet size" (of SFTP channels, in bytes, they bound
+    what the remote may send without waiting) and "channels" (number of SFTP
+    channels used to upload a big file, as uploads are bound by the window of
+    the remote).
+    """
+
+    def __init__(self):
+        self.run_id = uuid.uuid4().hex[:12]
+        self._clients = {}
+        self._workdirs_count = {}
+        self._unavailable = {}  # Why remotes can not be used, per key
+        self._locks = {}
+        self._lock = Lock()
+
+    @property
+    def run_folder(self):
+        """The remote folder holding the work directories of this run"""
+        return f"{WORKDIR_ROOT}/{WORKDIR_PREFIX}{self.run_id}"
+
+    @staticmethod
+    def _key(remote):
+        return (remote["host"], remote.get("port", 22), remote["username"])
+
+    def _remote_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, Lock())
+
+    def client(self, remote, timeout=None):
+        """Return a connected paramiko.SSHClient for a remote
+
+        @timeout bounds each step of a new connection (seconds), None means
+        the paramiko defaults.
+        Raises RemoteUnavailable if the last warm-up found that the remote can
+        not be used.
+        """
+        key = self._key(remote)
+        with self._remote_lock(key):
+            error = self._unavailable.get(key)
+            if error is not None:
+                raise RemoteUnavailable(
+                    f"Remote {remote_name(remote)} can not be used: {error}"
+                )
+            client = self._clients.get(key)
+            transport = client.get_transport() if client is not None else None
+            if transport is not None and transport.is_active():
+                return client
+
+            client = self._connect(remote, timeout)
+            self._clients[key] = client
+            return client
+
+    def _connect(self, remote, timeout):
+        """Open a new connection to a remote"""
+        client = paramiko.SSHClient()
+        # Do not fail on key errors
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            remote["host"],
+            port=remote.get("port", 22),
+            username=remote["username"],
+            password=remote.get("password", None),
+            compress=remote.get("compress", False),
+            timeout=timeout,
+            banner_timeout=timeout,
+            auth_timeout=timeout,
+        )
+        # Keep alive may be useful for some big tests
+        client.get_transport().set_keepalive(1)
+        return client
+
+    def warm_up(self, remotes, timeout=WARM_UP_TIMEOUT):
+        """Connect to remotes concurrently, and check that they can run tests
+
+        Each remote is connected to (its connection is then kept for the
+        tests), then the free space of WORKDIR_ROOT and the clock of the
+        remote are checked.
+        Remotes that can not be connected to, or with less than MIN_FREE_SPACE
+        free, are marked as unavailable. Remotes whose clock is more than
+        MAX_CLOCK_SKEW seconds off only get a warning.
+        Returns a dict mapping each remote (see remote_name()) to the reason
+        it is unavailable (or None) and a list of warnings.
+        """
+        remotes = {self._key(remote): remote for remote in remotes}
+        with self._lock:
+            for key in remotes:
+                self._unavailable.pop(key, None)
+
+        reports = {}
+
+        def check(key, remote):
+            reports[key] = self._check_remote(remote, timeout)
+
+        threads = [
+            Thread(target=check, args=(key, remote)) for key, remote in remotes.items()
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with self._lock:
+            for key, (error, _) in reports.items():
+                if error is not None:
+                    self._unavailable[key] = error
+        return {remote_name(remotes[key]): report for key, report in reports.items()}
+
+    def _check_remote(self, remote, timeout):
+        """Actual implementation of warm_up() for a single remote"""
+        try:
+            client = self.client(remote, timeout)
+        except Exception as e:
+            return f"connection failed ({e.__class__.__name__}: {e})", []
+
+        try:
+            before = time.time()
+            _, out, _ = client.exec_command(HEALTH_COMMAND, timeout=timeout)
+            output = out.read().decode(errors="replace")
+            after = time.time()
+            free_space, remote_time = parse_health(output)
+        except Exception as e:
+            # Tests may still work, let them tell
+            return None, [f"health check failed ({e.__class__.__name__}: {e})"]
+
+        error = None
+        if free_space < MIN_FREE_SPACE:
+            error = f"only {free_space // 1024} KiB free in {WORKDIR_ROOT}"
+        warnings = []
+        skew = round(remote_time - (before + after) / 2)
+        if abs(skew) > MAX_CLOCK_SKEW:
+            direction = "ahead" if skew > 0 else "behind"
+            warnings.append(f"clock is {abs(skew)} seconds {direction}")
+        return error, warnings
+
+    def open_sftp(self, remote):
+        """Return a new paramiko.SFTPClient to a remote"""
+        transport = self.client(remote).get_transport()
+        return paramiko.SFTPClient.from_transport(
+            transport,
+            window_size=remote.get("window size"),
+            max_packet_size=remote.get("packet size"),
+        )
+
+    def upload(self, remote, sftp, local_path, remote_path):
+        """Upload a file to a remote, along with its mode
+
+        @sftp is an open paramiko.SFTPClient to the remote. Big files are
+        split across several SFTP channels, if the remote allows it.
+        """
+        size = os.stat(local_path).st_size
+        channels = remote.get("channels", 1)
+        if channels > 1 and size >= PARALLEL_UPLOAD_MIN_SIZE:
+            self._parallel_upload(remote, sftp, local_path, remote_path, channels)
+        else:
+            sftp.put(local_path, remote_path)
+        # Also copy the file mode
+        sftp.chmod(remote_path, os.stat(local_path).st_mode)
+
+    def _parallel_upload(self, remote, sftp, local_path, remote_path, channels):
+        """Upload each part of a file through its own SFTP channel
+
+        A single channel is limited by its window, especially on high latency
+        links. Each channel has its own.
+        """
+        size = os.stat(local_path).st_size
+        with sftp.open(remote_path, "wb") as remote_file:
+            remote_file.truncate(size)
+
+        part_size = -(-size // channels)
+        errors = []
+
+        def upload_part(offset):
+            end = min(offset + part_size, size)
+            try:
+                with self.open_sftp(remote) as part_sftp, open(
+                    local_path, "rb"
+                ) as local_file, part_sftp.open(remote_path, "r+b") as remote_file:
+                    remote_file.set_pipelined(True)
+                    local_file.seek(offset)
+                    remote_file.seek(offset)
+                    while offset < end:
+                        data = local_file.read(min(UPLOAD_CHUNK_SIZE, end - offset))
+                        if not data:
+                            raise IOError(f"{local_path} changed during its upload")
+                        remote_file.write(data)
+                        offset += len(data)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [
+            Thread(target=upload_part, args=(offset,))
+            for offset in range(0, size, part_size)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+        # Same check as paramiko.SFTPClient.put()
+        remote_size = sftp.stat(remote_path).st_size
+        if remote_size != size:
+            raise IOError(f"size mismatch in put!  {remote_size} != {size}")
+
+    def make_workdir(self, remote, name, sftp):
+        """Create a new work directory for a test on a remote
+
+        @sftp is an open paramiko.SFTPClient to the remote.
+        Returns the path of the created directory.
+        """
+        key = self._key(remote)
+        with self._remote_lock(key):
+            count = self._workdirs_count.get(key, 0) + 1
+            if count == 1:
+                try:
+                    sftp.mkdir(self.run_folder)
+                except IOError:
+                    # Already created for another user of the same host?
+                    sftp.stat(self.run_folder)
+            self._workdirs_count[key] = count
+
+        # Keep the path shell-friendly, whatever the test name
+        name = re.sub(r"[^a-zA-Z0-9_\.\-]", "_", name)
+        path = f"{self.run_folder}/{count}_{name}"
+        sftp.mkdir(path)
+        return path
+
+    def cleanup(self, wait=True, close=True):
+        """Remove work directories from remotes and close all connections
+
+        Work directories of this run and stale ones, left by crashed runs, are
+        removed by a single background command per remote. All remotes are
+        handled concurrently.
+        If @wait is False, return without waiting for completion (the
+        interpreter will still wait for it before exiting).
+        If @close is False, connections are kept open and the pool starts a
+        new run, with its own run folder.
+        """
+        with self._lock:
+            clients = dict(self._clients)
+            if close:
+                self._clients = {}
+            self._unavailable = {}
+            run_folder = self.run_folder
+            self.run_id = uuid.uuid4().hex[:12]
+
+        threads = []
+        for key, client in clients.items():
+            clean = self._workdirs_count.pop(key, 0) > 0
+            thread = Thread(
+                target=self._cleanup_remote, args=(client, clean, run_folder, close)
+            )
+            thread.start()
+            threads.append(thread)
+
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _cleanup_remote(self, client, clean, run_folder, close):
+        """Actual implementation of cleanup() for a single remote"""
+        try:
+            if clean:
+                command = (
+                    f"rm -rf {run_folder}; "
+                    f"find {WORKDIR_ROOT} -maxdepth 1 -name '{WORKDIR_PREFIX}*' "
+                    f"-mmin +{STALE_WORKDIR_AGE} -exec rm -rf {{}} +"
+                )
+                # Detach the command from the session, nothing has to wait for it
+                _, out, _ = client.exec_command(
+                    f"nohup sh -c {shlex.quote(command)} >/dev/null 2>&1 &"
+                )
+                out.channel.recv_exit_status()
+        except Exception:
+            pass  # The remote may be down, there is nothing more to do
+        finally:
+            if close:
+                client.close()
+
+
+# Pool used by remote tests that were not given one
+default_pool = ConnectionPool()
@@ -0,0 +1,194 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Long-lived lift process, serving runs to thin clients"""
+
+import json
+import os
+import signal
+import socket
+import stat
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+
+from lift.runner import discover
+
+
+class DiscoveryCache:
+    """Keep discovered suites in memory, as long as their files do not change
+
+    Its discover() method can be used in place of lift.runner.discover().
+    """
+
+    def __init__(self):
+        self._cache = {}
+
+    @staticmethod
+    def _stamps(folder, upper_scopes):
+        """Return the modification times of the description files involved
+
+        The folder tree is walked, so that new description files are noticed.
+        """
+        stamps = {}
+        paths = [os.path.join(scope.directory, "lift.yaml") for scope in upper_scopes]
+        for directory, _, files in os.walk(folder):
+            if "lift.yaml" in files:
+                paths.append(os.path.join(directory, "lift.yaml"))
+        for path in paths:
+            try:
+                stamps[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                stamps[path] = None
+        return stamps
+
+    def discover(
+        self, folder, preset_remotes=None, upper_inheritance=True, remotes_in_env=False
+    ):
+        """Same as lift.runner.discover(), but only load suites when needed"""
+        key = (
+            os.path.realpath(folder),
+            folder,
+            repr(sorted((preset_remotes or {}).items())),
+            upper_inheritance,
+            remotes_in_env,
+        )
+        if key in self._cache:
+            upper_scopes, suites, stamps = self._cache[key]
+            if self._stamps(folder, upper_scopes) == stamps:
+                return upper_scopes, suites
+
+        upper_scopes, suites = discover(
+            folder, preset_remotes, upper_inheritance, remotes_in_env
+        )
+        stamps = self._stamps(folder, upper_scopes)
+        self._cache[key] = (upper_scopes, suites, stamps)
+        return upper_scopes, suites
+
+
+class _ClientLost(Exception):
+    """The connection to the client was lost"""
+
+
+def _send(stream, message, flush=True):
+    """Send a message (a dict) to a client
+
+    Raises _ClientLost if the client went away.
+    """
+    try:
+        stream.write(json.dumps(message).encode() + b"\n")
+        if flush:
+            stream.flush()
+    except OSError as e:
+        raise _ClientLost(e) from e
+
+
+class _StreamWriter:
+    """File-like object sending what is written to a client"""
+
+    def __init__(self, stream, kind):
+        self._stream = stream
+        self._kind = kind
+
+    def write(self, data):
+        _send(self._stream, {self._kind: data}, flush=False)
+        return len(data)
+
+    def flush(self):
+        try:
+            self._stream.flush()
+        except OSError as e:
+            raise _ClientLost(e) from e
+
+
+def serve(socket_path, handler):
+    """Serve lift runs on a Unix socket, until interrupted
+
+    Each client sends a command line and the directory it was run from.
+    @handler is called with the command line, from this directory, and should
+    return the exit status, as expected by sys.exit(). What it writes on
+    stdout and stderr is streamed to the client.
+    Requests are handled one after another.
+    The daemon stops on SIGINT or SIGTERM.
+    Returns an error message if @socket_path exists and is not a socket.
+    """
+    if os.path.lexists(socket_path):
+        if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+            return f"{socket_path} exists and is not a socket."
+        os.unlink(socket_path)  # left by a previous daemon
+
+    # Stop as cleanly on SIGTERM as on a keyboard interruption
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o077)  # Only the owner may run tests
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(old_umask)
+    server.listen()
+    print(f"lift daemon listening on {socket_path}")
+
+    try:
+        while True:
+            connection, _ = server.accept()
+            with connection, connection.makefile("rwb") as stream:
+                _handle(stream, handler)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        server.close()
+        os.unlink(socket_path)
+
+
+def _handle(stream, handler):
+    """Handle the request of a client
+
+    An exception raised by @handler is reported to the client, as it would be
+    by lift itself, with a non-zero exit status.
+    """
+    try:
+        request = json.loads(stream.readline())
+        argv = request["argv"]
+        directory = request["cwd"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return  # The client went away or is not a lift client
+
+    cwd = os.getcwd()
+    out = _StreamWriter(stream, "out")
+    err = _StreamWriter(stream, "err")
+    try:
+        with redirect_stdout(out), redirect_stderr(err):
+            try:
+                os.chdir(directory)
+                status = handler(argv)
+            except SystemExit as e:  # Typically, a command line error
+                status = e.code
+            except _ClientLost:
+                raise
+            except Exception:
+                traceback.print_exc()
+                status = 1
+
+        if status is not None and not isinstance(status, int):
+            status = str(status)
+        _send(stream, {"exit": status})
+    except _ClientLost:
+        pass  # Nobody is waiting for the end of the run
+    finally:
+        os.chdir(cwd)
@@ -26,3 +26,15 @@ class InvalidDescriptionFile(Exception):
 
 class TestException(Exception):
     """Issue during a test execution"""
+
+
+class ChangeDetectionError(Exception):
+    """Issue when listing the files changed in a repository"""
+
+
+class InvalidTagExpression(Exception):
+    """Issue with the syntax of a tag expression"""
+
+
+class RemoteUnavailable(Exception):
+    """Issue with a remote, found when warming up connections"""
@@ -0,0 +1,94 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Setup and teardown fixtures"""
+
+import os
+
+
+class FixtureScope:
+    """Setup and teardown fixtures shared by the tests of a directory tree
+
+    Setups are only run right before the first test of the tree (so nothing
+    is run for a tree without selected tests), and teardowns once all its
+    tests were run.
+    If a setup fails, the tests of the tree should be skipped.
+    """
+
+    def __init__(self, directory, setups, teardowns):
+        """Create a fixture scope
+
+        Args:
+            directory (str): The root directory of the scope
+            setups (list): Tests to run before the tests of the tree
+            teardowns (list): Tests to run after the tests of the tree
+        """
+        self.directory = directory
+        self.setups = setups
+        self.teardowns = teardowns
+
+        self.set_up = False  # Were setups run?
+        self.error = None  # Why setups failed, if they did
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}<{self.directory}>"
+
+    def reset(self):
+        """Forget about previous runs, so that fixtures can be run again"""
+        self.set_up = False
+        self.error = None
+
+    def contains(self, directory):
+        """Is this directory in the scope tree?"""
+        root = os.path.realpath(self.directory)
+        directory = os.path.realpath(directory)
+        return os.path.commonpath([root, directory]) == root
+
+    def setup(self, run_fixture):
+        """Run the setups, if not already done
+
+        @run_fixture is called with each setup test and should return whether
+        it succeeded.
+        Returns the error message if a setup failed, None otherwise.
+        """
+        if self.set_up:
+            return self.error
+        self.set_up = True
+
+        for fixture in self.setups:
+            if not run_fixture(fixture):
+                self.error = f"Setup failed in {self.directory}: {fixture.name}"
+                break
+        return self.error
+
+    def teardown(self, run_fixture):
+        """Run the teardowns, if setups were run
+
+        @run_fixture is called with each teardown test and should return
+        whether it succeeded.
+        Returns False if a teardown failed, True otherwise.
+        """
+        if not self.set_up:
+            return True
+
+        success = True
+        for fixture in self.teardowns:
+            if not run_fixture(fixture):
+                success = False
+        return success
@@ -0,0 +1,253 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Remote test run on a group of remotes"""
+
+import os
+from threading import Lock, Thread
+
+from lift.artifacts import ARCHIVE_EXTENSION
+from lift.basetest import BaseTest
+from lift.remotetest import RemoteTest
+
+
+class _PrefixedOutput:
+    """Binary file-like object writing the output of a member to the group one
+
+    Each line is prefixed with the remote name, and lines of the members are
+    not mixed up.
+    """
+
+    def __init__(self, prefix, outfile, lock):
+        self._prefix = prefix.encode()
+        self._outfile = outfile
+        self._lock = lock
+        self._line_start = True
+
+    def write(self, data):
+        lines = bytes(data).splitlines(keepends=True)
+        with self._lock:
+            chunks = []
+            for line in lines:
+                if self._line_start:
+                    chunks.append(self._prefix)
+                chunks.append(line)
+                self._line_start = line.endswith(b"\n")
+            # At once, so that prefixes are not separated from their line
+            self._outfile.write(b"".join(chunks))
+            self._outfile.flush()
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class GroupTest(BaseTest):
+    """Test as the concurrent execution of a remote command on many remotes
+
+    Each remote of the group gets its own RemoteTest, listed in the members
+    attribute, named after the test and the remote ("TEST_NAME@REMOTENAME").
+    The group test passes if enough members pass: all of them by default, or
+    at least @quorum of them.
+    Its output is the output of its members, each line being prefixed by the
+    remote name, followed by their results.
+    If the archive_path attribute is set, the archives of the files fetched by
+    members are written next to it, suffixed with the remote name.
+    """
+
+    __slots__ = (
+        "members",
+        "quorum",
+        "pool",
+        "archive_path",
+        "_threads",
+        "_pipe",
+        "_quorum_failure",
+    )
+
+    # Class of the members, called like RemoteTest
+    member_class = RemoteTest
+
+    _fields = BaseTest._fields + ("members", "quorum")
+
+    def __init__(
+        self,
+        name,
+        command,
+        remotes,
+        resources=[],
+        directory=".",
+        expected_return_code=0,
+        timeout=0,
+        environment={},
+        streaming_output=None,
+        pty=False,
+        quorum=None,
+        output_matches=(),
+        output_must_not_match=(),
+        stop_when_output_matches=(),
+        retries=None,
+        inputs=(),
+        tags=(),
+        artifacts=(),
+    ):
+        """Create a group test
+
+        @remotes maps remote names to remote definitions. @quorum is the
+        number of members that must pass, None means all of them.
+        Output patterns are evaluated on the output of each member.
+        See BaseTest and RemoteTest for the other arguments.
+        """
+        super().__init__(
+            name,
+            command,
+            directory,
+            expected_return_code,
+            timeout,
+            environment,
+            streaming_output,
+            retries=retries,
+            inputs=inputs,
+            tags=tags,
+        )
+        self.members = tuple(
+            self.member_class(
+                f"{name}@{remote_name}",
+                command,
+                remote,
+                resources=resources,
+                # Members run concurrently, from the directory of the group
+                directory=os.path.abspath(directory),
+                expected_return_code=expected_return_code,
+                timeout=timeout,
+                environment=environment,
+                pty=pty,
+                output_matches=output_matches,
+                output_must_not_match=output_must_not_match,
+                stop_when_output_matches=stop_when_output_matches,
+                artifacts=artifacts,
+            )
+            for remote_name, remote in remotes.items()
+        )
+        self.quorum = len(self.members) if quorum is None else quorum
+
+        self.pool = None
+        self.archive_path = None
+
+        # Internals, only set during a run
+        self._threads = []
+        self._pipe = None
+        self._quorum_failure = None
+
+    def reset(self):
+        super().reset()
+        for member in self.members:
+            member.reset()
+
+    def input_files(self):
+        paths = super().input_files()
+        for member in self.members:
+            paths.extend(member.input_files())
+        return list(dict.fromkeys(paths))
+
+    def xunit_cases(self):
+        """The group is reported along with each of its members that ran"""
+        cases = super().xunit_cases()
+        for member in self.members:
+            if member.result is None:
+                continue
+            case = member.to_xunit()
+            case.classname = f"{self.directory}/{self.name}"
+            cases.append(case)
+        return cases
+
+    def command_launch(self):
+        read_fd, write_fd = os.pipe()
+        self._pipe = os.fdopen(write_fd, "wb")
+        lock = Lock()
+
+        self._threads = []
+        for member in self.members:
+            member.pool = self.pool
+            remote_name = member.name[len(self.name) + 1 :]
+            member.streaming_output = _PrefixedOutput(
+                f"[{remote_name}] ", self._pipe, lock
+            )
+            if self.archive_path is not None:
+                root = self.archive_path[: -len(ARCHIVE_EXTENSION)]
+                member.archive_path = f"{root}@{remote_name}{ARCHIVE_EXTENSION}"
+            thread = Thread(target=member.run)
+            thread.start()
+            self._threads.append(thread)
+
+        return os.fdopen(read_fd, "rb")
+
+    def wait_command_completion(self):
+        for thread in self._threads:
+            thread.join()
+
+        passed = 0
+        return_code = None  # The first unexpected return code, if any
+        summary = ["\n"]
+        for member in self.members:
+            remote_name = member.name[len(self.name) + 1 :]
+            if member.result is not None:
+                self._result.archives.extend(member.result.archives)
+            if member.failure_message is None:
+                passed += 1
+                summary.append(f"{remote_name}: OK\n")
+                continue
+            reason = member.failure_message.strip().splitlines()[-1]
+            summary.append(f"{remote_name}: FAIL ({reason})\n")
+            if return_code is None and member.return_code != self.expected_return_code:
+                return_code = member.return_code
+
+        summary.append(f"{passed}/{len(self.members)} remotes passed")
+        summary.append(f" (quorum: {self.quorum})\n")
+        self._pipe.write("".join(summary).encode())
+        self._pipe.close()
+
+        if passed >= self.quorum:
+            return self.expected_return_code
+        if return_code is None:
+            # Members failed for other reasons than their return code
+            self._quorum_failure = (
+                f"Only {passed}/{len(self.members)} remotes passed "
+                f"(quorum: {self.quorum})"
+            )
+        return return_code
+
+    def _run(self, timeout):
+        self._quorum_failure = None
+        status = super()._run(timeout)
+        result = self._result
+        if self._quorum_failure is not None and result.return_code is None:
+            if not result.aborted:
+                # There is no return code to report
+                result.failure_message = self._quorum_failure
+        return status
+
+    def interrupt_command(self):
+        # Members are aborted concurrently, as each one may take a while to stop
+        # (see RemoteTest.kill_command())
+        threads = [Thread(target=member.abort) for member in self.members]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,119 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Records of test runs, kept from one run to the next"""
+
+import json
+import math
+import os
+import sys
+
+# Number of durations kept per test
+HISTORY_SIZE = 100
+
+# An auto timeout is the 99th percentile of the recorded durations of a test,
+# multiplied by AUTO_TIMEOUT_FACTOR and bound by AUTO_TIMEOUT_FLOOR and
+# AUTO_TIMEOUT_CEILING (seconds). The ceiling is used until
+# AUTO_TIMEOUT_MIN_SAMPLES durations are recorded.
+AUTO_TIMEOUT_FACTOR = 3
+AUTO_TIMEOUT_FLOOR = 10
+AUTO_TIMEOUT_CEILING = 30 * 60
+AUTO_TIMEOUT_MIN_SAMPLES = 5
+
+# Tests taking more than this part of their timeout are reported
+NEAR_TIMEOUT_RATIO = 0.8
+
+# Outcomes of runs, as recorded
+PASSED = "P"
+FAILED = "F"
+PASSED_AFTER_RETRY = "R"
+
+
+class History:
+    """Durations of the previous runs of tests, stored in a JSON file
+
+    Tests are identified by their test string ("FOLDER/TEST_NAME").
+    Only durations of successful runs are recorded.
+    Outcomes of runs are recorded too, to compute flakiness scores.
+    """
+
+    def __init__(self, path):
+        """Load the history stored in @path, if any"""
+        self.path = path
+        try:
+            with open(path) as f:
+                self._tests = json.load(f)["tests"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self._tests = {}  # No history yet, or an unusable one
+
+    def durations(self, test_string):
+        """Return the recorded durations of a test, the oldest first"""
+        return self._tests.get(test_string, {}).get("durations", [])
+
+    def record(self, test_string, elapsed):
+        """Record the duration of a successful run"""
+        entry = self._tests.setdefault(test_string, {})
+        durations = entry.setdefault("durations", [])
+        durations.append(round(elapsed, 3))
+        del durations[:-HISTORY_SIZE]
+
+    def record_outcome(self, test_string, outcome):
+        """Record the final outcome of a run (PASSED, FAILED or PASSED_AFTER_RETRY)"""
+        entry = self._tests.setdefault(test_string, {})
+        entry["outcomes"] = (entry.get("outcomes", "") + outcome)[-HISTORY_SIZE:]
+
+    def flakiness(self, test_string):
+        """Return the flakiness score of a test, from 0 to 1
+
+        It is the part of its recorded runs that only passed after a retry,
+        or whose outcome differs from the previous one.
+        """
+        outcomes = self._tests.get(test_string, {}).get("outcomes", "")
+        if not outcomes:
+            return 0
+        flaky = outcomes.count(PASSED_AFTER_RETRY)
+        previous = outcomes[0]
+        for outcome in outcomes[1:]:
+            if outcome != PASSED_AFTER_RETRY and previous != PASSED_AFTER_RETRY:
+                flaky += outcome != previous
+            previous = outcome
+        return flaky / len(outcomes)
+
+    def auto_timeout(self, test_string):
+        """Return the timeout of a test with an auto timeout (seconds)"""
+        durations = sorted(self.durations(test_string))
+        if len(durations) < AUTO_TIMEOUT_MIN_SAMPLES:
+            return AUTO_TIMEOUT_CEILING
+        p99 = durations[math.ceil(0.99 * len(durations)) - 1]
+        timeout = p99 * AUTO_TIMEOUT_FACTOR
+        return min(max(timeout, AUTO_TIMEOUT_FLOOR), AUTO_TIMEOUT_CEILING)
+
+    def save(self):
+        """Write the history to its file
+
+        Failing to do so only prints a warning, the run itself is not
+        affected.
+        """
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump({"tests": self._tests}, f)
+            os.replace(temp_path, self.path)  # Never leave a partial file
+        except OSError as e:
+            print(f"Warning: the history could not be saved: {e}", file=sys.stderr)
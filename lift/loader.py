@@ -18,13 +18,18 @@
 
 import os
 import re
-import sys
-from collections import OrderedDict
+from collections import ChainMap, OrderedDict
+from functools import partial
+from types import MappingProxyType
 
 import yaml
 
+from lift.tags import OPERATORS, TAG_PATTERN
 from lift.localtest import LocalTest
 from lift.remotetest import RemoteTest
+from lift.grouptest import GroupTest
+from lift.matrix import TestMatrix
+from lift.fixture import FixtureScope
 from lift.exception import InvalidDescriptionFile
 
 
@@ -94,17 +99,303 @@ def remote_to_string(remote):
     return f"{remote['username']}@{remote['host']}"
 
 
-def load_upper_inheritance(directory_path, preset_remotes):
-    """Look for and load remotes/environment from upper level lift.yaml files
+def test_environment(environment, *overrides):
+    """Return the environment of a test, without copying the shared one
 
-    @preset_remotes is a dict of remotes that should be set but not overridden.
-    Returns remotes and environment to inherit from in directory_path.
+    @environment is the environment shared by all tests of a description file.
+    @overrides are test specific mappings, the first ones taking precedence.
     """
+    overrides = [override for override in overrides if override]
+    if not overrides:
+        return environment
+    return MappingProxyType(ChainMap(*overrides, environment))
 
-    remotes = {}
-    environment = {}
 
-    # First, find the higher level lift.yaml file
+def section_test(section, test_name, factory, environment, remotes_env):
+    """Return the test, or the TestMatrix, defined by a test section
+
+    @section is the section content, @factory is called with a test name and
+    an environment to create a test object.
+    The environment of each test is layered on top of @environment.
+    """
+    test_env = section.get("environment")
+    tags = section_tags(section, test_name)
+    if "matrix" not in section:
+        return factory(
+            test_name,
+            environment=test_environment(environment, remotes_env, test_env),
+            tags=tags,
+        )
+
+    axes = section["matrix"]
+    if not isinstance(axes, dict) or not axes:
+        raise InvalidDescriptionFile(
+            f'"{test_name}": matrix should map axis names to lists of values'
+        )
+    for axis, values in axes.items():
+        if not re.match(r"^[a-zA-Z_][a-zA-Z0-9_]*$", str(axis)):
+            raise InvalidDescriptionFile(f'"{test_name}": invalid matrix axis {axis}')
+        if (
+            not isinstance(values, list)
+            or not values
+            or any(isinstance(value, (dict, list)) for value in values)
+        ):
+            raise InvalidDescriptionFile(
+                f'"{test_name}": matrix axis {axis} should be a list of values'
+            )
+
+    def matrix_factory(name, combination):
+        return factory(
+            name,
+            environment=test_environment(
+                environment, remotes_env, combination, test_env
+            ),
+            tags=tags,
+        )
+
+    return TestMatrix(test_name, axes, matrix_factory, tags)
+
+
+def section_timeout(section, section_name):
+    """Return the timeout of a test section, in seconds or "auto" """
+    timeout = section.get("timeout", 0)
+    if timeout != "auto" and (
+        not isinstance(timeout, (int, float)) or isinstance(timeout, bool)
+    ):
+        raise InvalidDescriptionFile(
+            f'"{section_name}": timeout should be a number of seconds or "auto"'
+        )
+    return timeout
+
+
+def section_retries(section, section_name):
+    """Return the number of retries of a test section, None if not set"""
+    retries = section.get("retries")
+    if retries is not None and (
+        not isinstance(retries, int) or isinstance(retries, bool) or retries < 0
+    ):
+        raise InvalidDescriptionFile(
+            f'"{section_name}": retries should be a positive number'
+        )
+    return retries
+
+
+def section_inputs(section, section_name):
+    """Return the declared inputs of a test section, as a tuple of paths"""
+    inputs = section.get("inputs", [])
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    if not isinstance(inputs, list) or not all(isinstance(i, str) for i in inputs):
+        raise InvalidDescriptionFile(
+            f'"{section_name}": inputs should be a list of paths'
+        )
+    return tuple(inputs)
+
+
+def section_tags(section, section_name):
+    """Return the tags of a test section, as a tuple of names"""
+    tags = section.get("tags", [])
+    if isinstance(tags, str):
+        tags = [tags]
+    if not isinstance(tags, list) or not all(
+        isinstance(tag, str) and TAG_PATTERN.match(tag) and tag not in OPERATORS
+        for tag in tags
+    ):
+        raise InvalidDescriptionFile(
+            f'"{section_name}": tags should be a list of names (letters, digits, '
+            '"_", "-" and "."), other than "and", "or" and "not"'
+        )
+    return tuple(dict.fromkeys(tags))
+
+
+def section_artifacts(section, section_name):
+    """Return the artifacts of a remote test section, as a tuple of patterns"""
+    artifacts = section.get("artifacts", [])
+    if isinstance(artifacts, str):
+        artifacts = [artifacts]
+    if not isinstance(artifacts, list) or not all(
+        isinstance(a, str) and a and "\n" not in a for a in artifacts
+    ):
+        raise InvalidDescriptionFile(
+            f'"{section_name}": artifacts should be a list of glob patterns'
+        )
+    return tuple(artifacts)
+
+
+# Multipliers of the memory units
+MEMORY_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def section_needs(section, section_name):
+    """Return the CPUs and memory needed by a test section, as constructor kwargs
+
+    Memory is a number of bytes, or a string with a unit such as "512M".
+    """
+    kwargs = {}
+    cpus = section.get("cpus")
+    if cpus is not None:
+        if not isinstance(cpus, (int, float)) or isinstance(cpus, bool) or cpus < 0:
+            raise InvalidDescriptionFile(
+                f'"{section_name}": cpus should be a positive number'
+            )
+        kwargs["cpus"] = cpus
+
+    memory = section.get("memory")
+    if memory is not None:
+        match = re.match(
+            r"^([0-9]+(?:\.[0-9]+)?) *([KMGT]?)(?:i?B)?$", str(memory), re.I
+        )
+        if isinstance(memory, bool) or not match:
+            raise InvalidDescriptionFile(
+                f'"{section_name}": memory should be a size, such as 512M or 2G'
+            )
+        number, unit = match.groups()
+        kwargs["memory"] = int(float(number) * MEMORY_UNITS[unit.upper()])
+    return kwargs
+
+
+# Output pattern items of tests, and the matching test constructor arguments
+OUTPUT_PATTERNS = {
+    "output matches": "output_matches",
+    "output must not match": "output_must_not_match",
+    "stop when output matches": "stop_when_output_matches",
+}
+
+
+def output_patterns(section, section_name):
+    """Return the output patterns of a test section, as constructor kwargs
+
+    Patterns are compiled, each item may be a regex or a list of regex.
+    """
+    kwargs = {}
+    for item, argument in OUTPUT_PATTERNS.items():
+        if item not in section:
+            continue
+        patterns = section[item]
+        if not isinstance(patterns, list):
+            patterns = [patterns]
+        try:
+            kwargs[argument] = tuple(re.compile(str(p), re.M) for p in patterns)
+        except re.error as e:
+            raise InvalidDescriptionFile(
+                f'"{section_name}": invalid regex in "{item}": {e}'
+            )
+    return kwargs
+
+
+def remote_test_factory(remote, remotes, section, **kwargs):
+    """Return the constructor of the tests of a remote test section
+
+    If @remote is a remote group, tests are GroupTest objects running on each
+    of its members. @kwargs are passed to the test constructor, which has to be
+    called with the test name and its environment.
+    """
+    definition = remotes[remote]
+    kwargs.update(
+        command=section["command"],
+        resources=section.get("resources", []),
+        pty=section.get("pty", False),
+        artifacts=section_artifacts(section, remote),
+    )
+    if "group" not in definition:
+        if "quorum" in section:
+            raise InvalidDescriptionFile(f'"{remote}": quorum is only for groups')
+        return partial(RemoteTest, remote=definition, **kwargs)
+
+    members = {}
+    for member in definition["group"]:
+        if member not in remotes or "group" in remotes[member]:
+            raise InvalidDescriptionFile(f'Unknown remote in "{remote}": {member}')
+        members[member] = remotes[member]
+
+    quorum = section.get("quorum")
+    if quorum == "majority":
+        quorum = len(members) // 2 + 1
+    elif quorum is not None and (
+        not isinstance(quorum, int)
+        or isinstance(quorum, bool)
+        or not 1 <= quorum <= len(members)
+    ):
+        raise InvalidDescriptionFile(
+            f'"{remote}": quorum should be "majority" or a number of remotes'
+        )
+    return partial(GroupTest, remotes=members, quorum=quorum, **kwargs)
+
+
+class DirectoryTrie:
+    """Values attached to directories, looked up from the closest one
+
+    Directories are stored by path component, so that a lookup costs O(depth)
+    whatever the number of directories, and that only whole components match
+    ("foo" is not an ancestor of "foobar").
+    """
+
+    def __init__(self, value=None):
+        """Create a trie, @value being the one of the root directory"""
+        self._root = [value, {}]  # The value of a node and its children
+
+    @staticmethod
+    def _parts(directory):
+        return [
+            part
+            for part in os.path.normpath(directory).split(os.sep)
+            if part not in ("", ".")
+        ]
+
+    def insert(self, directory, value):
+        """Attach @value to @directory"""
+        node = self._root
+        for part in self._parts(directory):
+            node = node[1].setdefault(part, [None, {}])
+        node[0] = value
+
+    def closest(self, directory):
+        """Return the value of @directory, or of its closest ancestor having one"""
+        node = self._root
+        value = node[0]
+        for part in self._parts(directory):
+            node = node[1].get(part)
+            if node is None:
+                break
+            if node[0] is not None:
+                value = node[0]
+        return value
+
+
+def parse_config_file(yaml_path):
+    """Parse a description file and return its content (a dict)
+
+    Raises InvalidDescriptionFile if it is not valid YAML.
+    """
+    with open(yaml_path) as config_file:
+        try:
+            conf = ordered_load(config_file)
+        except yaml.YAMLError as e:
+            raise InvalidDescriptionFile(e) from e
+
+    # Handle empty files
+    if conf is None:
+        conf = {}
+    return conf
+
+
+def try_parse_config_file(yaml_path):
+    """parse_config_file(), returning its error instead of raising it
+
+    Returns a (content, error) tuple. This is the entry point of the processes
+    parsing description files concurrently, see lift.runner.
+    """
+    try:
+        return parse_config_file(yaml_path), None
+    except Exception as e:
+        return None, e
+
+
+def upper_config_files(directory_path):
+    """Return the upper level lift.yaml files of a directory, from top to bottom
+
+    Files are looked for up to the first folder without one.
+    """
     browsed = []
 
     directory = os.path.realpath(directory_path)
@@ -114,47 +405,128 @@ def load_upper_inheritance(directory_path, preset_remotes):
         if not os.path.isfile(upper_file):
             break
         browsed.insert(0, upper_file)
+        directory = parent_directory
         parent_directory = os.path.realpath(os.path.join(parent_directory, ".."))
+    return browsed
+
+
+def load_upper_inheritance(
+    directory_path, preset_remotes, fixture_scopes=None, parse=parse_config_file
+):
+    """Look for and load remotes/environment from upper level lift.yaml files
+
+    @preset_remotes is a dict of remotes that should be set but not overridden.
+    If @fixture_scopes is a list, the FixtureScope of each upper level file is
+    appended to it, from top to bottom.
+    @parse is called to get the content of each file, see parse_config_file().
+    Returns remotes and environment to inherit from in directory_path.
+    Raises InvalidDescriptionFile if an upper level file is not valid.
+    """
+
+    remotes = {}
+    environment = {}
 
     # Load configuration from top to bottom
-    for lift_file in browsed:
+    for lift_file in upper_config_files(directory_path):
+        fixtures = {}
         try:
             _, remotes, environment = load_config_file(
-                lift_file, remotes, environment, preset_remotes
+                lift_file,
+                remotes,
+                environment,
+                preset_remotes,
+                fixtures=fixtures,
+                conf=parse(lift_file),
             )
         except InvalidDescriptionFile as e:
-            sys.exit(f"{lift_file} is not a valid description file: {e}")
+            raise InvalidDescriptionFile(
+                f"{lift_file} is not a valid description file: {e}"
+            ) from e
+        if fixture_scopes is not None:
+            fixture_scopes.append(
+                FixtureScope(
+                    os.path.dirname(lift_file),
+                    fixtures["setup"],
+                    fixtures["teardown"],
+                )
+            )
 
     return remotes, environment
 
 
 def load_config_file(
-    yaml_path, remotes, environment, preset_remotes, remotes_in_env=False
+    yaml_path,
+    remotes,
+    environment,
+    preset_remotes,
+    remotes_in_env=False,
+    fixtures=None,
+    conf=None,
 ):
     """Load a test-suite description file
 
     Parsed remotes and environment are merged with the provided parameters
     (inheritance).
     @preset_remotes is a dict of remotes that should be set but not overridden.
+    If @fixtures is a dict, its "setup" and "teardown" items are set to the
+    lists of setup and teardown tests of the file.
+    @conf is the content of the file, if it was already parsed (see
+    parse_config_file()).
     Returns a list of run-able tests and the new remotes and environment dicts.
+    Parametrized tests are returned as TestMatrix objects, see
+    lift.matrix.iter_tests() to expand them.
     """
     remotes.update(preset_remotes)
 
-    with open(yaml_path) as config_file:
-        conf = ordered_load(config_file)
-
-    # Handle empty files
     if conf is None:
-        conf = {}
+        conf = parse_config_file(yaml_path)
 
     tests = []  # list of all tests
+    if fixtures is None:
+        fixtures = {}
+    fixtures["setup"] = []
+    fixtures["teardown"] = []
     # load settings
     if "settings" in conf:
         for item in conf["settings"]:
+            match = re.match(r"^define group ([a-zA-Z0-9_\-\.]+)$", item)
+            if match:
+                name = match.group(1)
+                if name in (
+                    "test",
+                    "define",
+                    "complex",
+                    "settings",
+                    "setup",
+                    "teardown",
+                ):
+                    raise InvalidDescriptionFile(
+                        f'Groups definition: "{name}" is a reserved word'
+                    )
+                members = conf["settings"][item]
+                if (
+                    not isinstance(members, list)
+                    or not members
+                    or not all(isinstance(member, str) for member in members)
+                ):
+                    raise InvalidDescriptionFile(
+                        f'"{name}" group should be a list of remote names'
+                    )
+                # Members are only looked for when used, they may be redefined
+                remotes[name] = {"group": members}
+                continue
+
             match = re.match(r"^define ([a-zA-Z0-9_\-\.]+)$", item)
             if match:
                 name = match.group(1)
-                if name in ("test", "define", "complex", "settings"):
+                if name in (
+                    "test",
+                    "define",
+                    "complex",
+                    "settings",
+                    "setup",
+                    "teardown",
+                ):
                     raise InvalidDescriptionFile(
                         f'Hosts definition: "{name}" is a reserved word'
                     )
@@ -169,6 +541,22 @@ def load_config_file(
                     )
                 # 'password' is optional, do not look for it
 
+                # Optional connection tuning
+                for key in ("port", "window size", "packet size", "channels"):
+                    value = remotes[name].get(key, 1)
+                    if not isinstance(value, int) or isinstance(value, bool):
+                        raise InvalidDescriptionFile(
+                            f'"{key}" of "{name}" should be an integer'
+                        )
+                    if value < 1:
+                        raise InvalidDescriptionFile(
+                            f'"{key}" of "{name}" should be positive'
+                        )
+                if not isinstance(remotes[name].get("compress", False), bool):
+                    raise InvalidDescriptionFile(
+                        f'"compress" of "{name}" should be a boolean'
+                    )
+
             elif item == "environment":
                 environment.update(conf["settings"]["environment"])
             else:
@@ -176,6 +564,15 @@ def load_config_file(
 
     remotes.update(preset_remotes)  # if a preset remote was overridden
 
+    # All tests of this file share the same (read-only) environment
+    shared_environment = MappingProxyType(dict(environment))
+    remotes_env = {}
+    if remotes_in_env:
+        for remote in remotes:
+            if "group" in remotes[remote]:
+                continue
+            remotes_env[f"LIFT_REMOTE_{remote}"] = remote_to_string(remotes[remote])
+
     for section in conf:
         if section == "settings":
             # Already handled
@@ -186,7 +583,19 @@ def load_config_file(
         if match:
             # validate items
             for item in conf[section]:
-                if item not in ("command", "return code", "timeout", "environment"):
+                if item not in (
+                    "command",
+                    "return code",
+                    "timeout",
+                    "environment",
+                    "matrix",
+                    "retries",
+                    "inputs",
+                    "tags",
+                    "cpus",
+                    "memory",
+                    *OUTPUT_PATTERNS,
+                ):
                     raise InvalidDescriptionFile(
                         f'Unknown section in "{section}": {item}'
                     )
@@ -200,24 +609,20 @@ def load_config_file(
                 raise InvalidDescriptionFile(f'No command defined for "{section}".')
 
             # Create the test object
-            test = LocalTest(
-                test_name,
-                conf[section]["command"],
+            factory = partial(
+                LocalTest,
+                command=conf[section]["command"],
                 directory=os.path.dirname(yaml_path),
                 expected_return_code=conf[section].get("return code", 0),
-                timeout=conf[section].get("timeout", 0),
-                environment=environment.copy(),
+                timeout=section_timeout(conf[section], section),
+                retries=section_retries(conf[section], section),
+                inputs=section_inputs(conf[section], section),
+                **section_needs(conf[section], section),
+                **output_patterns(conf[section], section),
+            )
+            test = section_test(
+                conf[section], test_name, factory, shared_environment, remotes_env
             )
-            # Set the test environment
-            test.environment.update(conf[section].get("environment", {}))
-
-            if remotes_in_env:
-                remotes_env = {}
-                for remote in remotes:
-                    remotes_env[f"LIFT_REMOTE_{remote}"] = remote_to_string(
-                        remotes[remote]
-                    )
-                test.environment.update(remotes_env)
 
             # Add it to the queue
             tests.append(test)
@@ -239,6 +644,14 @@ def load_config_file(
                     "timeout",
                     "resources",
                     "environment",
+                    "matrix",
+                    "pty",
+                    "quorum",
+                    "retries",
+                    "inputs",
+                    "tags",
+                    "artifacts",
+                    *OUTPUT_PATTERNS,
                 ):
                     raise InvalidDescriptionFile(
                         f"Unknown section in {section}: {item}"
@@ -253,31 +666,65 @@ def load_config_file(
                 raise InvalidDescriptionFile(f'No command defined for "{section}".')
 
             # Create the test object
-            test = RemoteTest(
-                test_name,
-                conf[section]["command"],
-                remotes[remote],
-                resources=conf[section].get("resources", []),
+            factory = remote_test_factory(
+                remote,
+                remotes,
+                conf[section],
                 directory=os.path.dirname(yaml_path),
                 expected_return_code=conf[section].get("return code", 0),
-                timeout=conf[section].get("timeout", 0),
-                environment=environment.copy(),
+                timeout=section_timeout(conf[section], section),
+                retries=section_retries(conf[section], section),
+                inputs=section_inputs(conf[section], section),
+                **output_patterns(conf[section], section),
+            )
+            test = section_test(
+                conf[section], test_name, factory, shared_environment, remotes_env
             )
-            # Set the test environment
-            test.environment.update(conf[section].get("environment", {}))
-
-            if remotes_in_env:
-                remotes_env = {}
-                for remote in remotes:
-                    remotes_env[f"LIFT_REMOTE_{remote}"] = remote_to_string(
-                        remotes[remote]
-                    )
-                test.environment.update(remotes_env)
 
             # Add it to the queue
             tests.append(test)
             continue
 
+        # Setup and teardown fixtures, either local or remote
+        match = re.match(r"^(?:([a-zA-Z0-9_\-\.]+) )?(setup|teardown)$", section)
+        if match:
+            remote, kind = match.groups()
+            if remote is not None and remote not in remotes:
+                raise InvalidDescriptionFile(f"Unknown remote: {remote}")
+
+            # validate items
+            allowed = ("command", "return code", "timeout", "environment")
+            allowed += tuple(OUTPUT_PATTERNS)
+            if remote is not None:
+                allowed += ("resources", "pty", "quorum", "artifacts")
+            for item in conf[section]:
+                if item not in allowed:
+                    raise InvalidDescriptionFile(
+                        f'Unknown section in "{section}": {item}'
+                    )
+
+            if "command" not in conf[section]:
+                raise InvalidDescriptionFile(f'No command defined for "{section}".')
+
+            kwargs = {
+                "directory": os.path.dirname(yaml_path),
+                "expected_return_code": conf[section].get("return code", 0),
+                "timeout": section_timeout(conf[section], section),
+                **output_patterns(conf[section], section),
+                "environment": test_environment(
+                    shared_environment,
+                    remotes_env,
+                    conf[section].get("environment"),
+                ),
+            }
+            if remote is None:
+                fixture = LocalTest(kind, conf[section]["command"], **kwargs)
+            else:
+                factory = remote_test_factory(remote, remotes, conf[section], **kwargs)
+                fixture = factory(f"{remote}.{kind}")
+            fixtures[kind].append(fixture)
+            continue
+
         else:
             raise InvalidDescriptionFile(f"Unknown section: {section}")
 
@@ -19,14 +19,45 @@
 
 """Local test implementation"""
 
+import os
 import shlex
-from subprocess import Popen, PIPE, STDOUT
+import signal
+import sys
+from subprocess import Popen, PIPE, STDOUT, SubprocessError
 
 from lift.basetest import BaseTest
 
+# Executed by a Python interpreter to apply limits, then execute the command.
+# Arguments: CPU ids (comma separated) or "", memory or "", command...
+LIMITS_SCRIPT = """
+import os, resource, sys
+cpus, memory, args = sys.argv[1], sys.argv[2], sys.argv[3:]
+if cpus:
+    os.sched_setaffinity(0, [int(cpu) for cpu in cpus.split(",")])
+if memory:
+    resource.setrlimit(resource.RLIMIT_DATA, (int(memory), int(memory)))
+try:
+    os.execvp(args[0], args)
+except OSError as exc:
+    sys.stderr.write(f"Failed to launch command `{args}`: {exc}\\n")
+    sys.exit(127)
+"""
+
 
 class LocalTest(BaseTest):
-    """Test as a local command execution"""
+    """Test as a local command execution
+
+    The limits attribute may be set to a (CPU ids, memory) tuple before a run,
+    to restrict the command to these CPUs and to this amount of memory
+    (bytes) per process. Items may be None, to not restrict.
+    Limits are applied by a Python interpreter, which then executes the command
+    in its own process: nothing escapes them, and nothing but exec() runs
+    between fork() and exec() in lift.
+    """
+
+    __slots__ = ("cpus", "memory", "limits", "_process")
+
+    _fields = BaseTest._fields + ("cpus", "memory")
 
     def __init__(
         self,
@@ -37,6 +68,14 @@ class LocalTest(BaseTest):
         timeout=0,
         environment={},
         streaming_output=None,
+        output_matches=(),
+        output_must_not_match=(),
+        stop_when_output_matches=(),
+        retries=None,
+        inputs=(),
+        tags=(),
+        cpus=1,
+        memory=0,
     ):
         """Create a ready to run LocalTest object
 
@@ -51,6 +90,13 @@ class LocalTest(BaseTest):
             streaming_output (file): File in which the command output will be
                 dynamically written. This is typically used to print on
                 sys.stdout or a file. None means 'nowhere'.
+            output_matches, output_must_not_match, stop_when_output_matches:
+                Output patterns, see BaseTest
+            retries (int): See BaseTest
+            inputs (tuple): See BaseTest
+            tags (tuple): See BaseTest
+            cpus (float): The number of CPUs the test needs
+            memory (int): The memory the test needs, in bytes
         """
         # This is the same as BaseTest constructor, except for a new internal
         # class variable
@@ -62,7 +108,16 @@ class LocalTest(BaseTest):
             timeout,
             environment,
             streaming_output,
+            output_matches,
+            output_must_not_match,
+            stop_when_output_matches,
+            retries,
+            inputs,
+            tags,
         )
+        self.cpus = cpus
+        self.memory = memory
+        self.limits = None
         self._process = None
 
     def command_launch(self):
@@ -73,11 +128,30 @@ class LocalTest(BaseTest):
             if the command launch failed.
         """
         args = shlex.split(self.command)
+        if self.limits is not None:
+            cpu_ids, memory = self.limits
+            args = [
+                sys.executable,
+                "-I",  # Ignore the environment of the test and user site
+                "-S",  # Start faster
+                "-c",
+                LIMITS_SCRIPT,
+                "" if cpu_ids is None else ",".join(map(str, sorted(cpu_ids))),
+                "" if memory is None else str(memory),
+            ] + args
         try:
+            # Use a dedicated session, to be able to interrupt the whole
+            # process tree
             self._process = Popen(
-                args, stdout=PIPE, stderr=STDOUT, env=self.environment, bufsize=0
+                args,
+                stdout=PIPE,
+                stderr=STDOUT,
+                env=self.environment,
+                cwd=self.directory,
+                bufsize=0,
+                start_new_session=True,
             )
-        except OSError as exc:
+        except (OSError, SubprocessError) as exc:
             return f"Failed to launch command `{args}`: {exc}"
         return self._process.stdout
 
@@ -97,4 +171,9 @@ class LocalTest(BaseTest):
 
         This can be because of a timeout or a "Ctrl+C"
         """
-        self._process.terminate()
+        if self._process is None:
+            return
+        try:
+            os.killpg(self._process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass  # Already gone
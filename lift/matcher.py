@@ -0,0 +1,111 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Evaluation of output patterns, as tests run"""
+
+from threading import Lock
+
+# Number of output lines a pattern may span
+LOOKBACK_LINES = 8
+
+# Number of characters a pattern may span, for output without line breaks
+LOOKBACK_CHARS = 4096
+
+
+class OutputMatcher:
+    """Evaluate the output patterns of a test as its output is produced
+
+    It is a binary file-like object, meant to be one of the outputs of the
+    test. Each write is decoded, then patterns are searched in it along with
+    the last LOOKBACK_LINES lines written before (at most LOOKBACK_CHARS
+    characters), so that the cost of each write is bounded, whatever the
+    output size.
+
+    A match of a forbidden pattern or of a stop pattern ends the test right
+    away, by calling @stop.
+    """
+
+    def __init__(self, required, forbidden, stop_patterns, stop, decoder):
+        """Create a matcher
+
+        Args:
+            required (tuple): Compiled patterns the output has to match
+            forbidden (tuple): Compiled patterns the output must not match
+            stop_patterns (tuple): Compiled patterns ending the test
+            stop (callable): Called to end the test
+            decoder (codecs.IncrementalDecoder): Decoder of the output
+        """
+        self._required = list(required)
+        self._forbidden = forbidden
+        self._stop_patterns = stop_patterns
+        self._stop = stop
+        self._decoder = decoder
+        self._tail = ""  # The last lines written
+        self._lock = Lock()
+
+        self.stopped_by = None  # The pattern that ended the test
+        self.forbidden = False  # Was it a forbidden one?
+
+    def write(self, data):
+        with self._lock:
+            if self.stopped_by is not None:
+                return len(data)
+            text = self._tail + self._decoder.decode(data)
+            self._tail = tail(text)
+
+            self._required = [p for p in self._required if not p.search(text)]
+            for pattern in self._forbidden:
+                if pattern.search(text):
+                    self.stopped_by = pattern
+                    self.forbidden = True
+                    break
+            else:
+                for pattern in self._stop_patterns:
+                    if pattern.search(text):
+                        self.stopped_by = pattern
+                        break
+
+        if self.stopped_by is not None:
+            self._stop()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def failure(self):
+        """Return why the output makes the test fail, None if it does not"""
+        if self.forbidden:
+            return f"Output matched a forbidden pattern: {self.stopped_by.pattern}"
+        if self._required:
+            return f"Output did not match: {self._required[0].pattern}"
+        return None
+
+
+def tail(text):
+    """Return the last LOOKBACK_LINES lines of @text
+
+    They are cut to their last LOOKBACK_CHARS characters.
+    """
+    text = text[-LOOKBACK_CHARS:]
+    end = len(text) - 1  # A final line break does not start a new line
+    for _ in range(LOOKBACK_LINES):
+        end = text.rfind("\n", 0, end)
+        if end < 0:
+            return text
+    return text[end + 1 :]
@@ -0,0 +1,131 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Parametrized tests, expanded lazily"""
+
+from itertools import product
+
+
+class TestMatrix:
+    """A test definition expanded over the combinations of some axes
+
+    Each combination gives an individual test named "name[axis=value,...]",
+    with the values of the combination in its environment.
+
+    Combinations are never stored: tests (and their names) are generated on
+    demand, so counting, selecting or sharding a huge matrix is cheap.
+    All tests of a matrix have its tags.
+    """
+
+    __slots__ = ("name", "axes", "tags", "_factory")
+
+    def __init__(self, name, axes, factory, tags=()):
+        """Create a test matrix
+
+        Args:
+            name (str): The base name of the tests
+            axes (dict): Axis names mapped to the list of their values
+            factory (callable): Called with a test name and a combination
+                (an {axis: value} dict) to create the matching test object
+            tags (tuple): The tags of the tests, passed to @factory
+        """
+        self.name = name
+        self.axes = axes
+        self.tags = tags
+        self._factory = factory
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}<{self.name}>"
+
+    def __len__(self):
+        count = 1
+        for values in self.axes.values():
+            count *= len(values)
+        return count
+
+    def __iter__(self):
+        for combination in self.combinations():
+            yield self._factory(self.test_name(combination), combination)
+
+    def __getitem__(self, index):
+        """Return the test of the index-th combination, without expanding"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("TestMatrix index out of range")
+
+        # Decode the index as a mixed radix number, the last axis varying first
+        positions = []
+        for values in reversed(list(self.axes.values())):
+            index, position = divmod(index, len(values))
+            positions.insert(0, position)
+        combination = {
+            axis: str(values[position])
+            for (axis, values), position in zip(self.axes.items(), positions)
+        }
+        return self._factory(self.test_name(combination), combination)
+
+    def combinations(self):
+        """Generate all {axis: value} combinations, values being strings"""
+        axes = list(self.axes)
+        for values in product(*self.axes.values()):
+            yield dict(zip(axes, (str(value) for value in values)))
+
+    def names(self):
+        """Generate the names of all tests, without creating them"""
+        for combination in self.combinations():
+            yield self.test_name(combination)
+
+    def test_name(self, combination):
+        """Return the name of the test matching a combination"""
+        values = ",".join(f"{axis}={value}" for axis, value in combination.items())
+        return f"{self.name}[{values}]"
+
+
+def iter_tests(tests, select=None):
+    """Generate the test objects of a list of tests and test matrices
+
+    Matrices are expanded on the fly.
+    @select is an optional callable, called with test names. Only tests for
+    which it returns True are generated (and created, for matrices).
+    """
+    for test in tests:
+        if not isinstance(test, TestMatrix):
+            if select is None or select(test.name):
+                yield test
+            continue
+
+        for combination in test.combinations():
+            name = test.test_name(combination)
+            if select is None or select(name):
+                yield test._factory(name, combination)
+
+
+def iter_names(tests):
+    """Generate the names of a list of tests and test matrices"""
+    for test in tests:
+        if isinstance(test, TestMatrix):
+            yield from test.names()
+        else:
+            yield test.name
+
+
+def count_tests(tests):
+    """Return the number of tests in a list of tests and test matrices"""
+    return sum(len(test) if isinstance(test, TestMatrix) else 1 for test in tests)
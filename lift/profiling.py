@@ -0,0 +1,111 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Profiling of lift itself, to tell its own overhead from the tests one"""
+
+import cProfile
+import os
+import pstats
+import re
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+# Number of functions and allocation sites listed in the summary
+PROFILE_TOP = 20
+
+# Number of frames stored by tracemalloc for each allocation, so that
+# allocations made by libraries can be attributed to the lift code calling them
+PROFILE_TRACE_FRAMES = 25
+
+# Files considered as lift's own code: the lift package and the lift binary
+LIFT_FILES = re.compile(
+    "^({}|.*{}\\b)".format(
+        re.escape(os.path.join(os.path.dirname(os.path.abspath(__file__)), "")),
+        re.escape(os.path.join(os.sep, "bin", "lift")),
+    )
+)
+
+
+def allocation_sites(snapshot, limit=PROFILE_TOP):
+    """Return the @limit lift lines having allocated the most memory
+
+    Allocations are attributed to the innermost lift frame of their traceback.
+    Returns (size in bytes, "file:line") tuples, the biggest first.
+    """
+    sizes = Counter()
+    for trace in snapshot.traces:
+        # Frames are ordered from the oldest to the most recent one
+        for frame in reversed(trace.traceback):
+            if frame.filename == __file__:
+                break  # Allocated by the profiler itself
+            if LIFT_FILES.match(frame.filename):
+                sizes[f"{frame.filename}:{frame.lineno}"] += trace.size
+                break
+    return [(size, site) for site, size in sizes.most_common(limit)]
+
+
+@contextmanager
+def profiled(path, stream=None, limit=PROFILE_TOP):
+    """Profile the code run in this context, when @path is not None
+
+    Time is profiled with cProfile, in the current thread and in threads
+    started meanwhile (such as the ones copying test outputs), and memory with
+    tracemalloc. The profile is dumped in @path, for "python -m pstats" or any
+    pstats viewer, and a summary of the @limit hottest lift functions and
+    allocation sites is written to @stream (default to the standard error).
+    """
+    if path is None:
+        yield
+        return
+    if stream is None:
+        stream = sys.stderr
+
+    thread_profiles = []
+
+    def profile_thread(frame, event, arg):
+        """Replace itself with a new profiler in each new thread"""
+        profile = cProfile.Profile()
+        thread_profiles.append(profile)
+        profile.enable()
+
+    profile = cProfile.Profile()
+    tracemalloc.start(PROFILE_TRACE_FRAMES)
+    threading.setprofile(profile_thread)
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        threading.setprofile(None)
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        for thread_profile in thread_profiles:
+            thread_profile.create_stats()
+        stats = pstats.Stats(profile, *thread_profiles, stream=stream)
+        stats.dump_stats(path)
+
+        print(f"\nProfile of lift dumped in {path}", file=stream)
+        stats.sort_stats("tottime").print_stats(LIFT_FILES.pattern, limit)
+        print(f"Top {limit} lift allocation sites:", file=stream)
+        for size, site in allocation_sites(snapshot, limit):
+            print(f"{size / 1024:10.1f} KiB  {site}", file=stream)
@@ -20,14 +20,108 @@
 """Remote test implementation"""
 
 import os
-import paramiko
+import shlex
 
-from lift.basetest import BaseTest
+from lift.artifacts import ARTIFACTS_DIR, archive_path
+from lift.basetest import BaseTest, OUTPUT_CHUNK_SIZE
+from lift.connection import default_pool
 from lift.exception import TestException
 
+# File of the work directory keeping the process group of the command
+PID_FILE = ".lift.pid"
+
+# Script of the work directory running the command, see RemoteTest.bootstrap()
+BOOTSTRAP_FILE = ".lift.sh"
+
+# Seconds given to interrupted commands to stop on SIGTERM, before SIGKILL
+KILL_GRACE = 5
+
+# Terminate the process group recorded in the PID file set as $1, then kill it
+# if it is still there after $2 seconds. Prints "killed" if SIGKILL was needed,
+# and "left" if processes are still running after it (zombies do not count).
+KILL_SCRIPT = """pgid=$(cat "$1" 2>/dev/null) || exit 0
+kill -TERM -$pgid 2>/dev/null || exit 0
+alive() {
+    if ps -eo pgid= >/dev/null 2>&1; then
+        ps -eo pgid=,stat= | awk -v g=$pgid '$1 == g && $2 !~ /^Z/ {n++} END {exit !n}'
+    else
+        kill -0 -$pgid 2>/dev/null
+    fi
+}
+i=0
+while alive; do
+    if [ $i -eq $(($2 * 10)) ]; then
+        kill -KILL -$pgid 2>/dev/null && echo killed
+    elif [ $i -eq $(($2 * 10 + 10)) ]; then
+        echo left
+        exit 1
+    fi
+    sleep 0.1 2>/dev/null || sleep 1
+    i=$((i + 1))
+done
+"""
+
+# Archive the files matching the patterns set as arguments, on stdout. Patterns
+# matching nothing are dropped, nothing is written if no file matches.
+FETCH_SCRIPT = """for f do shift; [ -e "$f" ] && set -- "$@" "$f"; done
+[ $# -eq 0 ] || exec tar -czf - -- "$@"
+"""
+
+
+def _shell_pattern(pattern):
+    """Quote a glob pattern for the shell, keeping its wildcards"""
+    return "".join(c if c in "*?[]!" else shlex.quote(c) for c in pattern)
+
+
+class _ChannelReader:
+    """Raw file-like object reading a stream of a channel
+
+    Unlike paramiko files, data is returned as soon as it is received.
+    """
+
+    def __init__(self, recv):
+        self._recv = recv
+
+    def readinto(self, buffer):
+        data = self._recv(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        pass
+
 
 class RemoteTest(BaseTest):
-    """Test as a remote (via ssh) command execution"""
+    """Test as a remote (via ssh) command execution
+
+    Tests get their SSH connection and work directory from their pool
+    attribute, a lift.connection.ConnectionPool (the default pool if None).
+    Work directories are only removed when the pool is cleaned up.
+
+    The command runs in the process group of the bootstrap script, which is
+    recorded in the work directory. If the command is interrupted, this whole
+    group is terminated, then killed after KILL_GRACE seconds, over the test
+    connection.
+
+    Files of the work directory matching the artifacts patterns are fetched
+    once the command ended, as a single compressed archive, written to the
+    archive_path attribute (by default, in the default artifacts directory).
+    """
+
+    __slots__ = (
+        "remote",
+        "resources",
+        "pty",
+        "artifacts",
+        "pool",
+        "archive_path",
+        "_ssh",
+        "_channel",
+        "_remote_test_folder",
+        "_kill_report",
+    )
+
+    _fields = BaseTest._fields + ("remote", "resources", "pty", "artifacts")
 
     def __init__(
         self,
@@ -40,6 +134,14 @@ class RemoteTest(BaseTest):
         timeout=0,
         environment={},
         streaming_output=None,
+        pty=False,
+        output_matches=(),
+        output_must_not_match=(),
+        stop_when_output_matches=(),
+        retries=None,
+        inputs=(),
+        tags=(),
+        artifacts=(),
     ):
 
         super().__init__(
@@ -50,83 +152,225 @@ class RemoteTest(BaseTest):
             timeout,
             environment,
             streaming_output,
+            output_matches,
+            output_must_not_match,
+            stop_when_output_matches,
+            retries,
+            inputs,
+            tags,
         )
         self.remote = remote
         self.resources = resources
+        self.pty = pty
+        self.artifacts = artifacts
+
+        self.pool = None
+        self.archive_path = None
 
-        # Internals
-        self._remote_test_folder = f"/tmp/lift_test_{self.name}"
-        self._ssh = paramiko.SSHClient()
+        # Internals, only set during a run
+        self._ssh = None
         self._channel = None
+        self._remote_test_folder = None
+        self._kill_report = None
 
     def setup(self):
-        # Do not fail on key errors
-        self._ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        self._ssh.connect(
-            self.remote["host"],
-            username=self.remote["username"],
-            password=self.remote.get("password", None),
-        )
-        # Keep alive may be useful for some big tests
-        self._ssh.get_transport().set_keepalive(1)
+        pool = self.pool if self.pool is not None else default_pool
+        self._ssh = pool.client(self.remote)
+
+        with pool.open_sftp(self.remote) as ftp:
+            self._remote_test_folder = pool.make_workdir(self.remote, self.name, ftp)
+            self._upload_resources(pool, ftp)
+            self._upload_bootstrap(ftp)
+
+    def input_files(self):
+        """Return the paths of the local files the test depends on
 
-        ftp = self._ssh.open_sftp()
-        _, out, _ = self._ssh.exec_command(f"rm -rf {self._remote_test_folder}")
-        out.channel.recv_exit_status()  # Wait for completion
-        ftp.mkdir(self._remote_test_folder)
+        Uploaded resources come on top of the BaseTest ones.
+        """
+        paths = super().input_files()
+        for resource in self.resources:
+            resource = os.path.join(self.directory, resource)
+            if os.path.isdir(resource):
+                for root, _, files in os.walk(resource):
+                    paths.extend(os.path.realpath(os.path.join(root, f)) for f in files)
+            else:
+                paths.append(os.path.realpath(resource))
+        return paths
 
-        # Upload needed resources
+    def _upload_resources(self, pool, ftp):
+        """Upload needed resources to the work directory"""
         for resource in self.resources:
-            if os.path.isfile(resource):
+            path = os.path.join(self.directory, resource)
+            if os.path.isfile(path):
                 remote_path = os.path.join(
                     self._remote_test_folder, os.path.basename(resource)
                 )
-                ftp.put(resource, remote_path)
-                # Also copy the file mode
-                ftp.chmod(remote_path, os.stat(resource).st_mode)
+                pool.upload(self.remote, ftp, path, remote_path)
                 continue
-            if os.path.isdir(resource):
-                # Upload the whole folder
-                for root, _, files in os.walk(resource):
-                    ftp.mkdir(os.path.join(self._remote_test_folder, root))
+            if os.path.isdir(path):
+                # Upload the whole folder, keeping its path relative to the test
+                for root, _, files in os.walk(path):
+                    remote_root = os.path.join(
+                        self._remote_test_folder, os.path.relpath(root, self.directory)
+                    )
+                    ftp.mkdir(remote_root)
 
                     for file_ in files:
-                        local_path = os.path.join(root, file_)
-                        remote_path = os.path.join(self._remote_test_folder, local_path)
-
-                        ftp.put(local_path, remote_path)
-                        # Also copy the file mode
-                        ftp.chmod(remote_path, os.stat(local_path).st_mode)
+                        remote_path = os.path.join(remote_root, file_)
+                        pool.upload(
+                            self.remote, ftp, os.path.join(root, file_), remote_path
+                        )
             else:
                 raise TestException(
                     f"Could not upload resource - {resource}: No such file or directory."
                 )
 
+    def _upload_bootstrap(self, ftp):
+        """Write the bootstrap script to the work directory
+
+        Only its owner may read it, as the environment may hold credentials.
+        """
+        path = f"{self._remote_test_folder}/{BOOTSTRAP_FILE}"
+        with ftp.open(path, "w") as f:
+            ftp.chmod(path, 0o600)  # Before anything is written
+            f.write(self.bootstrap())
+
     def cleanup(self):
-        self._ssh.exec_command(f"rm -rf {self._remote_test_folder}")
-        self._ssh.close()
+        if self._kill_report is not None:
+            self._write_message(f"\n{self._kill_report}\n")
+            self._kill_report = None
+        if self.artifacts and not self._result.aborted:
+            self.fetch_artifacts()
+        # The connection is shared and the work directory is removed along
+        # with the others when the pool is cleaned up
+        self._ssh = None
+
+    def fetch_script(self):
+        """Return the shell script archiving the artifacts, on its stdout"""
+        patterns = " ".join(_shell_pattern(p) for p in self.artifacts)
+        return (
+            f"cd {shlex.quote(self._remote_test_folder)} || exit 126\n"
+            f"set -- {patterns}\n{FETCH_SCRIPT}"
+        )
+
+    def fetch_artifacts(self):
+        """Download the files matching the artifacts patterns, as one archive
+
+        The archive is streamed from tar, over an exec channel of the test
+        connection. It is only kept if some files matched. Failures are
+        reported in the output, they do not fail the test.
+        """
+        path = self.archive_path
+        if path is None:
+            path = archive_path(ARTIFACTS_DIR, f"{self.directory}/{self.name}")
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # Set as the channel of the test, so that it can be interrupted
+            self._channel = channel = self._ssh.get_transport().open_session()
+            channel.exec_command(f"sh -c {shlex.quote(self.fetch_script())}")
+            with open(path, "wb") as f:
+                while True:
+                    data = channel.recv(OUTPUT_CHUNK_SIZE)
+                    if not data:
+                        break
+                    f.write(data)
+                size = f.tell()
+            return_code = channel.recv_exit_status()
+            errors = channel.makefile_stderr("rb").read()
+        except Exception as exc:
+            self._write_message(f"\n\nFailed to fetch artifacts: {exc}\n")
+            return
+
+        if return_code != 0:
+            self._write_message(
+                f"\n\nFailed to fetch artifacts (tar returned {return_code}): "
+                f"{errors.decode(errors='replace').strip()}\n"
+            )
+        if size == 0:
+            os.unlink(path)
+            if return_code == 0:
+                self._write_message("\n\nNo file matched the artifacts patterns\n")
+            return
+        self._result.archives.append(path)
+        self._write_message(f"\n\nArtifacts fetched to {path} ({size} bytes)\n")
+
+    def bootstrap(self):
+        """Return the shell script running the command on the remote
+
+        It moves to the work directory, records its process group (see
+        kill_command()), exports the environment and runs the command.
+        Everything is quoted, so that it can be sent as is.
+        It is uploaded by setup() rather than given on the command line, where
+        any user of the remote could read the environment (with ps). It
+        removes itself once started.
+        """
+        lines = [
+            f"cd {shlex.quote(self._remote_test_folder)} || exit 126",
+            f"rm -f {BOOTSTRAP_FILE}",
+            # SSH servers run commands in their own session, the script is
+            # then the leader of its process group. Ask, to be sure.
+            "pgid=$(ps -o pgid= -p $$ 2>/dev/null)",
+            f"echo $((${{pgid:-$$}})) > {PID_FILE}",
+            "unset pgid",
+        ]
+        for key, value in self.environment.items():
+            lines.append(f"export {key}={shlex.quote(str(value))}")
+        lines.append(self.command)
+        return "\n".join(lines)
 
     def command_launch(self):
-        """Launch the command and return the output stream without blocking
+        """Launch the command and return the output streams without blocking
+
+        The bootstrap script uploaded by setup() is run over an exec channel.
+        A pty is only requested if the test asks for one (stderr is then merged
+        in stdout by the remote).
 
         Returns:
-            The output stream of the command
+            The stdout and stderr streams of the command
         """
-        # Insert the environment directly on the command line
         try:
-            command = self.command
-            for key, value in self.environment.items():
-                command = f"{key}={value} {command}"
             self._channel = self._ssh.get_transport().open_session()
-            self._channel.get_pty()
-            out_stream = self._channel.makefile()
-            self._channel.exec_command(f"cd {self._remote_test_folder}; {command}")
-            return out_stream
+            if self.pty:
+                self._channel.get_pty()
+            out_stream = _ChannelReader(self._channel.recv)
+            err_stream = _ChannelReader(self._channel.recv_stderr)
+            bootstrap = f"{self._remote_test_folder}/{BOOTSTRAP_FILE}"
+            self._channel.exec_command(f"sh {shlex.quote(bootstrap)}")
+            return out_stream, err_stream
         except Exception as exc:
-            return f"Failed to launch command `{command}`: {exc}"
+            return f"Failed to launch command `{self.command}`: {exc}"
 
     def wait_command_completion(self):
         return self._channel.recv_exit_status()
 
     def interrupt_command(self):
-        self._channel.close()
+        if self._channel is not None:
+            self._channel.close()
+        ssh, folder = self._ssh, self._remote_test_folder
+        if ssh is not None and folder is not None:
+            self._kill_report = self.kill_command(ssh, folder)
+
+    def kill_command(self, ssh, folder):
+        """Stop the processes of the command, left by the closed channel
+
+        Their process group is terminated, then killed if needed, and checked
+        to be gone. Returns a message if something is worth reporting.
+        """
+        pid_file = shlex.quote(os.path.join(folder, PID_FILE))
+        try:
+            channel = ssh.get_transport().open_session()
+            channel.exec_command(
+                f"sh -c {shlex.quote(KILL_SCRIPT)} lift-kill {pid_file} {KILL_GRACE}"
+            )
+            report = channel.makefile("rb").read().decode(errors="replace")
+            channel.close()
+        except Exception as exc:
+            return f"Failed to stop the remote processes of the command: {exc}"
+        if "left" in report:
+            return "Remote processes of the command are still running after SIGKILL"
+        if "killed" in report:
+            return (
+                "Remote processes of the command were killed, "
+                f"{KILL_GRACE}s after SIGTERM"
+            )
+        return None
@@ -0,0 +1,952 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Discovery and execution of test suites
+
+This is the programmatic interface of lift, for example:
+
+    upper_scopes, suites = discover("path/to/tests")
+    runner = Runner(upper_scopes, suites, silent=True)
+    for outcome in runner.results():
+        print(outcome.test_string, outcome.status)
+"""
+
+import os
+import queue
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from threading import Thread
+
+from junit_xml import TestSuite
+
+from lift.artifacts import ARTIFACTS_DIR, archive_path
+from lift.basetest import ConsoleWriter, binary_output
+from lift.connection import default_pool
+from lift.exception import InvalidDescriptionFile
+from lift.fixture import FixtureScope
+from lift.history import (
+    AUTO_TIMEOUT_CEILING,
+    FAILED,
+    NEAR_TIMEOUT_RATIO,
+    PASSED,
+    PASSED_AFTER_RETRY,
+)
+from lift.loader import (
+    DirectoryTrie,
+    load_config_file,
+    load_upper_inheritance,
+    try_parse_config_file,
+    upper_config_files,
+)
+from lift.matrix import iter_tests
+from lift.tags import tag_index
+
+
+class Suite:
+    """The tests and fixtures of a description file
+
+    The tag_index attribute is the inverted index of the tags of its tests,
+    see lift.tags.tag_index().
+    """
+
+    __slots__ = ("directory", "tests", "scope", "tag_index")
+
+    def __init__(self, directory, tests, scope):
+        """Create a suite
+
+        Args:
+            directory (str): The directory of the description file
+            tests (list): Its tests and test matrices
+            scope (FixtureScope): Its setup and teardown fixtures
+        """
+        self.directory = directory
+        self.tests = tests
+        self.scope = scope
+        self.tag_index = tag_index(tests)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}<{self.directory}>"
+
+
+# Description files are parsed by a pool of processes from this many files.
+# Starting a process costs about as much as parsing 50 files.
+PARALLEL_DISCOVERY_THRESHOLD = 128
+
+# Number of description files parsed at once by a process of the pool
+DISCOVERY_CHUNK_SIZE = 8
+
+
+def parse_config_files(paths, workers=None):
+    """Parse description files, concurrently if there are enough of them
+
+    @workers is the maximum number of processes, by default the number of
+    CPUs. Each one parses at least DISCOVERY_CHUNK_SIZE files. They are
+    spawned rather than forked: forking a process running other threads (SSH
+    connections, the daemon) is unsafe.
+    Returns a dict mapping each path to a (content, error) tuple: error is the
+    exception raised by parse_config_file(), if any. Errors are only raised
+    when the content of their file is needed, so that they are reported in
+    the same order as when parsing files one after another.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(paths) // DISCOVERY_CHUNK_SIZE)
+    if len(paths) < PARALLEL_DISCOVERY_THRESHOLD or workers < 2:
+        return {path: try_parse_config_file(path) for path in paths}
+    with ProcessPoolExecutor(workers, mp_context=get_context("spawn")) as executor:
+        results = executor.map(
+            try_parse_config_file, paths, chunksize=DISCOVERY_CHUNK_SIZE
+        )
+        return dict(zip(paths, results))
+
+
+def discover(folder, preset_remotes=None, upper_inheritance=True, remotes_in_env=False):
+    """Load all description files of a folder tree
+
+    @preset_remotes is a dict of remotes that should be set but not overridden.
+    If @upper_inheritance is set, remotes, environment and fixtures are
+    inherited from upper level lift.yaml files.
+    Description files are parsed concurrently (see parse_config_files()),
+    then loaded in order, each one inheriting from its closest ancestor.
+    Returns the list of fixture scopes inherited from upper level files and
+    the list of suites of the folder tree, in a depth-first order.
+    Raises InvalidDescriptionFile if a description file is not valid.
+    """
+    if preset_remotes is None:
+        preset_remotes = {}
+
+    upper_files = upper_config_files(folder) if upper_inheritance else []
+    directories = []
+    for directory, _, _ in os.walk(folder):
+        if os.path.isfile(os.path.join(directory, "lift.yaml")):
+            directories.append(directory)
+    paths = [os.path.join(directory, "lift.yaml") for directory in directories]
+    contents = parse_config_files(upper_files + paths)
+
+    def parse(path):
+        conf, error = contents[path]
+        if error is not None:
+            raise error
+        return conf
+
+    upper_scopes = []
+    if upper_inheritance:
+        remotes, environment = load_upper_inheritance(
+            folder, preset_remotes, upper_scopes, parse
+        )
+    else:
+        remotes = {}
+        environment = {}
+
+    # Remotes and environment of each loaded folder, for inheritance
+    inheritance = DirectoryTrie((remotes, environment))
+
+    suites = []
+    for directory, path in zip(directories, paths):
+        # Inherit from the closest loaded folder
+        remotes, environment = inheritance.closest(directory)
+
+        # Load the description file
+        fixtures = {}
+        try:
+            tests, remotes, environment = load_config_file(
+                path,
+                remotes.copy(),
+                environment.copy(),
+                preset_remotes,
+                remotes_in_env,
+                fixtures,
+                parse(path),
+            )
+        except InvalidDescriptionFile as e:
+            raise InvalidDescriptionFile(
+                f"{path} is not a valid description file: {e}"
+            ) from e
+
+        inheritance.insert(directory, (remotes, environment))
+        scope = FixtureScope(directory, fixtures["setup"], fixtures["teardown"])
+        suites.append(Suite(directory, tests, scope))
+
+    return upper_scopes, suites
+
+
+def uses_history(upper_scopes, suites):
+    """Do tests or fixtures need the history of previous runs?
+
+    They do if they have an "auto" timeout or their own number of retries.
+    """
+    scopes = list(upper_scopes) + [suite.scope for suite in suites]
+    fixtures = [f for scope in scopes for f in scope.setups + scope.teardowns]
+    for test in fixtures + [t for suite in suites for t in suite.tests]:
+        # All tests of a matrix share these items
+        test = next(iter_tests([test]), None)
+        if test is not None and (test.timeout == "auto" or test.retries):
+            return True
+    return False
+
+
+class Outcome:
+    """What happened to a test (or a fixture) during a run"""
+
+    __slots__ = ("kind", "test", "status", "result")
+
+    def __init__(self, kind, test, status):
+        """Create an outcome
+
+        Args:
+            kind (str): "test", "setup" or "teardown"
+            test (BaseTest): The test
+            status (str): "passed", "failed", "skipped" or "retried" (a failed
+                attempt, the test will be run again)
+        """
+        self.kind = kind
+        self.test = test
+        self.status = status
+        self.result = test.result  # The test result may be reset by a retry
+
+    @property
+    def test_string(self):
+        """The "FOLDER/TEST_NAME" string of the test"""
+        return f"{self.test.directory}/{self.test.name}"
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}<{self.kind} {self.test_string}: {self.status}>"
+        )
+
+
+# Inline global flags, as found at the start of a regex
+INLINE_FLAGS = re.compile(r"\(\?[aiLmsux]+\)")
+
+
+class Runner:
+    """Run test suites and print their progress and results
+
+    Selected tests are run in order, within their setup/teardown fixtures.
+    Use run() to run them at once, or iterate over results() to get each
+    outcome as soon as it is known.
+    Results of the last run are kept in the following attributes:
+    tests_count, skipped_count, failed_tests and failed_fixtures.
+    The cancelled attribute is set if the last run was cancelled, and the
+    not_run attribute lists the test strings it did not run.
+    """
+
+    def __init__(
+        self,
+        upper_scopes,
+        suites,
+        expressions=(),
+        regex=False,
+        tags=None,
+        quiet=False,
+        color=True,
+        detailed_summary=False,
+        silent=False,
+        pool=None,
+        history=None,
+        retries=0,
+        retry_budget=None,
+        quarantine=None,
+        artifacts=None,
+        scheduler=None,
+        warm_up=True,
+    ):
+        """Create a runner
+
+        Args:
+            upper_scopes (list): Fixture scopes of upper level lift.yaml files
+            suites (list): The suites to run, see discover()
+            expressions (list): Select tests matching these test strings
+                ("FOLDER/TEST_NAME"). An empty list selects all tests.
+            regex (bool): Process expressions as Python regex. They are
+                compiled at once, re.error is raised if one is not valid.
+            tags (TagExpression): Only select tests matching this expression
+            quiet (bool): Do not print the output of tests as they run
+            color (bool): Use colors to print results
+            detailed_summary (bool): Print the output of failed tests in the
+                summary
+            silent (bool): Do not print anything, outcomes are only
+                available through results()
+            pool (ConnectionPool): Connection pool used by remote tests,
+                instead of lift.connection.default_pool. Cleaning it up is up
+                to the caller.
+            history (History): Durations of previous runs, used to compute
+                "auto" timeouts. Durations of this run are recorded in it, and
+                it is saved at the end of the run.
+            retries (int): How many times a failed test is run again, unless
+                it defines its own number of retries
+            retry_budget (int): The maximum number of retries of a run, None
+                means no limit
+            quarantine (float): Failures of tests whose flakiness score (see
+                History.flakiness()) reaches this value do not fail the run
+            artifacts (Artifacts): Where to store the outputs of tests. They
+                are then only kept there, not in test results, and the XUnit
+                report refers to them instead of including them.
+            scheduler (Scheduler): Run the tests of each suite concurrently,
+                as the scheduler allows. Their output is then printed once
+                they finished. None means running tests one at a time.
+            warm_up (bool): Connect to the remotes of the selected tests at
+                once before running them, see ConnectionPool.warm_up()
+        """
+        self.upper_scopes = upper_scopes
+        self.suites = suites
+        self.expressions = expressions
+        self.regex = regex
+        self._selection = self._compile_selection()
+        self.tags = tags
+        self.quiet = quiet
+        self.color = color
+        self.detailed_summary = detailed_summary
+        self.silent = silent
+        self.pool = pool
+        self.history = history
+        self.retries = retries
+        self.retry_budget = retry_budget
+        self.quarantine = quarantine
+        self.artifacts = artifacts
+        self.scheduler = scheduler
+        self.warm_up = warm_up
+
+        self.tests_count = 0
+        self.skipped_count = 0
+        self.failed_tests = []
+        self.failed_fixtures = []
+        self.near_timeout = []  # (test, timeout) of tests close to it
+        self.retried_count = 0
+        self.flaky_tests = []  # Tests that passed after a retry
+        self.quarantined_tests = []  # Failed tests that do not fail the run
+
+        self._ran_tests = {}  # Tests ran, per suite directory
+        self._ran_fixtures = {}  # Fixtures ran, per directory
+        self._attempts = {}  # Results of the failed attempts, per test string
+        self._running = {}  # The tests being run, per id
+        self.cancelled = False
+        self.not_run = []
+
+    def _compile_selection(self):
+        """Return the set of test strings, or the compiled regex, to select
+
+        Regex are combined into a single alternation, except the ones with
+        groups: they are matched on their own, as their backreferences would
+        not survive the renumbering of groups. So are the ones with inline
+        global flags (as "(?i)foo"), which are only valid at the start of a
+        regex.
+        """
+        if not self.regex:
+            return frozenset(self.expressions), ()
+        compiled = [re.compile(regex) for regex in self.expressions]
+        combined = []
+        alone = []
+        for regex in compiled:
+            if regex.groups or INLINE_FLAGS.match(regex.pattern):
+                alone.append(regex)
+            else:
+                combined.append(regex.pattern)
+        if not combined:
+            return None, tuple(alone)
+        try:
+            alternation = re.compile("|".join(f"(?:{p})" for p in combined))
+        except re.error:
+            # Should not happen, but matching each regex on its own always works
+            return None, tuple(compiled)
+        return alternation, tuple(alone)
+
+    def is_selected(self, test_string):
+        """Is this test selected by the runner expressions?"""
+        if not self.expressions:
+            return True
+        selection, alone = self._selection
+        if not self.regex:
+            return test_string in selection
+        if selection is not None and selection.match(test_string):
+            return True
+        return any(regex.match(test_string) for regex in alone)
+
+    def tagged_tests(self, suite):
+        """Return the tests and test matrices of a suite selected by tags"""
+        if self.tags is None:
+            return suite.tests
+        names = self.tags.select(suite.tag_index, (t.name for t in suite.tests))
+        return [test for test in suite.tests if test.name in names]
+
+    def selected_remotes(self, select=None):
+        """Return the remote definitions used by the selected tests
+
+        Remotes of the fixtures of the selected tests are included.
+        @select is an optional callable, called with test strings, to use
+        instead of is_selected().
+        """
+        if select is None:
+            select = self.is_selected
+        remotes = []
+        scopes = {}
+
+        def add(test):
+            for member in getattr(test, "members", (test,)):
+                remote = getattr(member, "remote", None)
+                if remote is not None:
+                    remotes.append(remote)
+
+        for suite in self.suites:
+
+            def selected(name):
+                return select(f"{suite.directory}/{name}")
+
+            found = False
+            for test in self.tagged_tests(suite):
+                # All tests of a matrix run on the same remote
+                first = next(iter_tests([test], selected), None)
+                if first is not None:
+                    add(first)
+                    found = True
+            if found:
+                for scope in (*self.upper_scopes, suite.scope):
+                    if scope.contains(suite.directory):
+                        scopes[id(scope)] = scope
+
+        for scope in scopes.values():
+            for fixture in (*scope.setups, *scope.teardowns):
+                add(fixture)
+        return remotes
+
+    def _warm_up(self, select):
+        """Connect to the remotes of the selected tests, and report issues"""
+        remotes = self.selected_remotes(select)
+        if not remotes:
+            return
+        pool = self.pool if self.pool is not None else default_pool
+        for name, (error, warnings) in sorted(pool.warm_up(remotes).items()):
+            if error is not None:
+                self._print(
+                    f"Remote {name} can not be used, its tests will fail: {error}"
+                )
+            for warning in warnings:
+                self._print(f"Warning: remote {name}: {warning}")
+
+    def cancel(self):
+        """Stop the run as soon as possible, from another thread
+
+        The tests being run are aborted and no other test will be run.
+        """
+        self.cancelled = True
+        for test in list(self._running.values()):
+            test.abort()
+
+    def _print(self, *args):
+        if not self.silent:
+            print(*args)
+
+    def run(self, only=None):
+        """Run the selected tests
+
+        If @only is a set of test strings, only run these selected tests.
+        Returns the list of the selected tests that were not run because the
+        run was cancelled.
+        """
+        for _ in self.results(only):
+            pass
+        return self.not_run
+
+    def results(self, only=None):
+        """Run the selected tests, yielding an Outcome as each one finishes
+
+        Fixtures outcomes are yielded too. If @only is a set of test strings,
+        only run these selected tests.
+        Closing the generator before the end stops the run, once the fixtures
+        that were set up are torn down.
+        """
+        self.tests_count = 0
+        self.skipped_count = 0
+        self.failed_tests = []
+        self.failed_fixtures = []
+        self.near_timeout = []
+        self.retried_count = 0
+        self.flaky_tests = []
+        self.quarantined_tests = []
+        self._ran_tests = {}
+        self._ran_fixtures = {}
+        self._attempts = {}
+        self.cancelled = False
+        self.not_run = []
+        if self.artifacts is not None:
+            self.artifacts.clear()
+
+        def select(test_string):
+            if only is not None and test_string not in only:
+                return False
+            return self.is_selected(test_string)
+
+        if self.warm_up:
+            self._warm_up(select)
+
+        # Stack of the setup/teardown fixtures the current suite is part of
+        scopes = list(self.upper_scopes)
+        for scope in scopes:
+            scope.reset()
+
+        # Outcomes of the fixtures run along the way
+        fixtures = []
+
+        def run_fixture(fixture, kind):
+            status = self._run_fixture(fixture, kind.capitalize())
+            fixtures.append(Outcome(kind, fixture, "passed" if status else "failed"))
+            return status
+
+        try:
+            for suite in self.suites:
+                # Tests of the scopes this suite is not part of are all done
+                while scopes and not scopes[-1].contains(suite.directory):
+                    scopes.pop().teardown(lambda f: run_fixture(f, "teardown"))
+                    yield from fixtures
+                    fixtures.clear()
+                suite.scope.reset()
+                scopes.append(suite.scope)
+
+                ran_tests = self._ran_tests[suite.directory] = {}
+                batch = []  # (test, attempt) to run concurrently
+                retry_queue = []  # (test, attempt) of tests to run again
+                tests = iter_tests(
+                    self.tagged_tests(suite),
+                    lambda name: select(f"{suite.directory}/{name}"),
+                )
+                for test in tests:
+                    if self.cancelled:
+                        self.not_run.append(f"{suite.directory}/{test.name}")
+                        continue
+
+                    test.reset()
+                    if self.pool is not None and hasattr(test, "pool"):
+                        test.pool = self.pool
+                    ran_tests[test.name] = test
+
+                    # Make sure the fixtures of the test are set up
+                    for scope in scopes:
+                        error = scope.setup(lambda f: run_fixture(f, "setup"))
+                        if error is not None:
+                            break
+                    yield from fixtures
+                    fixtures.clear()
+                    if error is not None:
+                        test.skip(error)
+                        self.skipped_count += 1
+                        yield Outcome("test", test, "skipped")
+                        continue
+
+                    self.tests_count += 1
+                    if self.scheduler is None:
+                        yield from self._attempt(test, 1, retry_queue)
+                    else:
+                        batch.append((test, 1))
+                yield from self._run_concurrently(batch, retry_queue)
+
+                # Failed tests are run again once the other tests of the suite
+                # ran, while its fixtures are still set up
+                while retry_queue:
+                    retries, retry_queue, batch = retry_queue, [], []
+                    for test, attempt in retries:
+                        if self.cancelled:
+                            self._fail(test)
+                        elif self.scheduler is None:
+                            self._retry(test)
+                            yield from self._attempt(test, attempt + 1, retry_queue)
+                        else:
+                            batch.append((test, attempt + 1))
+                    yield from self._run_concurrently(batch, retry_queue)
+        finally:
+            # Tests of the remaining scopes are all done
+            while scopes:
+                scopes.pop().teardown(lambda f: run_fixture(f, "teardown"))
+            if self.history is not None:
+                self.history.save()
+
+        yield from fixtures
+
+    def _retry(self, test):
+        """Prepare a test to be run again, keeping the result of its attempt"""
+        test_string = f"{test.directory}/{test.name}"
+        self._attempts.setdefault(test_string, []).append(test.result)
+        test.reset()
+
+    def _attempt(self, test, attempt, retry_queue):
+        """Run an attempt of a test, and yield its outcome
+
+        If it fails and may be retried, it is added to @retry_queue.
+        """
+        kind = "Testing" if attempt == 1 else f"Attempt {attempt}"
+        status = self._run_test(test, kind)
+        yield from self._attempt_outcome(test, attempt, retry_queue, status)
+
+    def _run_concurrently(self, batch, retry_queue):
+        """Run attempts of tests concurrently, and yield their outcomes
+
+        @batch lists (test, attempt) tuples. Tests are started in order, as
+        soon as the scheduler gives them room, and their outcome is yielded
+        once they finished. See _attempt() for @retry_queue.
+        """
+        pending = list(batch)
+        attempts = {}  # Attempt of each running test, per id
+        finished = queue.Queue()
+
+        def run(test):
+            status = False
+            try:
+                status = self._execute(test)
+            finally:
+                finished.put((test, status))
+
+        try:
+            while pending or attempts:
+                if self.cancelled:
+                    for test, attempt in pending:
+                        if attempt == 1:
+                            self.tests_count -= 1
+                            self.not_run.append(f"{test.directory}/{test.name}")
+                            del self._ran_tests[test.directory][test.name]
+                        else:
+                            self._fail(test)
+                    pending = []
+
+                waiting = []
+                for test, attempt in pending:
+                    if len(attempts) >= self.scheduler.jobs or not (
+                        self.scheduler.acquire(test)
+                    ):
+                        waiting.append((test, attempt))
+                        continue
+                    if attempt > 1:
+                        self._retry(test)
+                    test.streaming_output = None
+                    attempts[id(test)] = attempt
+                    Thread(target=run, args=(test,)).start()
+                pending = waiting
+                if not attempts:
+                    continue
+
+                test, status = finished.get()
+                attempt = attempts.pop(id(test))
+                self.scheduler.release(test)
+                kind = "Testing" if attempt == 1 else f"Attempt {attempt}"
+                self._print_header(test, kind)
+                if not self.quiet and not self.silent and test.result.raw_output:
+                    output = binary_output(sys.stdout)
+                    output.write(test.result.raw_output)
+                    output.flush()
+                status = self._finish_test(test, kind, status)
+                yield from self._attempt_outcome(test, attempt, retry_queue, status)
+        finally:
+            if attempts:
+                # The run was stopped: abort the tests in flight
+                self.cancel()
+                for _ in range(len(attempts)):
+                    self.scheduler.release(finished.get()[0])
+
+    def _attempt_outcome(self, test, attempt, retry_queue, status):
+        """Yield the outcome of an attempt of a test, given its status"""
+        test_string = f"{test.directory}/{test.name}"
+        if self._was_cancelled(test):
+            # It did not fail, it was stopped before its end: it was not run
+            self.tests_count -= 1
+            self.not_run.append(test_string)
+            del self._ran_tests[test.directory][test.name]
+            return
+
+        if status:
+            if attempt > 1:
+                self.flaky_tests.append(test)
+            if self.history is not None:
+                outcome = PASSED if attempt == 1 else PASSED_AFTER_RETRY
+                self.history.record_outcome(test_string, outcome)
+            yield Outcome("test", test, "passed")
+            return
+
+        retries = self.retries if test.retries is None else test.retries
+        budget_left = (
+            self.retry_budget is None or self.retried_count < self.retry_budget
+        )
+        if attempt <= retries and budget_left and not self.cancelled:
+            self.retried_count += 1
+            retry_queue.append((test, attempt))
+            yield Outcome("test", test, "retried")
+            return
+
+        self._fail(test)
+        yield Outcome("test", test, "failed")
+
+    def _was_cancelled(self, test):
+        """Was the test aborted because the run was cancelled?"""
+        return self.cancelled and test.result.aborted
+
+    def _fail(self, test):
+        """Account for the final failure of a test"""
+        test_string = f"{test.directory}/{test.name}"
+        quarantined = (
+            self.quarantine is not None
+            and self.history is not None
+            and self.history.flakiness(test_string) >= self.quarantine
+        )
+        if self.history is not None:
+            self.history.record_outcome(test_string, FAILED)
+        if quarantined:
+            self.quarantined_tests.append(test)
+        else:
+            self.failed_tests.append(test)
+
+    def _timeout(self, test):
+        """Return the timeout of a test, computing "auto" ones"""
+        if test.timeout != "auto":
+            return test.timeout
+        if self.history is None:
+            return AUTO_TIMEOUT_CEILING
+        return self.history.auto_timeout(f"{test.directory}/{test.name}")
+
+    def _print_header(self, test, kind):
+        """Print the line introducing the output of a test"""
+        test_string = f"{test.directory}/{test.name} "
+        self._print("\n{0}: {1:-<{2}}".format(kind, test_string, 78 - len(kind)))
+
+    def _execute(self, test):
+        """Run a test, and return its status"""
+        if hasattr(test, "archive_path"):
+            # Remote tests fetch their artifacts next to the logs, per attempt
+            test_string = f"{test.directory}/{test.name}"
+            attempt = len(self._attempts.get(test_string, ())) + 1
+            directory = ARTIFACTS_DIR
+            if self.artifacts is not None:
+                directory = self.artifacts.directory
+            test.archive_path = archive_path(directory, test_string, attempt)
+        self._running[id(test)] = test
+        try:
+            return test.run(self._timeout(test))
+        finally:
+            del self._running[id(test)]
+
+    def _run_test(self, test, kind="Testing"):
+        """Run a test (or a fixture) and print its result"""
+        self._print_header(test, kind)
+        if self.quiet or self.silent:
+            return self._finish_test(test, kind, self._execute(test))
+
+        # The output is printed as it comes, without ever blocking the test
+        console = test.streaming_output = ConsoleWriter(binary_output(sys.stdout))
+        try:
+            status = self._execute(test)
+        finally:
+            console.close()
+            test.streaming_output = None
+        return self._finish_test(test, kind, status)
+
+    def _finish_test(self, test, kind, status):
+        """Keep track of the result of a test, and print it"""
+        if self._was_cancelled(test):
+            self._print("\nResult: CANCELLED")
+            return False
+
+        test_string = f"{test.directory}/{test.name} "
+        timeout = self._timeout(test)
+        elapsed = test.result.elapsed
+        if status and self.history is not None:
+            self.history.record(test_string.strip(), elapsed)
+        if self.artifacts is not None:
+            self.artifacts.add(test_string.strip(), kind, test.result, status)
+            test.result.raw_output = test.result.raw_errors = b""
+        # Tests that timed out are not close to their timeout, they reached it
+        if timeout > 0 and timeout * NEAR_TIMEOUT_RATIO <= elapsed < timeout:
+            self.near_timeout.append((test, timeout))
+
+        if status:
+            # TODO: align status according to output size
+            if self.color:
+                # Green
+                self._print("\nResult: \033[92mOK\033[0m")
+            else:
+                self._print("\nResult: OK")
+        else:
+            if self.color:
+                # Red
+                self._print("\nResult: \033[91mFAIL\033[0m")
+            else:
+                self._print("\nResult: FAIL")
+        return status
+
+    def _run_fixture(self, fixture, kind):
+        """Run a setup or teardown fixture, and keep track of its result"""
+        fixture.reset()
+        self._ran_fixtures.setdefault(fixture.directory, []).append(fixture)
+        status = self._run_test(fixture, kind)
+        if not status:
+            self.failed_fixtures.append(fixture)
+        return status
+
+    def print_summary(self):
+        """Print the summary of the last run
+
+        Returns whether the run was successful.
+        """
+        self._print("\nEnd of tests.")
+        failures = self.failed_fixtures + self.failed_tests
+        if failures:
+            self._print("=" * 80)
+            self._print("\nSummary of failed tests:\n")
+        for test in failures:
+            reason = (
+                f"returned {test.return_code} instead of {test.expected_return_code}"
+            )
+            if test.failure_message not in (None, reason.capitalize()):
+                # Failed for another reason than its return code
+                reason = f"failed: {test.failure_message.strip()}"
+            self._print(f"\n{test.directory}/{test.name} {reason}\n")
+            if self.detailed_summary:
+                self._print_output(test)
+
+            self._print("####")
+
+        if self.flaky_tests:
+            self._print("\nTests that passed after a retry:\n")
+        for test in self.flaky_tests:
+            attempts = len(self._attempts[f"{test.directory}/{test.name}"]) + 1
+            self._print(f"{test.directory}/{test.name} ({attempts} attempts)")
+
+        if self.quarantined_tests:
+            self._print("\nFailures of quarantined (flaky) tests, ignored:\n")
+        for test in self.quarantined_tests:
+            test_string = f"{test.directory}/{test.name}"
+            score = self.history.flakiness(test_string)
+            self._print(
+                f"{test_string}: {test.failure_message} (flakiness {score:.0%})"
+            )
+
+        if self.near_timeout:
+            self._print("\nTests close to their timeout:\n")
+        for test, timeout in self.near_timeout:
+            self._print(
+                f"{test.directory}/{test.name} took {test.result.elapsed:.1f}s,"
+                f" {test.result.elapsed / timeout:.0%} of its {timeout:g}s timeout"
+            )
+
+        if self.skipped_count:
+            self._print(
+                f"\n{self.skipped_count} test(s) skipped because of a setup failure"
+            )
+
+        if self.tests_count:
+            success_count = self.tests_count - len(self.failed_tests)
+            success_count -= len(self.quarantined_tests)
+            self._print(
+                "\nPass rate: %d/%d (%d%%)\n"
+                % (
+                    success_count,
+                    self.tests_count,
+                    int(round((success_count / self.tests_count) * 100)),
+                )
+            )
+
+        return not failures
+
+    def _print_output(self, test):
+        """Print the output of the last run of a failed test"""
+        if self.artifacts is None:
+            if test.output:
+                self._print(f"The output was:\n{test.output}\n")
+            return
+
+        logs = self.artifacts.logs_of(f"{test.directory}/{test.name}")
+        if self.silent or not logs or not logs[-1]["size"]:
+            return
+        print("The output was:")
+        output = binary_output(sys.stdout)
+        for chunk in self.artifacts.read(logs[-1]):
+            output.write(chunk)
+        output.flush()
+        print("\n")
+
+    def report(self, xunit_path=None):
+        """Print the summary of the last run, and write its XUnit report
+
+        The XUnit report is only written if @xunit_path is set.
+        Returns the exit status of the run, as expected by sys.exit().
+        """
+        if self.tests_count == 0 and not self.failed_fixtures:
+            return "No test was run!"
+
+        success = self.print_summary()
+        if xunit_path is not None:
+            self.write_xunit(xunit_path)
+
+        if not success:
+            return 1
+        self._print("Congratulation! 👍\n")
+        return 0
+
+    def xunit_suites(self):
+        """Return the junit_xml TestSuite objects reporting the last run"""
+        ran_fixtures = dict(self._ran_fixtures)
+        suites = []
+        for suite in self.suites:
+            ran_tests = self._ran_tests.get(suite.directory, {})
+            fixtures = ran_fixtures.pop(suite.directory, [])
+            cases = [case for fixture in fixtures for case in self._cases(fixture)]
+            for test in iter_tests(suite.tests):
+                # Report the test that was actually ran, if any
+                if test.name in ran_tests:
+                    test = ran_tests[test.name]
+                    # Along with its failed attempts
+                    attempts = self._attempts.get(f"{suite.directory}/{test.name}", [])
+                    for attempt, result in enumerate(attempts, 1):
+                        case = test.to_xunit(result)
+                        case.name = f"{test.name} (attempt {attempt})"
+                        cases.extend(self._cases(test, [case]))
+                else:
+                    # Suites may be reused: forget results of previous runs
+                    test.reset()
+                    test.skip("Not selected from the command line.")
+                cases.extend(self._cases(test))
+            suites.append(TestSuite(suite.directory, cases))
+
+        for directory, fixtures in ran_fixtures.items():
+            # Fixtures inherited from upper level lift.yaml files
+            cases = [case for fixture in fixtures for case in self._cases(fixture)]
+            suites.append(TestSuite(directory, cases))
+        return suites
+
+    def _cases(self, test, cases=None):
+        """Return the XUnit cases of a test (by default, its xunit_cases())
+
+        If its output was stored in the artifacts, cases refer to its log file
+        instead of including the output, in the format of the Jenkins
+        attachments plugin.
+        """
+        if cases is None:
+            cases = test.xunit_cases()
+        if self.artifacts is None:
+            return cases
+        test_string = f"{test.directory}/{test.name}"
+        if not self.artifacts.logs_of(test_string):
+            return cases
+        path = os.path.abspath(self.artifacts.log_path(test_string))
+        for case in cases:
+            case.stdout = f"[[ATTACHMENT|{path}]]"
+            case.stderr = None
+        return cases
+
+    def write_xunit(self, path):
+        """Write the XUnit report of the last run"""
+        with open(path, "w") as f:
+            TestSuite.to_file(f, self.xunit_suites(), prettyprint=False)
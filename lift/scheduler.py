@@ -0,0 +1,116 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Packing of concurrent tests against the capacity of the machine"""
+
+import math
+import os
+
+
+def machine_capacity():
+    """Return the CPUs (a set of ids) and the memory (bytes) tests can use
+
+    The memory is the one currently available, None if it can not be known.
+    """
+    try:
+        cpus = os.sched_getaffinity(0)
+    except AttributeError:  # Not on Linux
+        cpus = set(range(os.cpu_count() or 1))
+
+    memory = None
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    memory = int(line.split()[1]) * 1024
+                    break
+    except (OSError, ValueError, IndexError):
+        pass
+    return cpus, memory
+
+
+class Scheduler:
+    """Decide which tests may run at once, given what they need
+
+    Tests may declare the CPUs and the memory they need, with their cpus and
+    memory attributes (local tests do). Tests without such attributes, such
+    as remote tests, need nothing locally and only count against the number
+    of jobs.
+    A test is given room if its needs fit in what is left of the capacity of
+    the machine, or if no other test is running (so that tests needing more
+    than the capacity still run, alone).
+
+    If limits are enforced, tests that have a limits attribute are given the
+    ids of the CPUs they may use and the memory they may allocate, see
+    LocalTest. CPUs needs are then rounded up.
+    """
+
+    def __init__(self, jobs, enforce=False, capacity=None):
+        """Create a scheduler
+
+        Args:
+            jobs (int): The maximum number of tests running at once
+            enforce (bool): Restrict tests to the resources they declared
+            capacity (tuple): The (CPU ids, memory) of the machine, measured
+                by default (see machine_capacity())
+        """
+        self.jobs = jobs
+        self.enforce = enforce
+        self.cpu_ids, self.memory = capacity or machine_capacity()
+
+        self._running = {}  # Resources given to running tests, per test id
+        self._free_ids = set(self.cpu_ids)
+        self._used_cpus = 0
+        self._used_memory = 0
+
+    def needs(self, test):
+        """Return the (CPUs, memory) a test needs"""
+        cpus = getattr(test, "cpus", 0)
+        if self.enforce:
+            cpus = math.ceil(cpus)
+        return cpus, getattr(test, "memory", 0)
+
+    def acquire(self, test):
+        """Give room to a test if possible, returns whether it was given"""
+        if self._running and len(self._running) >= self.jobs:
+            return False
+        cpus, memory = self.needs(test)
+        if self._running and (
+            self._used_cpus + cpus > len(self.cpu_ids)
+            or (self.memory is not None and self._used_memory + memory > self.memory)
+        ):
+            return False
+
+        ids = set()
+        if self.enforce:
+            ids = set(sorted(self._free_ids)[:cpus])
+            self._free_ids -= ids
+            if hasattr(test, "limits"):
+                test.limits = (ids or None, memory or None)
+        self._running[id(test)] = (cpus, memory, ids)
+        self._used_cpus += cpus
+        self._used_memory += memory
+        return True
+
+    def release(self, test):
+        """Take back the room given to a test, once it finished"""
+        cpus, memory, ids = self._running.pop(id(test))
+        self._used_cpus -= cpus
+        self._used_memory -= memory
+        self._free_ids |= ids
@@ -0,0 +1,127 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Selection of tests by tags, with boolean expressions"""
+
+import re
+
+from lift.exception import InvalidTagExpression
+
+# Valid tag names. The operators of expressions can not be used as tags.
+TAG_PATTERN = re.compile(r"^[a-zA-Z0-9_\-\.]+$")
+OPERATORS = ("and", "or", "not")
+
+_TOKENS = re.compile(r"\s*(?:([()])|([a-zA-Z0-9_\-\.]+)|(\S))")
+
+
+def tag_index(tests):
+    """Return the inverted index of the tags of a list of tests
+
+    It maps each tag to the frozenset of the names of the tests (or test
+    matrices) having it.
+    """
+    index = {}
+    for test in tests:
+        for tag in test.tags:
+            index.setdefault(tag, set()).add(test.name)
+    return {tag: frozenset(names) for tag, names in index.items()}
+
+
+class TagExpression:
+    """A boolean expression of tags, such as "smoke and not (slow or flaky)"
+
+    "not" binds tighter than "and", which binds tighter than "or".
+    Expressions are answered with set operations on the inverted indexes of
+    suites (see tag_index()), so that tests are never looked at one by one.
+    """
+
+    def __init__(self, text):
+        """Parse @text, raises InvalidTagExpression if it is not valid"""
+        self.text = text
+        self._tokens = []
+        for match in _TOKENS.finditer(text):
+            parenthesis, word, other = match.groups()
+            if other is not None:
+                raise InvalidTagExpression(f'Unexpected "{other}" in "{text}"')
+            self._tokens.append(parenthesis or word)
+        self._position = 0
+        self._tree = self._parse_or()
+        if self._position < len(self._tokens):
+            self._error()
+        del self._tokens
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}<{self.text}>"
+
+    def _error(self):
+        if self._position < len(self._tokens):
+            token = self._tokens[self._position]
+            raise InvalidTagExpression(f'Unexpected "{token}" in "{self.text}"')
+        raise InvalidTagExpression(f'Unexpected end of "{self.text}"')
+
+    def _accept(self, token):
+        if self._tokens[self._position : self._position + 1] == [token]:
+            self._position += 1
+            return True
+        return False
+
+    def _parse_or(self):
+        tree = self._parse_and()
+        while self._accept("or"):
+            tree = ("or", tree, self._parse_and())
+        return tree
+
+    def _parse_and(self):
+        tree = self._parse_not()
+        while self._accept("and"):
+            tree = ("and", tree, self._parse_not())
+        return tree
+
+    def _parse_not(self):
+        if self._accept("not"):
+            return ("not", self._parse_not())
+        if self._accept("("):
+            tree = self._parse_or()
+            if not self._accept(")"):
+                self._error()
+            return tree
+        if self._position >= len(self._tokens):
+            self._error()
+        token = self._tokens[self._position]
+        if token in OPERATORS or token in "()":
+            self._error()
+        self._position += 1
+        return ("tag", token)
+
+    def select(self, index, names):
+        """Return the subset of @names matching the expression
+
+        @index is the inverted index of the tests named @names.
+        """
+        return frozenset(self._evaluate(self._tree, index, frozenset(names)))
+
+    def _evaluate(self, tree, index, names):
+        operator = tree[0]
+        if operator == "tag":
+            return index.get(tree[1], frozenset())
+        if operator == "not":
+            return names - self._evaluate(tree[1], index, names)
+        left = self._evaluate(tree[1], index, names)
+        right = self._evaluate(tree[2], index, names)
+        return left & right if operator == "and" else left | right
@@ -0,0 +1,269 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Watch mode: rerun tests when their files change"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from threading import Thread
+
+from lift.exception import InvalidDescriptionFile
+from lift.matrix import iter_tests
+
+# Changes are processed once no new change happened for this delay (seconds)
+DEBOUNCE_DELAY = 0.3
+
+# Period of file polling, when inotify is not available (seconds)
+POLL_PERIOD = 1.0
+
+# inotify events meaning that a file may have changed
+_IN_EVENTS = (
+    0x00000004  # IN_ATTRIB
+    | 0x00000008  # IN_CLOSE_WRITE
+    | 0x00000040  # IN_MOVED_FROM
+    | 0x00000080  # IN_MOVED_TO
+    | 0x00000100  # IN_CREATE
+    | 0x00000200  # IN_DELETE
+)
+_IN_EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Watch files for changes, via the Linux inotify API
+
+    Parent directories are watched rather than files, so that files replaced
+    by editors (written aside, then renamed) are still followed.
+    """
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._paths = set()
+        self._directories = {}  # watch descriptor -> directory
+
+    def watch(self, paths):
+        """Set the files to watch"""
+        self._paths = set(paths)
+        watched = set(self._directories.values())
+        for directory in {os.path.dirname(path) for path in self._paths}:
+            if directory in watched or not os.path.isdir(directory):
+                continue
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(directory), _IN_EVENTS
+            )
+            if wd >= 0:
+                self._directories[wd] = directory
+
+    def changes(self, timeout=None):
+        """Wait up to @timeout seconds for changes
+
+        Returns the set of changed files, which may be empty.
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        changed = set()
+        data = os.read(self._fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = _IN_EVENT_HEADER.unpack_from(data, offset)
+            offset += _IN_EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if wd not in self._directories or not name:
+                continue
+            path = os.path.join(self._directories[wd], os.fsdecode(name))
+            # New description files are worth a look too
+            if path in self._paths or os.path.basename(path) == "lift.yaml":
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Watch files for changes, by polling their modification times"""
+
+    def __init__(self):
+        self._stats = {}
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_mode)
+
+    def watch(self, paths):
+        """Set the files to watch"""
+        self._stats = {path: self._stats.get(path, self._stat(path)) for path in paths}
+
+    def changes(self, timeout=None):
+        """Wait up to @timeout seconds for changes
+
+        Returns the set of changed files, which may be empty.
+        """
+        waited = 0.0
+        while True:
+            changed = set()
+            for path, stat in self._stats.items():
+                new_stat = self._stat(path)
+                if new_stat != stat:
+                    self._stats[path] = new_stat
+                    changed.add(path)
+            if changed or (timeout is not None and waited >= timeout):
+                return changed
+
+            delay = POLL_PERIOD if timeout is None else min(POLL_PERIOD, timeout)
+            time.sleep(delay)
+            waited += delay
+
+    def close(self):
+        return
+
+
+def make_watcher():
+    """Return an InotifyWatcher, or a PollingWatcher if inotify is unavailable"""
+    try:
+        return InotifyWatcher()
+    except (OSError, AttributeError, TypeError):
+        return PollingWatcher()
+
+
+def wait_changes(watcher, timeout=None):
+    """Wait up to @timeout seconds for a burst of changes
+
+    Once a change happened, wait for DEBOUNCE_DELAY without new changes.
+    Returns the set of changed files, which may be empty.
+    """
+    changed = watcher.changes(timeout)
+    while changed:
+        more = watcher.changes(DEBOUNCE_DELAY)
+        if not more:
+            break
+        changed |= more
+    return changed
+
+
+def index_inputs(upper_scopes, suites):
+    """Map each input file of the suites to the tests depending on it
+
+    Returns a {path: set of test strings} dict. Description files of upper
+    level scopes are mapped to an empty set.
+    """
+    inputs = {}
+    for scope in upper_scopes:
+        path = os.path.realpath(os.path.join(scope.directory, "lift.yaml"))
+        inputs.setdefault(path, set())
+    for suite in suites:
+        for test in iter_tests(suite.tests):
+            test_string = f"{suite.directory}/{test.name}"
+            for path in test.input_files():
+                inputs.setdefault(path, set()).add(test_string)
+    return inputs
+
+
+def definitions(suites):
+    """Return a {test string: test} dict of all tests of the suites"""
+    return {
+        f"{suite.directory}/{test.name}": test
+        for suite in suites
+        for test in iter_tests(suite.tests)
+    }
+
+
+def watch(runner, rediscover):
+    """Rerun the tests affected by file changes, until interrupted
+
+    @runner is the Runner of the initial run, its suites are kept in memory
+    and reloaded by calling @rediscover (which should return the upper scopes
+    and the suites, like lift.runner.discover()) when description files change.
+
+    Only the tests whose inputs (see BaseTest.input_files()) or definition
+    changed are rerun. If files change while tests are running, the run is
+    cancelled and a new one includes the tests it did not run.
+    """
+    watcher = make_watcher()
+    inputs = index_inputs(runner.upper_scopes, runner.suites)
+    watcher.watch(inputs)
+
+    worker = None
+    not_run = []
+
+    def run(tests):
+        not_run.extend(runner.run(only=tests))
+        if not runner.cancelled:
+            runner.print_summary()
+            print("Watching for changes...")
+
+    print("Watching for changes...")
+    try:
+        while True:
+            changed = wait_changes(watcher, timeout=None if worker is None else 0.5)
+            if worker is not None and not worker.is_alive():
+                worker = None
+            if not changed:
+                continue
+
+            affected = set()
+            if any(os.path.basename(path) == "lift.yaml" for path in changed):
+                old_definitions = definitions(runner.suites)
+                try:
+                    runner.upper_scopes, runner.suites = rediscover()
+                except InvalidDescriptionFile as e:
+                    print(f"\n{e}")
+                    continue
+                for test_string, test in definitions(runner.suites).items():
+                    if old_definitions.get(test_string) != test:
+                        affected.add(test_string)
+                inputs = index_inputs(runner.upper_scopes, runner.suites)
+                watcher.watch(inputs)
+
+            for path in changed:
+                if os.path.basename(path) != "lift.yaml":
+                    affected |= inputs.get(path, set())
+
+            affected = {test for test in affected if runner.is_selected(test)}
+            if worker is not None:
+                # The tests in flight are obsolete
+                runner.cancel()
+                worker.join()
+                worker = None
+                affected.update(not_run)
+            not_run.clear()
+
+            if affected:
+                print(f"\n{len(affected)} test(s) affected by changes")
+                worker = Thread(target=run, args=(affected,))
+                worker.start()
+    except KeyboardInterrupt:
+        if worker is not None:
+            runner.cancel()
+            worker.join()
+    finally:
+        watcher.close()
@@ -0,0 +1,90 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+"""Tests for the lift.artifacts file"""
+
+import os
+import tempfile
+import unittest
+
+from lift.artifacts import Artifacts, archive_path
+from lift import basetest
+
+
+def result(output, return_code=0):
+    """Return the TestResult of a finished run"""
+    res = basetest.TestResult()
+    res.raw_output = output
+    res.return_code = return_code
+    res.elapsed = 0.1
+    return res
+
+
+class ArtifactsTestCase(unittest.TestCase):
+    """Test the Artifacts class"""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.directory = os.path.join(self.folder.name, "artifacts")
+
+    def test_runs(self):
+        """Test that runs of a test are stored in its log, and indexed"""
+        artifacts = Artifacts(self.directory)
+        artifacts.add("./a/b", "Testing", result(b"foo\nbar", 1), False)
+        artifacts.add("./a/b", "Attempt 2", result(b"\xe9\n" * 1000), True)
+
+        # Read from the index
+        logs = Artifacts(self.directory).logs_of("a/b")
+        self.assertEqual(len(logs), 2, "Runs not indexed")
+        self.assertEqual(logs[0]["lines"], 2, "Wrong lines count")
+        self.assertEqual(logs[0]["result"], "failed", "Wrong result")
+        self.assertEqual(logs[1]["offset"], logs[0]["length"], "Wrong offset")
+        self.assertEqual(
+            b"".join(artifacts.read(logs[1])), b"\xe9\n" * 1000, "Wrong log"
+        )
+        self.assertTrue(
+            os.path.isfile(os.path.join(self.directory, "a", "b.log.gz")),
+            "Unexpected log path",
+        )
+
+    def test_clear(self):
+        """Test that clearing only removes logs and archives"""
+        artifacts = Artifacts(self.directory)
+        res = result(b"foo")
+        archive = archive_path(self.directory, "../b", 2)
+        self.assertEqual(
+            archive,
+            os.path.join(self.directory, "__", "b.attempt-2.tar.gz"),
+            "Unexpected archive path",
+        )
+        os.makedirs(os.path.dirname(archive))
+        open(archive, "w").close()
+        res.archives.append(archive)
+        artifacts.add("../b", "Testing", res, True)
+        other = os.path.join(self.directory, "other")
+        open(other, "w").close()
+
+        artifacts.clear()
+        self.assertEqual(Artifacts(self.directory).logs, [], "Index not cleared")
+        self.assertEqual(
+            sorted(os.listdir(self.directory)), ["__", "other"], "Unexpected files"
+        )
+        self.assertEqual(
+            os.listdir(os.path.join(self.directory, "__")), [], "Log or archive left"
+        )
@@ -0,0 +1,105 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+"""Tests for the lift.changes file"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from lift.changes import affected_tests, changed_files
+from lift.exception import ChangeDetectionError
+from lift.runner import discover
+
+SUITE = {
+    "lift.yaml": "settings:\n    environment:\n        X: '1'\n",
+    "a/lift.yaml": (
+        "test x:\n    command: sh x.sh\n"
+        "test y:\n    command: 'true'\n    inputs: data\n"
+        "test z:\n    command: 'true'\n    inputs: ['*.cfg']\n"
+    ),
+    "a/x.sh": "true\n",
+    "a/data/d": "1\n",
+    "a/z.cfg": "1\n",
+    "b/lift.yaml": "setup:\n    command: sh setup.sh\ntest w:\n    command: 'true'\n",
+    "b/setup.sh": "true\n",
+}
+
+
+class ChangesTestCase(unittest.TestCase):
+    """Test the selection of tests affected by changes"""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        for name, content in SUITE.items():
+            path = os.path.join(self.folder.name, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(content)
+
+    def affected(self, *names):
+        scopes, suites = discover(self.folder.name, upper_inheritance=False)
+        changed = {os.path.realpath(os.path.join(self.folder.name, n)) for n in names}
+        return {
+            test_string[len(self.folder.name) + 1 :]
+            for test_string in affected_tests(scopes, suites, changed)
+        }
+
+    def test_affected_tests(self):
+        """Test that changes are mapped to the tests depending on them"""
+        self.assertEqual(self.affected("a/x.sh"), {"a/x"}, "Executable")
+        self.assertEqual(self.affected("a/data/new"), {"a/y"}, "Input directory")
+        self.assertEqual(self.affected("a/z.cfg"), {"a/z"}, "Input pattern")
+        self.assertEqual(self.affected("b/setup.sh"), {"b/w"}, "Fixture")
+        self.assertEqual(self.affected("a/lift.yaml"), {"a/x", "a/y", "a/z"}, "Suite")
+        self.assertEqual(len(self.affected("lift.yaml")), 4, "Upper description file")
+        self.assertEqual(self.affected("README"), set(), "Unrelated file")
+
+    @unittest.skipUnless(shutil.which("git"), "git is not available")
+    def test_changed_files(self):
+        """Test the listing of the files changed in a git repository"""
+
+        def git(*args):
+            subprocess.run(
+                ["git", "-c", "user.name=lift", "-c", "user.email=lift@localhost"]
+                + list(args),
+                cwd=self.folder.name,
+                check=True,
+                capture_output=True,
+            )
+
+        git("init")
+        git("add", "-A")
+        git("commit", "-m", "Initial commit")
+        os.unlink(os.path.join(self.folder.name, "a/x.sh"))
+        open(os.path.join(self.folder.name, "b/new"), "w").close()
+
+        changed = changed_files(os.path.join(self.folder.name, "a"), "HEAD")
+        self.assertEqual(
+            changed,
+            {
+                os.path.realpath(os.path.join(self.folder.name, name))
+                for name in ("a/x.sh", "b/new")
+            },
+            "Unexpected changed files",
+        )
+        with self.assertRaises(ChangeDetectionError):
+            changed_files(self.folder.name, "unknown")
@@ -0,0 +1,253 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+"""Tests for the lift.connection file"""
+
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import lift.connection
+from lift.connection import ConnectionPool, parse_health
+from lift.exception import RemoteUnavailable
+
+
+class FakeSFTPClient:
+    """Record the directories created through SFTP, write files locally"""
+
+    def __init__(self):
+        self.folders = []
+        self.channels = 1
+
+    def mkdir(self, path):
+        self.folders.append(path)
+
+    def put(self, local_path, remote_path):
+        shutil.copyfile(local_path, remote_path)
+
+    def chmod(self, path, mode):
+        os.chmod(path, mode)
+
+    def stat(self, path):
+        return os.stat(path)
+
+    def open(self, path, mode):
+        return FakeSFTPFile(path, mode)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class FakeSFTPFile:
+    """A local file, with the pipelining switch of paramiko.SFTPFile"""
+
+    def __init__(self, path, mode):
+        self._file = open(path, mode)
+
+    def set_pipelined(self, pipelined=True):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._file.close()
+
+
+class FakeConnectionPool(ConnectionPool):
+    """Pool opening fake SFTP channels"""
+
+    def __init__(self, sftp):
+        super().__init__()
+        self.sftp = sftp
+
+    def open_sftp(self, remote):
+        self.sftp.channels += 1
+        return self.sftp
+
+
+class FakeSSHClient:
+    """Answer commands with a fixed output"""
+
+    def __init__(self, output):
+        self.output = output
+        self.commands = []
+
+    def exec_command(self, command, timeout=None):
+        self.commands.append(command)
+        return None, io.BytesIO(self.output.encode()), None
+
+    def get_transport(self):
+        return self
+
+    def is_active(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class WarmUpConnectionPool(ConnectionPool):
+    """Pool connecting to fake clients, hosts without a client are down"""
+
+    def __init__(self, clients):
+        super().__init__()
+        self.clients = clients
+
+    def _connect(self, remote, timeout):
+        if remote["host"] not in self.clients:
+            raise OSError("Connection refused")
+        return self.clients[remote["host"]]
+
+
+def health_output(available, skew=0):
+    """Return the output of HEALTH_COMMAND"""
+    return (
+        "Filesystem     1024-blocks    Used Available Capacity Mounted on\n"
+        f"/dev/sda1         10000000 5000000 {available} 50% /tmp\n"
+        f"{int(time.time()) + skew}\n"
+    )
+
+
+class ConnectionPoolTestCase(unittest.TestCase):
+    """Test the ConnectionPool class"""
+
+    def test_unique_workdirs(self):
+        """Test that same-named tests get different work directories"""
+
+        pool = ConnectionPool()
+        sftp = FakeSFTPClient()
+        remote = {"host": "example.com", "username": "root"}
+
+        first = pool.make_workdir(remote, "foo", sftp)
+        second = pool.make_workdir(remote, "foo", sftp)
+        self.assertNotEqual(first, second, "Work directories are not unique")
+        self.assertEqual(
+            sftp.folders,
+            [pool.run_folder, first, second],
+            "Unexpected folders: %s" % sftp.folders,
+        )
+        self.assertTrue(
+            first.startswith(pool.run_folder + "/"),
+            "%s is not in the run folder" % first,
+        )
+
+    def test_unique_run_folders(self):
+        """Test that concurrent runs do not share their run folder"""
+
+        self.assertNotEqual(
+            ConnectionPool().run_folder,
+            ConnectionPool().run_folder,
+            "Run folders are not unique",
+        )
+
+    def test_workdir_name(self):
+        """Test that work directories are shell-friendly"""
+
+        pool = ConnectionPool()
+        path = pool.make_workdir(
+            {"host": "example.com", "username": "root"},
+            "compile[CC=gcc,OPT=-O0]",
+            FakeSFTPClient(),
+        )
+        self.assertEqual(
+            path, pool.run_folder + "/1_compile_CC_gcc_OPT_-O0_", "Unexpected path"
+        )
+
+    def test_parallel_upload(self):
+        """Test that big files are uploaded through several channels"""
+
+        sftp = FakeSFTPClient()
+        pool = FakeConnectionPool(sftp)
+        remote = {"host": "example.com", "username": "root", "channels": 3}
+        data = os.urandom(lift.connection.PARALLEL_UPLOAD_MIN_SIZE + 12345)
+
+        with tempfile.TemporaryDirectory() as folder:
+            local_path = os.path.join(folder, "local")
+            remote_path = os.path.join(folder, "remote")
+            with open(local_path, "wb") as f:
+                f.write(data)
+            os.chmod(local_path, 0o751)
+
+            pool.upload(remote, sftp, local_path, remote_path)
+
+            with open(remote_path, "rb") as f:
+                self.assertTrue(f.read() == data, "Uploaded file differs")
+            self.assertEqual(
+                os.stat(remote_path).st_mode & 0o777, 0o751, "Mode not copied"
+            )
+        self.assertEqual(sftp.channels, 4, "Unexpected channels count")
+
+    def test_parse_health(self):
+        """Test the parsing of the health check output"""
+
+        output = health_output(1234)
+        self.assertEqual(parse_health(output)[0], 1234 * 1024, "Wrong free space")
+        with self.assertRaises(ValueError, msg="Accepted a wrong output"):
+            parse_health("df: /tmp: No such file or directory\n")
+
+    def test_warm_up(self):
+        """Test that unavailable remotes are found at once"""
+
+        healthy = FakeSSHClient(health_output(10000000))
+        pool = WarmUpConnectionPool(
+            {
+                "healthy": healthy,
+                "full": FakeSSHClient(health_output(10)),
+                "late": FakeSSHClient(health_output(10000000, skew=-3600)),
+            }
+        )
+        remotes = [
+            {"host": host, "username": "root"}
+            for host in ("healthy", "full", "late", "down", "healthy")
+        ]
+        reports = pool.warm_up(remotes)
+
+        self.assertEqual(reports["root@healthy"], (None, []), "Healthy remote")
+        self.assertEqual(
+            healthy.commands, [lift.connection.HEALTH_COMMAND], "Not checked once"
+        )
+        self.assertEqual(
+            reports["root@full"], ("only 10 KiB free in /tmp", []), "Full remote"
+        )
+        error, warnings = reports["root@late"]
+        self.assertIsNone(error, "Skewed remote is unavailable")
+        self.assertRegex(warnings[0], r"^clock is 360\d seconds behind$", "No warning")
+        self.assertTrue(
+            reports["root@down"][0].startswith("connection failed"), "Down remote"
+        )
+
+        self.assertIs(pool.client(remotes[0]), healthy, "Connection not kept")
+        for remote in remotes[1], remotes[3]:
+            with self.assertRaises(RemoteUnavailable, msg=remote["host"]):
+                pool.client(remote)
+
+        pool.cleanup()
+        self.assertEqual(pool._unavailable, {}, "Not forgotten by cleanup()")
@@ -0,0 +1,172 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+"""Tests for the lift.daemon and lift.client files"""
+
+import io
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from lift.client import daemon_socket, submit
+from lift.daemon import DiscoveryCache, _handle, serve
+
+
+class DiscoveryCacheTestCase(unittest.TestCase):
+    """Test the discovery cache of the daemon"""
+
+    def test_cache(self):
+        """Test that suites are only loaded again when files change"""
+        cache = DiscoveryCache()
+        with tempfile.TemporaryDirectory() as folder:
+            with open(os.path.join(folder, "lift.yaml"), "w") as f:
+                f.write("test a:\n    command: 'true'\n")
+
+            _, suites = cache.discover(folder, upper_inheritance=False)
+            _, cached = cache.discover(folder, upper_inheritance=False)
+            self.assertIs(cached, suites, "Suites were not cached")
+
+            # A new description file in a sub-folder
+            os.mkdir(os.path.join(folder, "sub"))
+            with open(os.path.join(folder, "sub", "lift.yaml"), "w") as f:
+                f.write("test b:\n    command: 'true'\n")
+            _, suites = cache.discover(folder, upper_inheritance=False)
+            self.assertEqual(len(suites), 2, "New file was not discovered")
+
+            # A modified description file
+            stat = os.stat(os.path.join(folder, "lift.yaml"))
+            with open(os.path.join(folder, "lift.yaml"), "w") as f:
+                f.write("test c:\n    command: 'true'\n")
+            os.utime(
+                os.path.join(folder, "lift.yaml"),
+                ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9),
+            )
+            _, suites = cache.discover(folder, upper_inheritance=False)
+            names = [test.name for suite in suites for test in suite.tests]
+            self.assertEqual(names, ["c", "b"], "Modified file was not reloaded")
+
+
+# Submit the command line given as arguments to the daemon of the first one
+CLIENT_SCRIPT = """
+import sys
+from lift.client import submit
+sys.exit(submit(sys.argv[1], sys.argv[2:]))
+"""
+
+
+class ClientTestCase(unittest.TestCase):
+    """Test the daemon client"""
+
+    def test_daemon_socket(self):
+        """Test the detection of the client mode"""
+        self.assertEqual(
+            daemon_socket(["-q", "--connect", "/s", "test"]),
+            ("/s", ["-q", "test"]),
+            "Wrong --connect parsing",
+        )
+        self.assertEqual(
+            daemon_socket(["--connect=/s"]), ("/s", []), "Wrong --connect= parsing"
+        )
+        os.environ["LIFT_DAEMON"] = "/env"
+        try:
+            self.assertEqual(
+                daemon_socket(["-q"]), ("/env", ["-q"]), "LIFT_DAEMON ignored"
+            )
+            self.assertEqual(
+                daemon_socket(["--daemon", "/s"]),
+                (None, ["--daemon", "/s"]),
+                "A daemon should not be a client",
+            )
+        finally:
+            del os.environ["LIFT_DAEMON"]
+
+    def round_trip(self, handler, argv):
+        """Submit a request handled by @handler
+
+        The client runs in its own process, as the handler and the client
+        would otherwise both redirect sys.stdout and sys.stderr.
+        Returns the exit status, the output and the error output of the client.
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "socket")
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(path)
+            server.listen()
+
+            def serve_one():
+                connection, _ = server.accept()
+                with connection, connection.makefile("rwb") as stream:
+                    _handle(stream, handler)
+
+            thread = threading.Thread(target=serve_one)
+            thread.start()
+            client = subprocess.run(
+                [sys.executable, "-c", CLIENT_SCRIPT, path] + argv,
+                cwd=os.path.join(os.path.dirname(__file__), ".."),  # For lift
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+            )
+            thread.join()
+            server.close()
+        return client.returncode, client.stdout, client.stderr
+
+    def test_submit(self):
+        """Test a request round trip"""
+
+        def handler(argv):
+            print("running", *argv)
+            return 3
+
+        status, output, _ = self.round_trip(handler, ["-q", "a"])
+        self.assertEqual(status, 3, "Wrong exit status")
+        self.assertEqual(output, "running -q a\n", "Wrong output")
+
+        with tempfile.TemporaryDirectory() as folder:
+            status = submit(os.path.join(folder, "missing"), [])
+        self.assertIsInstance(status, str, "Connection error not reported")
+
+    def test_handler_error(self):
+        """Test that an error of the run is reported to the client"""
+
+        def handler(argv):
+            open("/nonexistent/x.xml", "w")
+
+        status, _, errors = self.round_trip(handler, [])
+        self.assertEqual(status, 1, "Wrong exit status")
+        self.assertIn("/nonexistent/x.xml", errors, "Error not reported")
+
+    def test_not_a_client(self):
+        """Test that a request which is not from a lift client is ignored"""
+        stream = io.BytesIO(b"GET / HTTP/1.0\n")
+        _handle(stream, None)
+        self.assertEqual(stream.getvalue(), b"GET / HTTP/1.0\n", "Unexpected reply")
+
+    def test_serve_on_file(self):
+        """Test that the daemon does not remove a file in place of its socket"""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "lift.yaml")
+            with open(path, "w") as f:
+                f.write("test a:\n    command: 'true'\n")
+
+            self.assertIn("is not a socket", serve(path, None), "No error")
+            self.assertTrue(os.path.isfile(path), "The file was removed")
@@ -0,0 +1,67 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+"""Tests for the lift.fixture file"""
+
+import unittest
+
+from lift.fixture import FixtureScope
+from lift.localtest import LocalTest
+
+
+class FixtureScopeTestCase(unittest.TestCase):
+    """Test the FixtureScope class"""
+
+    def test_contains(self):
+        """Test the scope tree boundaries"""
+
+        scope = FixtureScope("/tmp/foo", [], [])
+        self.assertTrue(scope.contains("/tmp/foo"), "The root is in the scope")
+        self.assertTrue(scope.contains("/tmp/foo/bar"), "A sub-folder is in the scope")
+        self.assertFalse(scope.contains("/tmp/foobar"), "A sibling is not in the scope")
+
+    def test_setup_once(self):
+        """Test that setups are only run once"""
+
+        ran = []
+        scope = FixtureScope(".", [LocalTest("setup", "true")], [])
+        for _ in range(3):
+            error = scope.setup(lambda fixture: ran.append(fixture) or fixture.run())
+            self.assertIsNone(error, "The setup should have succeeded")
+        self.assertEqual(len(ran), 1, "The setup was run %d times" % len(ran))
+
+    def test_setup_failure(self):
+        """Test that a setup failure is remembered and stops other setups"""
+
+        setups = [LocalTest("setup", "false"), LocalTest("other_setup", "true")]
+        scope = FixtureScope(".", setups, [LocalTest("teardown", "true")])
+        error = scope.setup(lambda fixture: fixture.run())
+        self.assertIn("setup", error, "Unexpected error: %s" % error)
+        self.assertFalse(setups[1].finished, "The second setup should not run")
+        self.assertEqual(scope.setup(lambda fixture: True), error, "Error forgotten")
+        self.assertTrue(
+            scope.teardown(lambda fixture: fixture.run()), "Teardown failed"
+        )
+
+    def test_no_teardown_without_setup(self):
+        """Test that teardowns are not run if nothing was set up"""
+
+        teardown = LocalTest("teardown", "true")
+        scope = FixtureScope(".", [], [teardown])
+        scope.teardown(lambda fixture: fixture.run())
+        self.assertFalse(teardown.finished, "The teardown should not run")
@@ -0,0 +1,176 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+"""Tests for the lift.grouptest file"""
+
+import re
+import shlex
+import time
+import unittest
+from subprocess import PIPE, Popen
+
+from lift.grouptest import GroupTest
+from lift.localtest import LocalTest
+
+
+class LocalMember(LocalTest):
+    """Group member running locally, its remote tells what to do
+
+    The "output" and "code" items of the remote give the output and the return
+    code of the command. A None code makes the setup fail. The optional
+    "duration" item gives the seconds the command lasts.
+    """
+
+    __slots__ = ("remote", "pool", "archive_path")
+
+    def __init__(self, name, command, remote, resources, pty, artifacts, **kwargs):
+        sleep = f"sleep {remote['duration']}; " if remote.get("duration") else ""
+        command = f"sh -c 'echo {remote['output']}; {sleep}exit {remote['code']}'"
+        super().__init__(name, command, **kwargs)
+        self.remote = remote
+
+    def setup(self):
+        if self.remote["code"] is None:
+            raise OSError("Unreachable remote")
+
+
+class SlowMember(LocalMember):
+    """Local member taking a second to stop, as remote ones may"""
+
+    __slots__ = ()
+
+    def interrupt_command(self):
+        time.sleep(1)
+        super().interrupt_command()
+
+
+class SplitMember(LocalMember):
+    """Local member telling stdout and stderr apart, as remote ones do
+
+    Its output is written to stderr.
+    """
+
+    __slots__ = ()
+
+    def command_launch(self):
+        args = shlex.split(self.command.replace("echo", "echo >&2", 1))
+        self._process = Popen(args, stdout=PIPE, stderr=PIPE, start_new_session=True)
+        return self._process.stdout, self._process.stderr
+
+
+class LocalGroupTest(GroupTest):
+    """Group test whose members run locally"""
+
+    __slots__ = ()
+
+    member_class = LocalMember
+
+
+def group(quorum=None, member_class=LocalMember, duration=0, **remotes):
+    """Return a group test, remotes are given as (output, code) tuples
+
+    Members are instances of @member_class, their commands last @duration
+    seconds.
+    """
+    remotes = {
+        name: {
+            "host": name,
+            "username": "root",
+            "output": output,
+            "code": code,
+            "duration": duration,
+        }
+        for name, (output, code) in remotes.items()
+    }
+    group_class = type("Group", (LocalGroupTest,), {"member_class": member_class})
+    return group_class(
+        "group",
+        "true",
+        remotes,
+        quorum=quorum,
+        output_must_not_match=(re.compile("forbidden"),),
+    )
+
+
+class GroupTestTestCase(unittest.TestCase):
+    """Test the GroupTest class"""
+
+    def test_run(self):
+        """Test that members run concurrently, with a prefixed output"""
+        test = group(a=("hello", 0), b=("world", 0))
+        self.assertTrue(test.run(), "The group should have passed")
+        self.assertEqual(test.return_code, 0, "Wrong return code")
+        lines = test.output.splitlines()
+        self.assertEqual(
+            sorted(lines[:2]), ["[a] hello", "[b] world"], "Output not prefixed"
+        )
+        self.assertIn("a: OK", lines, "Member results not reported")
+        self.assertIn("2/2 remotes passed (quorum: 2)", lines, "No summary")
+
+    def test_quorum(self):
+        """Test that a group passes if enough members pass"""
+        test = group(quorum=2, a=("ok", 0), b=("ok", 0), c=("ko", 3))
+        self.assertTrue(test.run(), "The quorum should have been reached")
+
+        test = group(a=("ok", 0), b=("ok", 0), c=("ko", 3))
+        self.assertFalse(test.run(), "The quorum should not have been reached")
+        self.assertEqual(test.return_code, 3, "Wrong return code")
+        self.assertEqual(
+            test.failure_message, "Returned 3 instead of 0", "Wrong failure message"
+        )
+
+    def test_member_failures(self):
+        """Test groups whose members fail for other reasons than return codes"""
+        test = group(a=("ok", 0), b=("forbidden", 0))
+        self.assertFalse(test.run(), "A member output should have been forbidden")
+        self.assertEqual(
+            test.failure_message,
+            "Only 1/2 remotes passed (quorum: 2)",
+            "Wrong failure message",
+        )
+        self.assertIn("b: FAIL (", test.output, "Member failure not reported")
+
+        test = group(a=("ok", 0), b=("ok", None))
+        self.assertFalse(test.run(), "A member setup should have failed")
+        self.assertEqual(
+            test.failure_message,
+            "Only 1/2 remotes passed (quorum: 2)",
+            "Wrong failure message",
+        )
+        self.assertIn("b: FAIL (Unreachable remote)", test.output, "Wrong report")
+
+    def test_interrupt(self):
+        """Test that members are stopped concurrently"""
+        test = group(
+            member_class=SlowMember, duration=10, a=("", 0), b=("", 0), c=("", 0)
+        )
+        start = time.monotonic()
+        self.assertFalse(test.run(timeout=1), "The group should have timed out")
+        # 1s of timeout, then 1s for each member to stop
+        self.assertLess(time.monotonic() - start, 2.9, "Members stopped in turn")
+        self.assertIn("Test interrupted: timeout", test.output, "No timeout")
+
+    def test_errors(self):
+        """Test that the error output of members is reported once"""
+        test = group(member_class=SplitMember, a=("oops", 0))
+        self.assertTrue(test.run(), "The group should have passed")
+        member = test.members[0]
+        self.assertEqual(member.result.errors, "oops\n", "Errors not kept apart")
+        case = member.to_xunit()
+        self.assertIsNone(case.stderr, "Errors reported twice")
+        self.assertEqual(case.stdout, "oops\n", "Errors not in the output")
@@ -0,0 +1,101 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+"""Tests for the lift.history file"""
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import lift.history
+from lift.history import History
+
+
+class HistoryTestCase(unittest.TestCase):
+    """Test the History class"""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.path = os.path.join(self.folder.name, "history.json")
+
+    def test_save(self):
+        """Test that recorded durations are saved, up to HISTORY_SIZE"""
+        history = History(self.path)
+        self.assertEqual(history.durations("./a"), [], "Unexpected durations")
+        for i in range(lift.history.HISTORY_SIZE + 2):
+            history.record("./a", i)
+        history.save()
+
+        durations = History(self.path).durations("./a")
+        self.assertEqual(len(durations), lift.history.HISTORY_SIZE, "Not bounded")
+        self.assertEqual(durations[-1], lift.history.HISTORY_SIZE + 1, "Not saved")
+
+    def test_save_failure(self):
+        """Test that failing to save the history does not raise"""
+        history = History(os.path.join(self.path, "missing", "history.json"))
+        history.record("./a", 1)
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            history.save()
+        self.assertIn("could not be saved", stderr.getvalue(), "No warning")
+
+    def test_corrupted_file(self):
+        """Test that an unusable file is ignored"""
+        with open(self.path, "w") as f:
+            f.write("{")
+        self.assertEqual(History(self.path).durations("./a"), [], "Not ignored")
+
+    def test_auto_timeout(self):
+        """Test the computation of auto timeouts"""
+        history = History(self.path)
+        self.assertEqual(
+            history.auto_timeout("./a"),
+            lift.history.AUTO_TIMEOUT_CEILING,
+            "The ceiling should be used without history",
+        )
+
+        for _ in range(lift.history.AUTO_TIMEOUT_MIN_SAMPLES):
+            history.record("./a", 100)
+        self.assertEqual(
+            history.auto_timeout("./a"),
+            100 * lift.history.AUTO_TIMEOUT_FACTOR,
+            "Unexpected timeout",
+        )
+
+        for _ in range(lift.history.AUTO_TIMEOUT_MIN_SAMPLES):
+            history.record("./b", 0.1)
+        self.assertEqual(
+            history.auto_timeout("./b"),
+            lift.history.AUTO_TIMEOUT_FLOOR,
+            "The floor should be used for quick tests",
+        )
+
+    def test_flakiness(self):
+        """Test the computation of flakiness scores"""
+        history = History(self.path)
+        self.assertEqual(history.flakiness("./a"), 0, "No history, no flakiness")
+
+        for outcome in "PPPF":
+            history.record_outcome("./a", outcome)
+        self.assertEqual(history.flakiness("./a"), 0.25, "A regression is flaky")
+
+        for outcome in "PRPR":
+            history.record_outcome("./b", outcome)
+        self.assertEqual(history.flakiness("./b"), 0.5, "Unexpected score")
@@ -24,10 +24,15 @@ from collections import OrderedDict
 
 from lift.localtest import LocalTest
 from lift.remotetest import RemoteTest
+from lift.grouptest import GroupTest
 from lift.exception import InvalidDescriptionFile
+import lift.matrix
+from lift.matrix import count_tests, iter_names, iter_tests
 from lift.loader import (
+    DirectoryTrie,
     load_upper_inheritance,
     load_config_file,
+    section_needs,
     string_to_remote,
     remote_to_string,
 )
@@ -216,6 +221,139 @@ class LoadConfigFileTestCase(unittest.TestCase):
         with self.assertRaisesRegex(InvalidDescriptionFile, "Unknown remote"):
             load_config_file(path, {}, {}, {})
 
+    def test_invalid_matrix(self):
+        """Check that a proper exception is raised"""
+        path = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)),
+            "tests_resources",
+            "not_valid",
+            "5-lift.yaml",
+        )
+
+        self.assertTrue(os.path.isfile(path), "%s does not exist!" % path)
+        with self.assertRaisesRegex(InvalidDescriptionFile, "matrix axis"):
+            load_config_file(path, {}, {}, {})
+
+    def test_invalid_tuning(self):
+        """Check that a proper exception is raised"""
+        path = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)),
+            "tests_resources",
+            "not_valid",
+            "6-lift.yaml",
+        )
+
+        self.assertTrue(os.path.isfile(path), "%s does not exist!" % path)
+        with self.assertRaisesRegex(InvalidDescriptionFile, "should be an integer"):
+            load_config_file(path, {}, {}, {})
+
+    def test_needs(self):
+        """Check the parsing of the CPUs and memory needed by tests"""
+        self.assertEqual(
+            section_needs({"cpus": 0.5, "memory": "1.5G"}, "test"),
+            {"cpus": 0.5, "memory": 3 * 1024**3 // 2},
+            "Wrong needs",
+        )
+        self.assertEqual(
+            section_needs({"memory": 4096}, "test"), {"memory": 4096}, "Wrong needs"
+        )
+        self.assertEqual(
+            section_needs({"memory": "512 MiB"}, "test"),
+            {"memory": 512 * 1024**2},
+            "Wrong needs",
+        )
+        for section in ({"cpus": -1}, {"cpus": "2"}, {"memory": "lots"}):
+            with self.assertRaises(InvalidDescriptionFile):
+                section_needs(section, "test")
+
+    def test_load_fixtures(self):
+        """Check the load of setup and teardown fixtures"""
+        path = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)),
+            "tests_resources",
+            "fixtures",
+            "lift.yaml",
+        )
+
+        self.assertTrue(os.path.isfile(path), "%s does not exist!" % path)
+
+        expected_setups = [
+            LocalTest(
+                "setup",
+                "sh -c 'echo setup'",
+                directory=os.path.dirname(path),
+                timeout=10,
+                environment={"MY_ENV_VAR1": "foo"},
+            ),
+            RemoteTest(
+                "my_remote.setup",
+                "sh start_service.sh",
+                {"host": "example.com", "username": "root"},
+                resources=["start_service.sh"],
+                directory=os.path.dirname(path),
+                environment={"MY_ENV_VAR1": "foo"},
+            ),
+        ]
+        expected_teardowns = [
+            LocalTest(
+                "teardown",
+                "sh -c 'echo teardown'",
+                directory=os.path.dirname(path),
+                environment={"MY_ENV_VAR1": "foo"},
+            ),
+        ]
+
+        fixtures = {}
+        tests, _, _ = load_config_file(path, {}, {}, {}, fixtures=fixtures)
+
+        self.assertEqual(len(tests), 1, "Fixtures were loaded as tests")
+        self.assertEqual(
+            fixtures["setup"], expected_setups, "Unexpected setups: %s" % fixtures
+        )
+        self.assertEqual(
+            fixtures["teardown"],
+            expected_teardowns,
+            "Unexpected teardowns: %s" % fixtures,
+        )
+
+    def test_load_group(self):
+        """Check the load of tests run on a remote group"""
+        path = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)),
+            "tests_resources",
+            "group",
+            "lift.yaml",
+        )
+
+        self.assertTrue(os.path.isfile(path), "%s does not exist!" % path)
+
+        tests, remotes, _ = load_config_file(path, {}, {}, {}, remotes_in_env=True)
+
+        group = tests[0]
+        self.assertIsInstance(group, GroupTest, "Not a group test")
+        self.assertEqual(group.quorum, 2, "Majority was not resolved")
+        self.assertEqual(
+            [member.name for member in group.members],
+            ["deploy@web1", "deploy@web2", "deploy@web3"],
+            "Unexpected members",
+        )
+        self.assertEqual(
+            [member.remote for member in group.members],
+            [remotes["web1"], remotes["web2"], remotes["web3"]],
+            "Unexpected remotes",
+        )
+        self.assertEqual(
+            group.members[0].resources, ["deploy.sh"], "Resources not passed"
+        )
+        self.assertNotIn(
+            "LIFT_REMOTE_web", tests[1].environment, "A group was put in environment"
+        )
+
+        # Members are looked for when the group is used
+        remotes = {"web": {"group": ["web1", "unknown"]}}
+        with self.assertRaisesRegex(InvalidDescriptionFile, "Unknown remote in"):
+            load_config_file(path, remotes, {}, {"web": remotes["web"]})
+
     def test_load(self):
         """Check a load, without external inheritance"""
         path = os.path.join(
@@ -428,6 +566,99 @@ class LoadConfigFileTestCase(unittest.TestCase):
             tests, expected_tests, "Expected and parsed tests are not the same"
         )
 
+    def test_shared_environment(self):
+        """Check that tests without overrides share the file environment"""
+        path = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)),
+            "tests_resources",
+            "valid",
+            "lift.yaml",
+        )
+
+        self.assertTrue(os.path.isfile(path), "%s does not exist!" % path)
+
+        environment = {"MY_ENV_VAR3": "foobar"}
+        tests, _, _ = load_config_file(path, {}, environment, {})
+
+        with self.assertRaises(TypeError):
+            tests[0].environment["MY_ENV_VAR1"] = "bar"
+        with self.assertRaises(TypeError):
+            tests[1].environment["MY_ENV_VAR1"] = "bar"
+        self.assertNotIn(
+            "MY_VAR", environment, "A test environment leaked in the shared one"
+        )
+
+
+class TestMatrixTestCase(unittest.TestCase):
+    """Test the expansion of parametrized tests"""
+
+    def setUp(self):
+        path = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)),
+            "tests_resources",
+            "matrix",
+            "lift.yaml",
+        )
+        self.assertTrue(os.path.isfile(path), "%s does not exist!" % path)
+        self.tests, _, _ = load_config_file(path, {}, {}, {})
+
+    def test_count(self):
+        """Check that the matrix size is known without expanding it"""
+        self.assertIsInstance(
+            self.tests[0], lift.matrix.TestMatrix, "No matrix was loaded"
+        )
+        self.assertEqual(len(self.tests[0]), 6, "Wrong matrix size")
+        self.assertEqual(count_tests(self.tests), 7, "Wrong tests count")
+
+    def test_names(self):
+        """Check the names of expanded tests"""
+        names = list(iter_names(self.tests))
+        self.assertEqual(
+            names[:3],
+            [
+                "compile[CC=gcc,OPT=-O0]",
+                "compile[CC=gcc,OPT=-O2]",
+                "compile[CC=gcc,OPT=-O3]",
+            ],
+            "Unexpected names: %s" % names,
+        )
+        self.assertEqual(names[-1], "ping", "Unexpected names: %s" % names)
+        self.assertEqual(
+            [test.name for test in iter_tests(self.tests)],
+            names,
+            "Expanded tests do not match their names",
+        )
+
+    def test_environment(self):
+        """Check that the combination is merged in the test environment"""
+        test = self.tests[0][4]
+        self.assertEqual(test.name, "compile[CC=clang,OPT=-O2]", "Wrong test")
+        self.assertEqual(
+            dict(test.environment),
+            {"MY_ENV_VAR1": "foo", "MY_VAR": "content", "CC": "clang", "OPT": "-O2"},
+            "Unexpected environment: %s" % dict(test.environment),
+        )
+
+    def test_selection(self):
+        """Check that only selected tests are created"""
+        tests = list(iter_tests(self.tests, lambda name: "clang" in name))
+        self.assertEqual(len(tests), 3, "Wrong selection: %s" % tests)
+
+
+class DirectoryTrieTestCase(unittest.TestCase):
+    """Test the lift.loader.DirectoryTrie class"""
+
+    def test_closest(self):
+        """Check that values are looked up from the closest directory"""
+        trie = DirectoryTrie("root")
+        trie.insert("./foo", "foo")
+        trie.insert("foo/bar/baz", "baz")
+        self.assertEqual(trie.closest("."), "root", "Wrong root value")
+        self.assertEqual(trie.closest("foo/"), "foo", "Wrong value")
+        self.assertEqual(trie.closest("foo/bar"), "foo", "Wrong inherited value")
+        self.assertEqual(trie.closest("foo/bar/baz/x"), "baz", "Wrong value")
+        self.assertEqual(trie.closest("foobar"), "root", "Not a sub-directory")
+
 
 class RemoteHandlingTestCase(unittest.TestCase):
     """Test the lift.loader remote handling functions"""
@@ -19,11 +19,31 @@
 """Tests for the lift.localtest file"""
 
 import os
+import re
+import threading
+import time
 import unittest
 
+from lift.basetest import OUTPUT_CHUNK_SIZE, ConsoleWriter
 from lift.localtest import LocalTest
 
 
+class BlockedStream:
+    """Binary stream whose writes wait for the unblocked event"""
+
+    def __init__(self):
+        self.data = b""
+        self.unblocked = threading.Event()
+
+    def write(self, data):
+        self.unblocked.wait()
+        self.data += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+
 class LocalTestTestCase(unittest.TestCase):
     """Test the LocalTest class"""
 
@@ -135,3 +155,148 @@ class LocalTestTestCase(unittest.TestCase):
             expected_output,
             "Test output is %s instead of %s" % (test.output, expected_output),
         )
+
+    def test_binary_output(self):
+        """Test that invalid UTF-8 output is kept and decoded on demand"""
+
+        test = LocalTest("simple", "printf 'caf\\351\\n'")
+        self.assertTrue(test.run(), "The test should have succeded")
+        self.assertEqual(test.result.raw_output, b"caf\xe9\n", "Bytes not kept")
+        self.assertEqual(test.output, "caf\\xe9\n", "Unexpected decoding")
+
+    def test_definition_is_read_only(self):
+        """Test that a test definition can not be modified"""
+
+        test = LocalTest("simple", "echo foobar")
+        with self.assertRaises(AttributeError):
+            test.command = "echo barfoo"
+        self.assertEqual(test.command, "echo foobar", "The command was modified")
+
+    def test_lazy_result(self):
+        """Test that the result is only created when the test is run"""
+
+        test = LocalTest("simple", "echo foobar")
+        self.assertIsNone(test.result, "A result exists before the run")
+        self.assertFalse(test.finished, "The test should not be finished")
+
+        test.run()
+        self.assertIsNotNone(test.result, "No result after the run")
+        self.assertTrue(test.finished, "The test should be finished")
+
+    def test_to_xunit(self):
+        """Test the XUnit report of a failed and a skipped test"""
+
+        test = LocalTest("simple", 'sh -c "exit 1"')
+        test.run()
+        case = test.to_xunit()
+        self.assertTrue(case.is_failure(), "The XUnit case should be a failure")
+
+        test = LocalTest("simple", "echo foobar")
+        test.skip("Not selected")
+        case = test.to_xunit()
+        self.assertTrue(case.is_skipped(), "The XUnit case should be skipped")
+
+    def test_output_matches(self):
+        """Test that required patterns are checked"""
+
+        test = LocalTest(
+            "required",
+            "printf 'one\\ntwo\\n'",
+            output_matches=(re.compile("^one\ntwo$", re.M),),
+        )
+        self.assertTrue(test.run(), "Multi-line pattern not matched")
+
+        test = LocalTest("required", "echo one", output_matches=(re.compile("two"),))
+        self.assertFalse(test.run(), "The test should have failed")
+        self.assertEqual(
+            test.failure_message, "Output did not match: two", "Wrong message"
+        )
+
+    def test_output_must_not_match(self):
+        """Test that a forbidden pattern ends the test as a failure"""
+
+        test = LocalTest(
+            "forbidden",
+            "echo FATAL >&2; sleep 10",
+            output_must_not_match=(re.compile("FATAL"),),
+        )
+        start = time.monotonic()
+        self.assertFalse(test.run(), "The test should have failed")
+        self.assertLess(time.monotonic() - start, 5, "The test was not stopped")
+        self.assertEqual(
+            test.failure_message,
+            "Output matched a forbidden pattern: FATAL",
+            "Wrong message",
+        )
+        self.assertNotIn("Test stopped", test.output, "Not a stop pattern")
+
+    def test_stop_when_output_matches(self):
+        """Test that a stop pattern ends the test as a success"""
+
+        test = LocalTest(
+            "stop",
+            "echo READY; sleep 10; exit 1",
+            stop_when_output_matches=(re.compile("^READY$", re.M),),
+        )
+        start = time.monotonic()
+        self.assertTrue(test.run(), "The test should have succeded")
+        self.assertLess(time.monotonic() - start, 5, "The test was not stopped")
+
+        # The command may exit before its output is matched
+        for _ in range(20):
+            test = LocalTest(
+                "stop",
+                "echo READY",
+                stop_when_output_matches=(re.compile("^READY$", re.M),),
+            )
+            self.assertTrue(test.run(), "The test should have succeded")
+            self.assertIn(
+                "Test stopped: output matched ^READY$",
+                test.output,
+                "The stop was not reported",
+            )
+
+    def test_blocked_console(self):
+        """Test that a blocked console does not slow tests down"""
+
+        stream = BlockedStream()
+        console = ConsoleWriter(stream, max_pending=1000)
+        test = LocalTest("blocked", "seq 1 100000", streaming_output=console)
+        start = time.monotonic()
+        self.assertTrue(test.run(timeout=10), "The test should have succeded")
+        self.assertLess(time.monotonic() - start, 5, "The test was blocked")
+        self.assertEqual(
+            test.output.splitlines()[-1], "100000", "The output was not captured"
+        )
+
+        stream.unblocked.set()
+        console.close()
+        self.assertRegex(
+            stream.data.decode(),
+            r"^1\n(.|\n)*\[\d+ lines elided\]\n$",
+            "Unexpected console output",
+        )
+        self.assertLess(len(stream.data), 3 * OUTPUT_CHUNK_SIZE, "Output not elided")
+
+    @unittest.skipUnless(hasattr(os, "sched_setaffinity"), "No CPU affinity")
+    def test_limits(self):
+        """Test that limits apply to the command from its start"""
+
+        cpu = min(os.sched_getaffinity(0))
+        test = LocalTest(
+            "limits",
+            "sh -c 'grep Cpus_allowed_list /proc/self/status; ulimit -d'",
+        )
+        test.limits = ({cpu}, 64 * 1024 * 1024)
+        self.assertTrue(test.run(), "The test should have succeded")
+        self.assertEqual(
+            test.output.split(),
+            ["Cpus_allowed_list:", str(cpu), "65536"],
+            "Limits not applied",
+        )
+
+        test = LocalTest("limits", "/nonexistent/command")
+        test.limits = ({cpu}, None)
+        self.assertFalse(test.run(), "The test should have failed")
+        self.assertEqual(test.return_code, 127, "Wrong return code")
+        self.assertIn("Failed to launch command", test.output, "No error message")
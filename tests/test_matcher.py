@@ -0,0 +1,76 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+"""Tests for the lift.matcher file"""
+
+import codecs
+import re
+import time
+import unittest
+
+from lift.matcher import LOOKBACK_CHARS, LOOKBACK_LINES, OutputMatcher, tail
+
+
+class MatcherTestCase(unittest.TestCase):
+    """Test the OutputMatcher class"""
+
+    def matcher(self, required=(), forbidden=(), stop_patterns=()):
+        self.stopped = 0
+
+        def stop():
+            self.stopped += 1
+
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        return OutputMatcher(required, forbidden, stop_patterns, stop, decoder)
+
+    def test_tail(self):
+        """Test that the lookback is bounded by lines and by characters"""
+        text = "".join(f"line {i}\n" for i in range(20))
+        self.assertEqual(
+            tail(text).splitlines(),
+            [f"line {i}" for i in range(20 - LOOKBACK_LINES, 20)],
+            "Wrong lines kept",
+        )
+        self.assertEqual(
+            len(tail("x" * 100000)), LOOKBACK_CHARS, "Lookback not bounded"
+        )
+
+    def test_long_line(self):
+        """Test that output without line breaks is matched in bounded time"""
+        matcher = self.matcher(
+            required=(re.compile("xEND"),), stop_patterns=(re.compile("STOP"),)
+        )
+        start = time.monotonic()
+        for _ in range(20000):
+            matcher.write(b"xx")
+        matcher.write(b"END")
+        self.assertLess(time.monotonic() - start, 5, "Matching was too slow")
+        self.assertIsNone(matcher.failure(), "Pattern not matched")
+        self.assertEqual(self.stopped, 0, "The test should not have been stopped")
+
+    def test_stop(self):
+        """Test that a stop pattern stops the test once and is not a failure"""
+        matcher = self.matcher(stop_patterns=(re.compile("^READY$", re.M),))
+        matcher.write(b"starting\nREA")
+        self.assertEqual(self.stopped, 0, "The test was stopped too early")
+        matcher.write(b"DY\n")
+        matcher.write(b"READY\n")
+        self.assertEqual(self.stopped, 1, "The test was not stopped once")
+        self.assertFalse(matcher.forbidden, "The pattern is not forbidden")
+        self.assertIsNone(matcher.failure(), "A stop pattern is not a failure")
@@ -0,0 +1,57 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+"""Tests for the lift.profiling file"""
+
+import io
+import os
+import pstats
+import tempfile
+import unittest
+
+from lift.localtest import LocalTest
+from lift.profiling import profiled
+
+
+class ProfiledTestCase(unittest.TestCase):
+    """Test the profiled context manager"""
+
+    def test_profiled(self):
+        """Test that lift code is profiled, including in threads"""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "lift.prof")
+            summary = io.StringIO()
+            with profiled(path, stream=summary):
+                self.assertTrue(LocalTest("simple", "echo foobar").run())
+
+            functions = {name for _, _, name in pstats.Stats(path).stats}
+            self.assertIn("run", functions, "Main thread not profiled")
+            self.assertIn("actual_copy_output", functions, "Thread not profiled")
+
+        summary = summary.getvalue()
+        self.assertIn("localtest.py", summary, "Hot functions not listed")
+        self.assertIn("allocation sites", summary, "Allocations not listed")
+        allocations = summary.split("allocation sites")[1]
+        self.assertNotIn("profiling.py", allocations, "Profiler itself listed")
+
+    def test_disabled(self):
+        """Test that nothing is profiled without a path"""
+        summary = io.StringIO()
+        with profiled(None, stream=summary):
+            pass
+        self.assertEqual(summary.getvalue(), "", "Unexpected summary")
@@ -0,0 +1,139 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+"""Tests for the lift.remotetest file"""
+
+import io
+import os
+import subprocess
+import tarfile
+import tempfile
+import time
+import unittest
+
+from lift.remotetest import BOOTSTRAP_FILE, KILL_SCRIPT, PID_FILE, RemoteTest
+
+
+class LocalSFTPClient:
+    """The SFTP methods used to upload the bootstrap script, on local files"""
+
+    def open(self, path, mode):
+        return open(path, mode)
+
+    def chmod(self, path, mode):
+        os.chmod(path, mode)
+
+
+class RemoteTestTestCase(unittest.TestCase):
+    """Test the RemoteTest class"""
+
+    def test_bootstrap(self):
+        """Test that the bootstrap script quotes and hides the environment"""
+
+        test = RemoteTest(
+            "simple",
+            'echo "$foo" && pwd',
+            {"host": "example.com", "username": "root"},
+            environment={"foo": "it's $HOME; `true`"},
+        )
+        with tempfile.TemporaryDirectory() as folder:
+            test._remote_test_folder = folder
+            test._upload_bootstrap(LocalSFTPClient())
+            path = os.path.join(folder, BOOTSTRAP_FILE)
+            self.assertEqual(
+                os.stat(path).st_mode & 0o777, 0o600, "Readable by other users"
+            )
+            process = subprocess.Popen(
+                ["sh", path],
+                stdout=subprocess.PIPE,
+                start_new_session=True,
+            )
+            output = process.communicate()[0]
+            self.assertFalse(os.path.exists(path), "Bootstrap script left")
+            with open(os.path.join(folder, PID_FILE)) as f:
+                self.assertEqual(
+                    int(f.read()), process.pid, "Wrong process group recorded"
+                )
+
+        expected_output = f"it's $HOME; `true`\n{folder}\n".encode()
+        self.assertEqual(
+            output,
+            expected_output,
+            "Bootstrap output is %s instead of %s" % (output, expected_output),
+        )
+
+    def test_fetch_script(self):
+        """Test that the fetch script archives the files matching patterns"""
+        test = RemoteTest(
+            "simple",
+            "true",
+            {"host": "example.com", "username": "root"},
+            artifacts=("out/*.core", "my log.txt", "*.none", "'$(false)'"),
+        )
+        with tempfile.TemporaryDirectory() as folder:
+            test._remote_test_folder = folder
+            output = subprocess.check_output(["sh", "-c", test.fetch_script()])
+            self.assertEqual(output, b"", "Files archived while none matched")
+
+            os.mkdir(os.path.join(folder, "out"))
+            for name in ("out/1.core", "out/2.core", "out/other", "my log.txt"):
+                with open(os.path.join(folder, name), "w") as f:
+                    f.write(name)
+            output = subprocess.check_output(["sh", "-c", test.fetch_script()])
+
+        with tarfile.open(fileobj=io.BytesIO(output), mode="r:gz") as archive:
+            names = sorted(archive.getnames())
+        self.assertEqual(
+            names, ["my log.txt", "out/1.core", "out/2.core"], "Wrong archive"
+        )
+
+    def kill(self, command):
+        """Run @command in its own process group, then run the kill script
+
+        Returns the output of the kill script.
+        """
+        process = subprocess.Popen(["sh", "-c", command], start_new_session=True)
+        with tempfile.TemporaryDirectory() as folder:
+            pid_file = os.path.join(folder, PID_FILE)
+            with open(pid_file, "w") as f:
+                f.write(f"{process.pid}\n")
+            time.sleep(0.2)  # Let the command start its children
+            output = subprocess.check_output(
+                ["sh", "-c", KILL_SCRIPT, "lift-kill", pid_file, "1"]
+            )
+        process.wait(timeout=1)
+        states = subprocess.check_output(["ps", "-eo", "pgid=,stat="], text=True)
+        left = [
+            stat
+            for pgid, stat in map(str.split, states.splitlines())
+            if pgid == str(process.pid) and not stat.startswith("Z")  # Zombies
+        ]
+        self.assertEqual(left, [], "Processes left")
+        return output
+
+    def test_kill_script(self):
+        """Test that the process group of the command is terminated"""
+        self.assertEqual(self.kill("sleep 60 & sleep 60"), b"", "Unexpected report")
+
+    def test_kill_script_escalation(self):
+        """Test that processes ignoring SIGTERM are killed"""
+        self.assertEqual(
+            self.kill("trap '' TERM; sleep 60 & sleep 60"),
+            b"killed\n",
+            "SIGKILL not reported",
+        )
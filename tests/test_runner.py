@@ -0,0 +1,405 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+"""Tests for the lift.runner file"""
+
+import io
+import os
+import runpy
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+
+from lift.artifacts import Artifacts
+from lift.history import FAILED, PASSED, History
+from lift.exception import InvalidDescriptionFile
+from lift.runner import (
+    PARALLEL_DISCOVERY_THRESHOLD,
+    Runner,
+    discover,
+    parse_config_files,
+    uses_history,
+)
+from lift.scheduler import Scheduler
+from lift.tags import TagExpression
+
+
+class DiscoverTestCase(unittest.TestCase):
+    """Test the discovery of description files"""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+
+    def write(self, directory, content):
+        path = os.path.join(self.folder.name, directory, "lift.yaml")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_inheritance(self):
+        """Test that suites inherit from their closest ancestor only"""
+        self.write(".", "settings:\n    environment:\n        FOO: root\n")
+        self.write("foo", "settings:\n    environment:\n        FOO: foo\n")
+        self.write("foo/bar", "test a:\n    command: 'true'\n")
+        # Not a sub-folder of "foo", despite its name
+        self.write("foobar", "test a:\n    command: 'true'\n")
+        _, suites = discover(self.folder.name, upper_inheritance=False)
+        environments = {
+            os.path.relpath(suite.directory, self.folder.name): suite.tests[
+                0
+            ].environment
+            for suite in suites
+            if suite.tests
+        }
+        self.assertEqual(
+            environments,
+            {"foo/bar": {"FOO": "foo"}, "foobar": {"FOO": "root"}},
+            "Wrong inheritance",
+        )
+
+    def test_invalid_upper_file(self):
+        """Test that an invalid upper level file raises an exception"""
+        upper = os.path.normpath(self.write(".", "settings:\n    unknown: 1\n"))
+        self.write("foo", "test a:\n    command: 'true'\n")
+        with self.assertRaises(InvalidDescriptionFile) as cm:
+            discover(os.path.join(self.folder.name, "foo"))
+        self.assertIn(upper, str(cm.exception), "Invalid file not reported")
+
+    def test_parallel(self):
+        """Test that parsing files in spawned processes gives the same results"""
+        paths = [
+            self.write(f"d{i}", f"test t{i}:\n    command: 'true'\n")
+            for i in range(PARALLEL_DISCOVERY_THRESHOLD)
+        ]
+        paths.append(self.write("invalid", "test: ["))
+        sequential = parse_config_files(paths, workers=1)
+        parallel = parse_config_files(paths, workers=2)
+        self.assertEqual(
+            [conf for conf, _ in parallel.values()],
+            [conf for conf, _ in sequential.values()],
+            "Different contents",
+        )
+        self.assertIsInstance(
+            parallel[paths[-1]][1], InvalidDescriptionFile, "Error not returned"
+        )
+
+    def test_spawned_main_module(self):
+        """Test that spawned processes can import the lift binary"""
+        # This is what multiprocessing does in the processes it spawns
+        lift_bin = os.path.join(os.path.dirname(__file__), "..", "bin", "lift")
+        module = runpy.run_path(lift_bin, run_name="__mp_main__")
+        self.assertIn("main", module, "The lift binary was not imported")
+
+
+class RunnerTestCase(unittest.TestCase):
+    """Test the programmatic runner interface"""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+
+    def write_suite(self, content, **kwargs):
+        with open(os.path.join(self.folder.name, "lift.yaml"), "w") as f:
+            f.write(content)
+        return Runner(
+            *discover(self.folder.name, upper_inheritance=False),
+            silent=True,
+            **kwargs,
+        )
+
+    def test_results(self):
+        """Test that outcomes are yielded in order, without printing"""
+        runner = self.write_suite(
+            "setup:\n    command: 'true'\n"
+            "teardown:\n    command: 'true'\n"
+            "test a:\n    command: 'true'\n"
+            "test b:\n    command: 'false'\n"
+        )
+        output = io.StringIO()
+        with redirect_stdout(output):
+            outcomes = [
+                (outcome.kind, outcome.test.name, outcome.status)
+                for outcome in runner.results()
+            ]
+        self.assertEqual(
+            outcomes,
+            [
+                ("setup", "setup", "passed"),
+                ("test", "a", "passed"),
+                ("test", "b", "failed"),
+                ("teardown", "teardown", "passed"),
+            ],
+            "Unexpected outcomes",
+        )
+        self.assertEqual(output.getvalue(), "", "A silent runner printed")
+        self.assertEqual(runner.tests_count, 2, "Wrong tests count")
+
+    def test_setup_failure(self):
+        """Test that tests are skipped after a setup failure"""
+        runner = self.write_suite(
+            "setup:\n    command: 'false'\n" "test a:\n    command: 'true'\n"
+        )
+        statuses = [outcome.status for outcome in runner.results()]
+        self.assertEqual(statuses, ["failed", "skipped"], "Unexpected outcomes")
+        self.assertEqual(runner.report(), 1, "Wrong exit status")
+
+    def test_stop_iteration(self):
+        """Test that fixtures are torn down when the iteration stops early"""
+        marker = os.path.join(self.folder.name, "torn_down")
+        runner = self.write_suite(
+            "setup:\n    command: 'true'\n"
+            f"teardown:\n    command: 'touch {marker}'\n"
+            "test a:\n    command: 'true'\n"
+            "test b:\n    command: 'true'\n"
+        )
+        results = runner.results()
+        for outcome in results:
+            if outcome.kind == "test":
+                break
+        results.close()
+        self.assertTrue(os.path.exists(marker), "Teardown was not run")
+        self.assertEqual(runner.tests_count, 1, "The run did not stop")
+
+    def test_retries(self):
+        """Test that failed tests are retried after the others"""
+        counter = os.path.join(self.folder.name, "counter")
+        runner = self.write_suite(
+            "test flaky:\n"
+            f"    command: sh -c 'echo >> {counter}; [ $(wc -l < {counter}) -gt 2 ]'\n"
+            "test broken:\n    command: 'false'\n    retries: 0\n"
+            "test ok:\n    command: 'true'\n",
+            retries=3,
+        )
+        outcomes = [(outcome.test.name, outcome.status) for outcome in runner.results()]
+        self.assertEqual(
+            outcomes,
+            [
+                ("flaky", "retried"),
+                ("broken", "failed"),
+                ("ok", "passed"),
+                ("flaky", "retried"),
+                ("flaky", "passed"),
+            ],
+            "Unexpected outcomes",
+        )
+        self.assertEqual(runner.tests_count, 3, "Attempts should not be counted")
+        self.assertEqual(len(runner.flaky_tests), 1, "Flaky test not reported")
+
+        cases = [case.name for case in runner.xunit_suites()[0].test_cases]
+        self.assertEqual(
+            cases,
+            ["flaky (attempt 1)", "flaky (attempt 2)", "flaky", "broken", "ok"],
+            "Attempts are not reported",
+        )
+
+    def test_retry_budget(self):
+        """Test that retries stop once the budget is spent"""
+        runner = self.write_suite(
+            "test a:\n    command: 'false'\n" "test b:\n    command: 'false'\n",
+            retries=5,
+            retry_budget=2,
+        )
+        statuses = [outcome.status for outcome in runner.results()]
+        self.assertEqual(statuses.count("retried"), 2, "Budget not respected")
+        self.assertEqual(len(runner.failed_tests), 2, "Failures not reported")
+
+    def test_quarantine(self):
+        """Test that failures of flaky tests do not fail the run"""
+        history = History(os.path.join(self.folder.name, "history.json"))
+        test_string = f"{self.folder.name}/flaky"
+        for outcome in (PASSED, FAILED, PASSED, FAILED):
+            history.record_outcome(test_string, outcome)
+
+        runner = self.write_suite(
+            "test flaky:\n    command: 'false'\n",
+            history=history,
+            quarantine=0.5,
+        )
+        runner.run()
+        self.assertEqual(len(runner.quarantined_tests), 1, "Not quarantined")
+        self.assertEqual(runner.report(), 0, "The run should be successful")
+
+    def test_artifacts(self):
+        """Test that outputs are stored in artifacts, and referred to"""
+        artifacts = Artifacts(os.path.join(self.folder.name, "artifacts"))
+        runner = self.write_suite(
+            "test a:\n    command: echo foo\n", artifacts=artifacts
+        )
+        for _ in range(2):
+            runner.run()
+        self.assertEqual(len(artifacts.logs), 1, "Previous run not cleared")
+
+        test = runner.suites[0].tests[0]
+        self.assertEqual(test.output, "", "Output kept in memory")
+        log = artifacts.logs_of(f"{test.directory}/a")[0]
+        self.assertEqual(b"".join(artifacts.read(log)), b"foo\n", "Wrong log")
+
+        case = runner.xunit_suites()[0].test_cases[0]
+        self.assertEqual(
+            case.stdout,
+            f"[[ATTACHMENT|{os.path.abspath(artifacts.log_path(test.directory + '/a'))}]]",
+            "The XUnit report does not refer to the log",
+        )
+
+    def test_concurrent(self):
+        """Test that tests fitting in the machine run at once"""
+        runner = self.write_suite(
+            "test a:\n    command: sleep 0.5\n    cpus: 0.5\n"
+            "test b:\n    command: sleep 0.5\n    cpus: 0.5\n"
+            "test c:\n    command: 'false'\n    cpus: 2\n",
+            retries=1,
+            scheduler=Scheduler(4, capacity=({0}, None)),
+        )
+        start = time.monotonic()
+        outcomes = [(outcome.test.name, outcome.status) for outcome in runner.results()]
+        self.assertLess(time.monotonic() - start, 1, "Tests did not run at once")
+        self.assertEqual(
+            sorted(outcomes[:2]), [("a", "passed"), ("b", "passed")], "Not run"
+        )
+        self.assertEqual(
+            outcomes[2:],
+            [("c", "retried"), ("c", "failed")],
+            "The oversized test did not run alone, after the others",
+        )
+        self.assertEqual(runner.tests_count, 3, "Wrong tests count")
+
+    def test_selection(self):
+        """Test the selection of tests by regex and by tags"""
+        content = (
+            "test a:\n    command: 'true'\n    tags: [smoke]\n"
+            "test b:\n    command: 'true'\n    tags: [smoke, slow]\n"
+            "test c:\n    command: 'true'\n    tags: slow\n"
+            "    matrix:\n        x: [1, 2]\n"
+        )
+
+        def names(**kwargs):
+            runner = self.write_suite(content, **kwargs)
+            return [outcome.test.name for outcome in runner.results()]
+
+        self.assertEqual(
+            names(tags=TagExpression("slow and not smoke")),
+            ["c[x=1]", "c[x=2]"],
+            "Wrong tag selection",
+        )
+        self.assertEqual(
+            names(expressions=[".*/a", r".*/(c)\[x=2\]"], regex=True),
+            ["a", "c[x=2]"],
+            "Wrong regex selection",
+        )
+        self.assertEqual(
+            names(expressions=[r".*/(\w)\1"], regex=True), [], "Wrong backreference"
+        )
+        self.assertEqual(
+            names(expressions=["(?i).*/A", ".*/b"], regex=True),
+            ["a", "b"],
+            "Wrong inline flags",
+        )
+        self.assertEqual(
+            names(expressions=[".*"], regex=True, tags=TagExpression("not slow")),
+            ["a"],
+            "Tags and regex are not combined",
+        )
+
+    def test_selected_remotes(self):
+        """Test that the remotes of selected tests and their fixtures are found"""
+        runner = self.write_suite(
+            "settings:\n"
+            "    define a:\n        host: a\n        username: root\n"
+            "    define b:\n        host: b\n        username: root\n"
+            "    define c:\n        host: c\n        username: root\n"
+            "    define group ab: [a, b]\n"
+            "c setup:\n    command: 'true'\n"
+            "a test one:\n    command: 'true'\n"
+            "    matrix:\n        x: [1, 2]\n"
+            "ab test two:\n    command: 'true'\n"
+            "test three:\n    command: 'true'\n",
+            expressions=[".*/one.*", ".*/three"],
+            regex=True,
+        )
+
+        def hosts(select=None):
+            return [remote["host"] for remote in runner.selected_remotes(select)]
+
+        self.assertEqual(hosts(), ["a", "c"], "Wrong remotes")
+        self.assertEqual(
+            hosts(lambda test_string: True), ["a", "a", "b", "c"], "Wrong group"
+        )
+        self.assertEqual(
+            hosts(lambda test_string: False),
+            [],
+            "Remotes of fixtures without selected tests",
+        )
+
+    def test_uses_history(self):
+        """Test that the need for a history is found"""
+
+        def uses(content):
+            self.write_suite(content)
+            return uses_history(*discover(self.folder.name, upper_inheritance=False))
+
+        self.assertFalse(uses("test a:\n    command: 'true'\n"), "Plain test")
+        self.assertTrue(
+            uses("test a:\n    command: 'true'\n    timeout: auto\n"), "Auto timeout"
+        )
+        self.assertTrue(
+            uses(
+                "test a:\n    command: 'true'\n    retries: 1\n"
+                "    matrix:\n        x: [1, 2]\n"
+            ),
+            "Matrix with retries",
+        )
+        self.assertTrue(
+            uses("setup:\n    command: 'true'\n    timeout: auto\n"), "Fixture"
+        )
+
+    def test_near_timeout(self):
+        """Test that tests close to their timeout are reported, not timed out ones"""
+        runner = self.write_suite(
+            "test near:\n    command: sleep 1.7\n    timeout: 2\n"
+            "test over:\n    command: sleep 5\n    timeout: 1\n"
+        )
+        runner.run()
+        self.assertEqual(
+            [test.name for test, _ in runner.near_timeout], ["near"], "Wrong tests"
+        )
+
+    def test_cancel(self):
+        """Test that tests stopped by a cancellation are not run, not failed"""
+        folder = self.folder.name
+        for scheduler in None, Scheduler(2):
+            runner = self.write_suite(
+                "test a:\n    command: sleep 10\n"
+                "test b:\n    command: sleep 10\n    cpus: 2\n",
+                scheduler=scheduler,
+            )
+            thread = threading.Thread(target=runner.run)
+            thread.start()
+            while not runner._running:
+                time.sleep(0.01)
+            runner.cancel()
+            thread.join()
+
+            self.assertEqual(
+                sorted(runner.not_run), [f"{folder}/a", f"{folder}/b"], "Not run"
+            )
+            self.assertEqual(runner.failed_tests, [], "Cancelled tests failed")
+            self.assertEqual(runner.tests_count, 0, "Cancelled tests counted")
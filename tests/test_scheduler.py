@@ -0,0 +1,91 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+"""Tests for the lift.scheduler file"""
+
+import types
+import unittest
+
+from lift.scheduler import Scheduler, machine_capacity
+
+
+def make_test(cpus=1, memory=0):
+    """Return a test-like object needing the given resources"""
+    return types.SimpleNamespace(cpus=cpus, memory=memory, limits=None)
+
+
+class SchedulerTestCase(unittest.TestCase):
+    """Test the packing of tests by lift.scheduler.Scheduler"""
+
+    def test_capacity(self):
+        """Test that the capacity of the machine is measured"""
+        cpus, memory = machine_capacity()
+        self.assertTrue(cpus, "No CPU found")
+        self.assertTrue(memory is None or memory > 0, "Wrong memory")
+
+    def test_packing(self):
+        """Test that tests are given room as long as they fit"""
+        scheduler = Scheduler(8, capacity=({0, 1}, 1024))
+        small, half, other = make_test(0.5, 256), make_test(1, 512), make_test()
+        self.assertTrue(scheduler.acquire(small), "Room should be left")
+        self.assertTrue(scheduler.acquire(half), "Room should be left")
+        self.assertFalse(scheduler.acquire(other), "CPUs are overcommitted")
+        self.assertFalse(
+            scheduler.acquire(make_test(0.5, 512)), "Memory is overcommitted"
+        )
+
+        scheduler.release(half)
+        self.assertTrue(scheduler.acquire(other), "Released room not reused")
+
+    def test_jobs(self):
+        """Test that the number of jobs caps the running tests"""
+        scheduler = Scheduler(2, capacity=({0, 1, 2, 3}, None))
+        tests = [make_test(0) for _ in range(3)]
+        self.assertEqual(
+            [scheduler.acquire(test) for test in tests],
+            [True, True, False],
+            "Wrong number of tests running at once",
+        )
+
+    def test_oversized(self):
+        """Test that a test needing more than the machine runs alone"""
+        scheduler = Scheduler(4, capacity=({0}, 1024))
+        big = make_test(4, 4096)
+        self.assertTrue(scheduler.acquire(big), "An oversized test never runs")
+        self.assertFalse(scheduler.acquire(make_test(0, 0)), "Should run alone")
+
+    def test_remote(self):
+        """Test that tests without needs only count against jobs"""
+        scheduler = Scheduler(3, capacity=({0}, 1024))
+        self.assertTrue(scheduler.acquire(make_test(1, 1024)), "Room expected")
+        self.assertTrue(scheduler.acquire(object()), "A remote test needs nothing")
+
+    def test_enforce(self):
+        """Test that enforced tests are given distinct CPUs"""
+        scheduler = Scheduler(4, enforce=True, capacity=({0, 1, 2}, None))
+        first, second = make_test(0.5, 256), make_test(2)
+        self.assertTrue(scheduler.acquire(first), "Room should be left")
+        self.assertTrue(scheduler.acquire(second), "Room should be left")
+        self.assertEqual(first.limits, ({0}, 256), "Wrong limits")
+        self.assertEqual(second.limits, ({1, 2}, None), "Wrong limits")
+        self.assertFalse(scheduler.acquire(make_test(0.1)), "CPUs rounded up")
+
+        scheduler.release(first)
+        third = make_test()
+        self.assertTrue(scheduler.acquire(third), "Released room not reused")
+        self.assertEqual(third.limits, ({0}, None), "Released CPU not reused")
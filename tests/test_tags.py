@@ -0,0 +1,69 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+"""Tests for the lift.tags file"""
+
+import types
+import unittest
+
+from lift.exception import InvalidTagExpression
+from lift.tags import TagExpression, tag_index
+
+
+class TagsTestCase(unittest.TestCase):
+    """Test tag expressions and indexes"""
+
+    def setUp(self):
+        tests = [
+            types.SimpleNamespace(name="a", tags=("smoke",)),
+            types.SimpleNamespace(name="b", tags=("smoke", "slow")),
+            types.SimpleNamespace(name="c", tags=("net",)),
+            types.SimpleNamespace(name="d", tags=()),
+        ]
+        self.index = tag_index(tests)
+        self.names = [test.name for test in tests]
+
+    def select(self, expression):
+        return sorted(TagExpression(expression).select(self.index, self.names))
+
+    def test_index(self):
+        """Test that tags are mapped to the tests having them"""
+        self.assertEqual(
+            self.index,
+            {"smoke": {"a", "b"}, "slow": {"b"}, "net": {"c"}},
+            "Wrong index",
+        )
+
+    def test_select(self):
+        """Test the evaluation of expressions"""
+        self.assertEqual(self.select("smoke"), ["a", "b"], "Wrong tag")
+        self.assertEqual(self.select("unknown"), [], "Wrong unknown tag")
+        self.assertEqual(self.select("not smoke"), ["c", "d"], "Wrong not")
+        self.assertEqual(self.select("smoke and not slow"), ["a"], "Wrong and")
+        self.assertEqual(
+            self.select("(smoke or net) and not slow"), ["a", "c"], "Wrong parentheses"
+        )
+        self.assertEqual(
+            self.select("net or smoke and slow"), ["b", "c"], "Wrong precedence"
+        )
+
+    def test_invalid(self):
+        """Test that invalid expressions are rejected"""
+        for expression in ("", "smoke and", "(smoke", "smoke)", "a b", "a & b"):
+            with self.assertRaises(InvalidTagExpression, msg=expression):
+                TagExpression(expression)
@@ -0,0 +1,89 @@
+# LIFT Integration-Functional Testing - A meta test framework
+# Copyright © 2014-2021 Cognacq-Jay Image and Nicolas Delvaux
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+"""Tests for the lift.watch file"""
+
+import os
+import tempfile
+import unittest
+
+from lift.loader import load_config_file
+from lift.runner import Suite
+from lift.watch import PollingWatcher, index_inputs, make_watcher, wait_changes
+
+
+class WatcherTestCase(unittest.TestCase):
+    """Test the file watchers"""
+
+    def check_watcher(self, watcher):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "test.sh")
+            other_path = os.path.join(folder, "other.sh")
+            for file_path in (path, other_path):
+                with open(file_path, "w") as f:
+                    f.write("true\n")
+
+            watcher.watch([path])
+            self.assertEqual(watcher.changes(0.1), set(), "Unexpected change")
+
+            # Replace the file, as editors do
+            with open(path + ".new", "w") as f:
+                f.write("false\n")
+            os.rename(path + ".new", path)
+            with open(other_path, "a") as f:
+                f.write("false\n")
+
+            changed = wait_changes(watcher, 2)
+            watcher.close()
+        self.assertEqual(changed, {path}, "Unexpected changes: %s" % changed)
+
+    def test_watcher(self):
+        """Test the default watcher"""
+        self.check_watcher(make_watcher())
+
+    def test_polling_watcher(self):
+        """Test the polling watcher"""
+        self.check_watcher(PollingWatcher())
+
+
+class IndexInputsTestCase(unittest.TestCase):
+    """Test the lift.watch.index_inputs function"""
+
+    def test_index(self):
+        """Check that tests are mapped to their description file and script"""
+        directory = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)), "tests_resources"
+        )
+        with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".yaml") as f:
+            f.write('test script:\n    command: "sh my_script.sh"\n')
+            f.write('test ping:\n    command: "sleep 1"\n')
+            f.flush()
+            tests, _, _ = load_config_file(f.name, {}, {}, {})
+
+        inputs = index_inputs([], [Suite(directory, tests, None)])
+        self.assertEqual(
+            inputs,
+            {
+                os.path.join(directory, "lift.yaml"): {
+                    f"{directory}/script",
+                    f"{directory}/ping",
+                },
+                os.path.join(directory, "my_script.sh"): {f"{directory}/script"},
+            },
+            "Unexpected inputs: %s" % inputs,
+        )